@@ -1,3 +1,4 @@
+import logging
 import multiprocessing
 import sys
 import os
@@ -13,6 +14,17 @@ from atklip.appmanager.setting.config import cfg
 import asyncio
 
 from atklip.appmanager.worker.threadpool import Heavy_ProcessPoolExecutor_global,num_threads
+from atklip.controls.pandas_ta.utils._warmup import KERNEL_WARMUP_global
+
+logger = logging.getLogger("atklip")
+
+def warmup_progress(done: int, total: int, name: str, seconds: float):
+    "progress callback of KERNEL_WARMUP, runs on the warm-up thread"
+    logger.info("numba warm-up %d/%d: %s %.2fs", done, total, name, seconds)
+    if done == total:
+        for kernel, error in KERNEL_WARMUP_global.errors.items():
+            logger.warning("numba warm-up of %s failed: %s", kernel, error)
+        logger.info("numba warm-up finished: %d kernels in %.2fs", total, KERNEL_WARMUP_global.total_time)
 
 class MainWindow(WindowBase):
     def __init__(self):
@@ -31,6 +43,10 @@ class MainWindow(WindowBase):
             event.ignore()
 
 def main():
+    logging.basicConfig(format="%(asctime)s %(name)s %(levelname)s: %(message)s")
+    logger.setLevel(logging.INFO)
+    # compile/load the numba kernels while the window is built
+    KERNEL_WARMUP_global.start(warmup_progress)
     APP_VERSION = "1.0.0"
     APP_NAME = "Auto Trading Kit"
     APP_DISPLAY_NAME = f"ATK (v{APP_VERSION})"
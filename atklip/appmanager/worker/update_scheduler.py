@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+import threading
+from collections import deque
+from concurrent.futures import Executor
+from typing import Callable, Deque, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from atklip.appmanager.worker.threadpool import ThreadPoolExecutor_global
+
+
+# dependency levels, lower levels run first
+LEVEL_SOURCE = 0
+LEVEL_INDICATOR = 1
+LEVEL_STRATEGY = 2
+
+UPDATE = "update"
+ADD = "add"
+
+
+class _JOB:
+    __slots__ = ("level", "depends_on", "queue", "running")
+
+    def __init__(self, level: int, depends_on: Tuple[Hashable, ...]):
+        self.level = level
+        self.depends_on = depends_on
+        # (kind, fn, args, kwargs, seq): seq orders events across jobs
+        self.queue: Deque[Tuple[str, Callable, tuple, dict, int]] = deque()
+        self.running = False
+
+
+class UPDATE_SCHEDULER:
+    """Coalescing dispatcher for the update_worker/add_worker jobs of indicators.
+
+    Every job (a source, an indicator, a strategy) keeps its own queue and
+    runs at most one event at a time. A new `update` replaces an `update`
+    still waiting at the end of the queue, so a burst of ticks on the same
+    bar collapses into one computation on the latest data; `add` (bar
+    close) events are never dropped and keep their order. A job waits while
+    one of its dependencies is running or still holds an event submitted
+    before its own, so it sees the data that event produces; events queued
+    after it do not hold it back, which keeps a steady tick stream on a
+    source from starving the indicators on top of it. Jobs that become ready
+    together start level by level: sources, then indicators, then
+    strategies.
+    """
+
+    def __init__(self, executor: Optional[Executor] = None):
+        self.executor = executor if executor is not None else ThreadPoolExecutor_global
+        self._lock = threading.RLock()
+        self._jobs: Dict[Hashable, _JOB] = {}
+        self.submitted = 0
+        self.dropped = 0
+        self.processed = 0
+        self.failed = 0
+        self._seq = 0
+
+    def register(self, job_id: Hashable, level: int = LEVEL_INDICATOR, depends_on: Iterable[Hashable] = ()):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                self._jobs[job_id] = _JOB(level, tuple(depends_on))
+            else:
+                job.level, job.depends_on = level, tuple(depends_on)
+
+    def unregister(self, job_id: Hashable):
+        "forget a job (indicator deleted); queued events are discarded"
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+            if job is not None:
+                self.dropped += len(job.queue)
+
+    def submit(self, job_id: Hashable, kind: str, fn: Callable, *args, **kwargs):
+        if kind not in (UPDATE, ADD):
+            raise ValueError(f"unknown event kind {kind!r}")
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                job = self._jobs[job_id] = _JOB(LEVEL_INDICATOR, ())
+            self.submitted += 1
+            if kind == UPDATE and job.queue and job.queue[-1][0] == UPDATE:
+                # the newer tick takes the place (and the order) of the one it supersedes
+                job.queue[-1] = (kind, fn, args, kwargs, job.queue[-1][4])
+                self.dropped += 1
+            else:
+                self._seq += 1
+                job.queue.append((kind, fn, args, kwargs, self._seq))
+            self._dispatch()
+
+    def update(self, job_id: Hashable, fn: Callable, *args, **kwargs):
+        self.submit(job_id, UPDATE, fn, *args, **kwargs)
+
+    def add(self, job_id: Hashable, fn: Callable, *args, **kwargs):
+        self.submit(job_id, ADD, fn, *args, **kwargs)
+
+    def _blocks(self, dep_id: Hashable, seq: int) -> bool:
+        "the dependency is running or has an event submitted before event `seq`"
+        dep = self._jobs.get(dep_id)
+        return dep is not None and (dep.running or (bool(dep.queue) and dep.queue[0][4] < seq))
+
+    def _dispatch(self):
+        # readiness is decided on the state before this pass starts anything,
+        # so a source restarting on its next tick can't hold back its dependents
+        ready: List[Tuple[int, int, Hashable, _JOB]] = []
+        for job_id, job in self._jobs.items():
+            if job.running or not job.queue:
+                continue
+            seq = job.queue[0][4]
+            if any(self._blocks(dep, seq) for dep in job.depends_on):
+                continue
+            ready.append((job.level, seq, job_id, job))
+        ready.sort(key=lambda item: item[:2])
+        for _, _, job_id, job in ready:
+            event = job.queue.popleft()
+            job.running = True
+            self.executor.submit(self._run, job_id, job, event)
+
+    def _run(self, job_id: Hashable, job: _JOB, event):
+        _, fn, args, kwargs, _ = event
+        try:
+            fn(*args, **kwargs)
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                job.running = False
+                self.processed += 1
+                self._dispatch()
+
+    def queue_depth(self, job_id: Optional[Hashable] = None) -> int:
+        with self._lock:
+            if job_id is not None:
+                job = self._jobs.get(job_id)
+                return 0 if job is None else len(job.queue)
+            return sum(len(job.queue) for job in self._jobs.values())
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "jobs": len(self._jobs),
+                "queued": sum(len(job.queue) for job in self._jobs.values()),
+                "running": sum(job.running for job in self._jobs.values()),
+                "submitted": self.submitted,
+                "dropped": self.dropped,
+                "processed": self.processed,
+                "failed": self.failed,
+            }
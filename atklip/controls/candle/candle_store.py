@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from atklip.controls.ohlcv import OHLCV
+
+
+INT_COLUMNS = ("index", "time")
+FLOAT_COLUMNS = ("open", "high", "low", "close", "volume", "hl2", "hlc3", "ohlc4")
+COLUMNS = INT_COLUMNS + FLOAT_COLUMNS
+DF_COLUMNS = ("index", "time", "open", "high", "low", "close", "volume", "hl2", "hlc3", "ohlc4")
+
+
+class CANDLE_STORE:
+    """Growable columnar OHLCV buffer used by the candle sources.
+
+    Every column lives in one preallocated NumPy array with free room on both
+    sides, so appending a live bar, prepending scroll-back history and
+    overwriting the forming bar are amortized O(1). All getters return views
+    into the buffers: they are only valid until the next append/prepend that
+    has to grow the store, so callers must not keep them across updates.
+    """
+
+    def __init__(self, capacity: int = 4096, precision: int = 6):
+        self._capacity = max(int(capacity), 16)
+        self._head = self._capacity // 4
+        self._size = 0
+        self.precision = precision
+        self._columns: Dict[str, np.ndarray] = {}
+        for name in INT_COLUMNS:
+            self._columns[name] = np.zeros(self._capacity, dtype=np.int64)
+        for name in FLOAT_COLUMNS:
+            self._columns[name] = np.zeros(self._capacity, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    @property
+    def first_index(self) -> int:
+        if self._size == 0:
+            return 0
+        return int(self._columns["index"][self._head])
+
+    @property
+    def last_index(self) -> int:
+        if self._size == 0:
+            return -1
+        return int(self._columns["index"][self._head + self._size - 1])
+
+    @property
+    def last_time(self) -> int:
+        if self._size == 0:
+            return -1
+        return int(self._columns["time"][self._head + self._size - 1])
+
+    def reset(self):
+        self._head = self._capacity // 4
+        self._size = 0
+
+    def _reserve(self, front: int = 0, back: int = 0):
+        "make sure there is room for `front` rows before and `back` rows after the data"
+        tail_room = self._capacity - self._head - self._size
+        if front <= self._head and back <= tail_room:
+            return
+        needed = self._size + front + back
+        capacity = self._capacity
+        while capacity < 2 * needed:
+            capacity *= 2
+        # keep a quarter of the new buffer free on the side that is asked to grow
+        head = front + (capacity - needed) // 4 if front else max(self._head, capacity // 8)
+        head = min(head, capacity - needed + front)
+        start, stop = self._head, self._head + self._size
+        for name, column in self._columns.items():
+            new_column = np.zeros(capacity, dtype=column.dtype)
+            new_column[head:head + self._size] = column[start:stop]
+            self._columns[name] = new_column
+        self._capacity = capacity
+        self._head = head
+
+    def _write(self, pos, _index, _time, _open, _high, _low, _close, _volume):
+        columns = self._columns
+        columns["index"][pos] = _index
+        columns["time"][pos] = _time
+        columns["open"][pos] = _open
+        columns["high"][pos] = _high
+        columns["low"][pos] = _low
+        columns["close"][pos] = _close
+        columns["volume"][pos] = _volume
+        columns["hl2"][pos] = round((_high + _low) / 2, self.precision)
+        columns["hlc3"][pos] = round((_high + _low + _close) / 3, self.precision)
+        columns["ohlc4"][pos] = round((_open + _high + _low + _close) / 4, self.precision)
+
+    def append(self, _time: int, _open: float, _high: float, _low: float, _close: float, _volume: float) -> int:
+        "add a new bar after the last one, return its bar index"
+        if self._size and _time <= self.last_time:
+            raise ValueError(f"candle time {_time} is not after the last candle {self.last_time}")
+        self._reserve(back=1)
+        _index = self.last_index + 1 if self._size else 0
+        self._write(self._head + self._size, _index, _time, _open, _high, _low, _close, _volume)
+        self._size += 1
+        return _index
+
+    def update_last(self, _time: int, _open: float, _high: float, _low: float, _close: float, _volume: float) -> int:
+        "overwrite the forming bar in place, return its bar index"
+        if self._size == 0:
+            return self.append(_time, _open, _high, _low, _close, _volume)
+        pos = self._head + self._size - 1
+        _index = self._columns["index"][pos]
+        self._write(pos, _index, _time, _open, _high, _low, _close, _volume)
+        return int(_index)
+
+    def upsert(self, _time: int, _open: float, _high: float, _low: float, _close: float, _volume: float) -> Tuple[int, bool]:
+        """update the last bar when `_time` matches it, otherwise append.
+        return (bar index, is_new_bar)"""
+        if self._size and _time == self.last_time:
+            return self.update_last(_time, _open, _high, _low, _close, _volume), False
+        return self.append(_time, _open, _high, _low, _close, _volume), True
+
+    @staticmethod
+    def _check_sorted(_time):
+        "the time lookups searchsorted the time column, bulk inputs must keep it strictly increasing"
+        _time = np.asarray(_time)
+        if _time.size > 1 and not np.all(np.diff(_time) > 0):
+            bad = int(np.flatnonzero(np.diff(_time) <= 0)[0])
+            raise ValueError(f"candle times must be sorted and unique, got {_time[bad]} then {_time[bad + 1]}")
+
+    def extend(self, _time, _open, _high, _low, _close, _volume):
+        "bulk append newer bars given as equal length arrays"
+        n = len(_time)
+        if n == 0:
+            return
+        self._check_sorted(_time)
+        if self._size and _time[0] <= self.last_time:
+            raise ValueError(f"candle time {_time[0]} is not after the last candle {self.last_time}")
+        self._reserve(back=n)
+        start = self.last_index + 1 if self._size else 0
+        self._fill(self._head + self._size, start, n, _time, _open, _high, _low, _close, _volume)
+        self._size += n
+
+    def prepend(self, _time, _open, _high, _low, _close, _volume):
+        "bulk insert older bars (scroll-back history) before the first one"
+        n = len(_time)
+        if n == 0:
+            return
+        self._check_sorted(_time)
+        if self._size and _time[-1] >= self._columns["time"][self._head]:
+            raise ValueError(f"candle time {_time[-1]} is not before the first candle")
+        self._reserve(front=n)
+        start = self.first_index - n if self._size else 0
+        self._head -= n
+        self._fill(self._head, start, n, _time, _open, _high, _low, _close, _volume)
+        self._size += n
+
+    def _fill(self, pos, start_index, n, _time, _open, _high, _low, _close, _volume):
+        columns = self._columns
+        sl = slice(pos, pos + n)
+        columns["index"][sl] = np.arange(start_index, start_index + n, dtype=np.int64)
+        columns["time"][sl] = _time
+        columns["open"][sl] = _open
+        columns["high"][sl] = _high
+        columns["low"][sl] = _low
+        columns["close"][sl] = _close
+        columns["volume"][sl] = _volume
+        o, h, l, c = columns["open"][sl], columns["high"][sl], columns["low"][sl], columns["close"][sl]
+        columns["hl2"][sl] = np.round((h + l) / 2, self.precision)
+        columns["hlc3"][sl] = np.round((h + l + c) / 3, self.precision)
+        columns["ohlc4"][sl] = np.round((o + h + l + c) / 4, self.precision)
+
+    def load(self, _time, _open, _high, _low, _close, _volume):
+        "replace the whole content, used by fisrt_gen_data"
+        n = len(_time)
+        self._check_sorted(_time)  # before the old content is dropped
+        if 2 * n > self._capacity:
+            capacity = self._capacity
+            while capacity < 2 * n:
+                capacity *= 2
+            for name, column in self._columns.items():
+                self._columns[name] = np.zeros(capacity, dtype=column.dtype)
+            self._capacity = capacity
+        self.reset()
+        self.extend(_time, _open, _high, _low, _close, _volume)
+
+    def _slice(self, start: int = 0, stop: int = 0) -> slice:
+        "python-like row slice where stop=0 means up to the last bar"
+        _start, _stop, _ = slice(start, stop if stop != 0 else None).indices(self._size)
+        return slice(self._head + _start, self._head + max(_start, _stop))
+
+    def column(self, name: str, start: int = 0, stop: int = 0) -> np.ndarray:
+        return self._columns[name][self._slice(start, stop)]
+
+    def columns(self, names, start: int = 0, stop: int = 0) -> List[np.ndarray]:
+        sl = self._slice(start, stop)
+        return [self._columns[name][sl] for name in names]
+
+    def get_times(self, start: int = 0, stop: int = 0) -> np.ndarray:
+        return self.column("time", start, stop)
+
+    def get_indexs(self, start: int = 0, stop: int = 0) -> np.ndarray:
+        return self.column("index", start, stop)
+
+    def get_values(self, start: int = 0, stop: int = 0) -> List[np.ndarray]:
+        return self.columns(("open", "high", "low", "close"), start, stop)
+
+    def get_volumes(self, start: int = 0, stop: int = 0) -> np.ndarray:
+        return self.column("volume", start, stop)
+
+    def get_index_data(self, start: int = 0, stop: int = 0) -> Tuple[np.ndarray, ...]:
+        return tuple(self.columns(("index", "open", "high", "low", "close"), start, stop))
+
+    def get_index_volumes(self, start: int = 0, stop: int = 0) -> Tuple[np.ndarray, ...]:
+        return tuple(self.columns(("index", "open", "close", "volume"), start, stop))
+
+    def get_index_source(self, source: str, start: int = 0, stop: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        "source is one of open/high/low/close/hl2/hlc3/ohlc4/volume"
+        return tuple(self.columns(("index", source), start, stop))
+
+    def get_df(self, n: int = 0) -> pd.DataFrame:
+        "DataFrame wrapping the column views of the last n bars (all when n=0), no copy"
+        start = -n if n > 0 else 0
+        sl = self._slice(start, 0)
+        data = {name: self._columns[name][sl] for name in DF_COLUMNS}
+        return pd.DataFrame(data, copy=False)
+
+    def _pos(self, pos: int) -> int:
+        if pos < 0:
+            pos += self._size
+        if not 0 <= pos < self._size:
+            raise IndexError(f"row {pos} out of range for {self._size} candles")
+        return self._head + pos
+
+    def index_to_row(self, index: int) -> int:
+        "row of a bar index, -1 when it is not stored. Bar indexes are contiguous"
+        row = index - self.first_index
+        return row if 0 <= row < self._size else -1
+
+    def index_of_time(self, _time: int) -> int:
+        "bar index of the candle opened at `_time`, -1 when there is none"
+        times = self.get_times()
+        row = int(np.searchsorted(times, _time))
+        if row < self._size and times[row] == _time:
+            return self.first_index + row
+        return -1
+
+    def nearest_index(self, _time: int) -> int:
+        "bar index of the candle whose open time is closest to `_time` (earlier on ties)"
+        if self._size == 0:
+            return -1
+        return self.first_index + nearest_row(self.get_times(), _time)
+
+    def floor_index(self, _time: int) -> int:
+        "bar index of the candle containing `_time` (last open time <= _time), -1 before the first"
+        row = int(np.searchsorted(self.get_times(), _time, side="right")) - 1
+        return self.first_index + row if row >= 0 else -1
+
+    def rows_by_time(self, start_time: int = None, end_time: int = None) -> Tuple[int, int]:
+        "[first, stop) rows of the candles with start_time <= time <= end_time"
+        times = self.get_times()
+        first = 0 if start_time is None else int(np.searchsorted(times, start_time, side="left"))
+        stop = self._size if end_time is None else int(np.searchsorted(times, end_time, side="right"))
+        return first, max(first, stop)
+
+    def slice_by_time(self, start_time: int = None, end_time: int = None,
+                      names=("index", "time", "open", "high", "low", "close", "volume")) -> List[np.ndarray]:
+        "views of the columns `names` for start_time <= time <= end_time"
+        first, stop = self.rows_by_time(start_time, end_time)
+        sl = slice(self._head + first, self._head + stop)
+        return [self._columns[name][sl] for name in names]
+
+    def get_row(self, pos: int) -> Tuple:
+        "raw tuple (index, time, open, high, low, close, volume) of a row, negative allowed"
+        p = self._pos(pos)
+        columns = self._columns
+        return (int(columns["index"][p]), int(columns["time"][p]), float(columns["open"][p]),
+                float(columns["high"][p]), float(columns["low"][p]), float(columns["close"][p]),
+                float(columns["volume"][p]))
+
+    def get_candle(self, pos: int) -> OHLCV:
+        "materialize one row as the OHLCV dataclass used by signals and graphics"
+        p = self._pos(pos)
+        columns = self._columns
+        return OHLCV(open=float(columns["open"][p]), high=float(columns["high"][p]),
+                     low=float(columns["low"][p]), close=float(columns["close"][p]),
+                     hl2=float(columns["hl2"][p]), hlc3=float(columns["hlc3"][p]),
+                     ohlc4=float(columns["ohlc4"][p]), volume=float(columns["volume"][p]),
+                     time=int(columns["time"][p]), index=int(columns["index"][p]))
+
+    def get_last_candle(self) -> OHLCV:
+        return self.get_candle(-1)
+
+    def get_n_last_candles(self, n: int) -> List[OHLCV]:
+        return [self.get_candle(i) for i in range(max(self._size - n, 0), self._size)]
+
+    def get_n_first_candles(self, n: int) -> List[OHLCV]:
+        return [self.get_candle(i) for i in range(min(n, self._size))]
+
+
+def nearest_row(values: np.ndarray, value) -> int:
+    """position of the element of a sorted array closest to `value`
+    (earlier on ties), O(log n). Replacement for linear nearest scans."""
+    size = len(values)
+    if size == 0:
+        return -1
+    row = int(np.searchsorted(values, value))
+    if row <= 0:
+        return 0
+    if row >= size:
+        return size - 1
+    return row - 1 if value - values[row - 1] <= values[row] - value else row
+
+
+class STORE_SOURCE:
+    "time lookups shared by every candle source backed by a CANDLE_STORE"
+    store: CANDLE_STORE
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def get_times(self, start: int = 0, stop: int = 0) -> np.ndarray:
+        return self.store.get_times(start, stop)
+
+    def index_of_time(self, _time: int) -> int:
+        return self.store.index_of_time(_time)
+
+    def nearest_index(self, _time: int) -> int:
+        return self.store.nearest_index(_time)
+
+    def floor_index(self, _time: int) -> int:
+        return self.store.floor_index(_time)
+
+    def slice_by_time(self, start_time: int = None, end_time: int = None, *args, **kwargs) -> List[np.ndarray]:
+        return self.store.slice_by_time(start_time, end_time, *args, **kwargs)
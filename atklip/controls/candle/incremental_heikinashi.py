@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+from typing import Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+from atklip.controls.candle.candle_store import CANDLE_STORE, STORE_SOURCE
+from atklip.controls.pandas_ta.utils._numba import np_ha
+
+
+class INCREMENTAL_HEIKINASHI(STORE_SOURCE):
+    """Heikin-Ashi bars kept in a CANDLE_STORE and advanced one bar at a time.
+
+    ha_open of a bar only depends on the previous HA bar, so a tick of the
+    forming raw bar rewrites the last HA row in place and a new raw bar
+    appends one row: both are O(1) whatever the history length. History is
+    built with the `np_ha` numba kernel. Scroll-back history changes every
+    HA bar (the recursion starts at the first bar), so `load` is used again
+    in that case.
+    """
+
+    def __init__(self, precision: int = 6, capacity: int = 4096):
+        self.store = CANDLE_STORE(capacity=capacity, precision=precision)
+        # HA open/close of the last closed bar, seed of the forming one
+        self._prev_open = np.nan
+        self._prev_close = np.nan
+
+    def load(self, times, _open, _high, _low, _close, _volume):
+        "vectorized historic pass over raw candles"
+        _open = np.ascontiguousarray(_open, dtype=np.float64)
+        _high = np.ascontiguousarray(_high, dtype=np.float64)
+        _low = np.ascontiguousarray(_low, dtype=np.float64)
+        _close = np.ascontiguousarray(_close, dtype=np.float64)
+        if len(times) == 0:
+            self.store.reset()
+            self._prev_open = self._prev_close = np.nan
+            return
+        ha_open, ha_high, ha_low, ha_close = np_ha(_open, _high, _low, _close)
+        self.store.load(times, ha_open, ha_high, ha_low, ha_close, _volume)
+        if len(times) > 1:
+            self._prev_open, self._prev_close = ha_open[-2], ha_close[-2]
+        else:
+            self._prev_open = self._prev_close = np.nan
+
+    def load_from(self, source: CANDLE_STORE):
+        self.load(*source.columns(("time", "open", "high", "low", "close", "volume")))
+
+    def _bar(self, _open, _high, _low, _close) -> Tuple[float, float, float, float]:
+        ha_close = 0.25 * (_open + _high + _low + _close)
+        if np.isnan(self._prev_open):
+            ha_open = 0.5 * (_open + _close)
+        else:
+            ha_open = 0.5 * (self._prev_open + self._prev_close)
+        ha_high = max(ha_open, ha_close, _high)
+        ha_low = min(ha_open, ha_close, _low)
+        return ha_open, ha_high, ha_low, ha_close
+
+    def update(self, _time: int, _open: float, _high: float, _low: float, _close: float,
+               _volume: float) -> Tuple[int, bool]:
+        """feed a raw bar, either a tick of the forming bar or a new bar.
+        return (bar index, is_new_bar)"""
+        store = self.store
+        if len(store) and _time == store.last_time:
+            row = self._bar(_open, _high, _low, _close)
+            return store.update_last(_time, *row, _volume), False
+        if len(store):
+            # the forming bar is now closed and seeds the next ha_open
+            _, _, self._prev_open, _, _, self._prev_close, _ = store.get_row(-1)
+        row = self._bar(_open, _high, _low, _close)
+        return store.append(_time, *row, _volume), True
+
+    def update_rows(self, rows: Iterable[Sequence[float]]) -> Optional[Tuple[int, bool]]:
+        """feed the last raw bars as fetched (the closing bar, then the new
+        one), so a final tick that only comes with the new bar still reaches
+        the closed HA bar; rows before the last stored bar are skipped.
+        return the (bar index, is_new_bar) of the last row fed"""
+        result = None
+        for row in rows:
+            if len(self.store) and row[0] < self.store.last_time:
+                continue
+            result = self.update(*row)
+        return result
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from numba import njit
+
+from atklip.controls.candle.candle_store import CANDLE_STORE, STORE_SOURCE
+from atklip.controls.stream_kernels import MA_KINDS, ma_state_size, nb_ma_update
+
+
+# `state` has one MA block per (stage, column) row
+@njit(cache=True)
+def nb_smooth_bar(x4, kinds, lengths, state, commit):
+    "run one raw OHLC bar through every stage, return the smoothed OHLC"
+    out = x4.copy()
+    for s in range(kinds.size):
+        for j in range(4):
+            out[j] = nb_ma_update(kinds[s], lengths[s], state[4 * s + j], out[j], commit)
+    return out
+
+
+@njit(cache=True)
+def nb_smooth_ohlc(np_open, np_high, np_low, np_close, kinds, lengths, state):
+    """batch pass: commit every bar but the last one, which is only evaluated
+    so that the state is left right before the forming bar"""
+    m = np_close.size
+    result = np.empty((m, 4), dtype=np.float64)
+    x4 = np.empty(4, dtype=np.float64)
+    for i in range(m):
+        x4[0], x4[1], x4[2], x4[3] = np_open[i], np_high[i], np_low[i], np_close[i]
+        result[i] = nb_smooth_bar(x4, kinds, lengths, state, i < m - 1)
+    return result
+
+
+class INCREMENTAL_SMOOTH_CANDLE(STORE_SOURCE):
+    """Moving average of OHLC, optionally applied N times, with per-stage state.
+
+    Each stage keeps only what its MA needs (last value for ema/rma/smma,
+    the window for sma/wma), so a tick of the forming bar or a new bar costs
+    O(stages x window) instead of rerunning every MA over the whole
+    history. The historic pass runs the same step function, so streaming and
+    batch results are identical. Rows where the last stage is still warming
+    up are NaN and keep the index of the raw bar they come from.
+    """
+
+    def __init__(self, stages: Sequence[Tuple[str, int]], precision: int = 6, capacity: int = 4096):
+        for mamode, length in stages:
+            if mamode not in MA_KINDS:
+                raise ValueError(f"{mamode} has no incremental form, use one of {list(MA_KINDS)}")
+            if int(length) < 1:
+                raise ValueError("ma length must be >= 1")
+        self.stages: List[Tuple[str, int]] = [(mamode, int(length)) for mamode, length in stages]
+        self.kinds = np.array([MA_KINDS[mamode] for mamode, _ in self.stages], dtype=np.int64)
+        self.lengths = np.array([length for _, length in self.stages], dtype=np.int64)
+        self.store = CANDLE_STORE(capacity=capacity, precision=precision)
+        self._forming = None
+        self._reset_state()
+
+    @classmethod
+    def from_params(cls, mamode: str, ma_leng: int, n_smooth: int = 1, n_smooth_ma_leng: int = None, **kwargs):
+        """SMOOTH_CANDLE is (mamode, ma_leng) once; N_SMOOTH_CANDLE repeats the
+        smoothing n_smooth times with n_smooth_ma_leng"""
+        stages = [(mamode, ma_leng)]
+        stages += [(mamode, n_smooth_ma_leng or ma_leng)] * (n_smooth - 1)
+        return cls(stages, **kwargs)
+
+    def _reset_state(self):
+        self._state = np.zeros((4 * len(self.stages), ma_state_size(self.lengths.max())), dtype=np.float64)
+        self._state[:, 2] = np.nan
+
+    @property
+    def warmup(self) -> int:
+        "number of leading raw bars without a smoothed value (the rma has none)"
+        return int((self.lengths - 1)[self.kinds != MA_KINDS["rma"]].sum())
+
+    def load(self, times, _open, _high, _low, _close, _volume):
+        self._reset_state()
+        _open, _high, _low, _close = (np.ascontiguousarray(x, dtype=np.float64) for x in (_open, _high, _low, _close))
+        if len(times) == 0:
+            self.store.reset()
+            self._forming = None
+            return
+        result = nb_smooth_ohlc(_open, _high, _low, _close, self.kinds, self.lengths, self._state)
+        self.store.load(times, result[:, 0], result[:, 1], result[:, 2], result[:, 3], _volume)
+        self._forming = np.array([_open[-1], _high[-1], _low[-1], _close[-1]], dtype=np.float64)
+
+    def load_from(self, source: CANDLE_STORE):
+        self.load(*source.columns(("time", "open", "high", "low", "close", "volume")))
+
+    def update(self, _time: int, _open: float, _high: float, _low: float, _close: float,
+               _volume: float) -> Tuple[int, bool]:
+        """feed a raw bar (tick of the forming bar or a new bar),
+        return (bar index, is_new_bar)"""
+        store = self.store
+        is_new = not (len(store) and _time == store.last_time)
+        if is_new and self._forming is not None:
+            # the previous forming bar is closed: advance the state with it
+            nb_smooth_bar(self._forming, self.kinds, self.lengths, self._state, True)
+        self._forming = np.array([_open, _high, _low, _close], dtype=np.float64)
+        o, h, l, c = nb_smooth_bar(self._forming, self.kinds, self.lengths, self._state, False)
+        if is_new:
+            return store.append(_time, o, h, l, c, _volume), True
+        return store.update_last(_time, o, h, l, c, _volume), False
+
+    def update_rows(self, rows: Iterable[Sequence[float]]) -> Optional[Tuple[int, bool]]:
+        """feed the last raw bars as fetched (the closing bar, then the new
+        one), so a final tick that only comes with the new bar is committed
+        to the state; rows before the last stored bar are skipped.
+        return the (bar index, is_new_bar) of the last row fed"""
+        result = None
+        for row in rows:
+            if len(self.store) and row[0] < self.store.last_time:
+                continue
+            result = self.update(*row)
+        return result
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from atklip.controls.candle.candle_store import CANDLE_STORE
+from atklip.controls.pandas_ta.utils._nb_resample import nb_resample_ohlcv
+from atklip.exchanges.ohlcv_cache import DAY_MS, bar_open_time, timeframe_offset, timeframe_to_ms
+
+
+def month_open_times(times, months: int = 1) -> np.ndarray:
+    "open time of the `months` month bar holding each time, on the 1st like bar_open_time"
+    index = np.asarray(times, dtype=np.int64).astype("datetime64[ms]").astype("datetime64[M]").astype(np.int64)
+    index -= index % months
+    return index.astype("datetime64[M]").astype("datetime64[ms]").astype(np.int64)
+
+
+def resample_ohlcv(times, _open, _high, _low, _close, _volume, timeframe: str):
+    """vectorized 1m -> timeframe aggregation of sorted bars, returns
+    (time, open, high, low, close, volume) arrays of the higher timeframe"""
+    times = np.ascontiguousarray(times, dtype=np.int64)
+    step, offset = timeframe_to_ms(timeframe), timeframe_offset(timeframe)
+    if timeframe.endswith("M"):
+        # months have no fixed length: bucket on the month open time, a step
+        # of 1 ms then keeps each distinct time as its own bucket
+        times, step = month_open_times(times, int(timeframe[:-1])), 1
+    return nb_resample_ohlcv(times,
+                             np.ascontiguousarray(_open, dtype=np.float64),
+                             np.ascontiguousarray(_high, dtype=np.float64),
+                             np.ascontiguousarray(_low, dtype=np.float64),
+                             np.ascontiguousarray(_close, dtype=np.float64),
+                             np.ascontiguousarray(_volume, dtype=np.float64),
+                             step, offset)
+
+
+def resample_many(times, _open, _high, _low, _close, _volume, timeframes: List[str]) -> Dict[str, tuple]:
+    """resample_ohlcv for several timeframes sharing the work: timeframes are
+    built from the shortest to the longest and each one aggregates the
+    largest already built timeframe whose buckets nest in its own (4h from
+    1h, 1w from 1d), so only the shortest one reads the base bars"""
+    built: Dict[str, tuple] = {}
+    steps = {timeframe: (timeframe_to_ms(timeframe), timeframe_offset(timeframe)) for timeframe in timeframes}
+    for timeframe in sorted(steps, key=lambda x: steps[x][0]):
+        step, offset = steps[timeframe]
+        source = (times, _open, _high, _low, _close, _volume)
+        for parent in sorted(built, key=lambda x: steps[x][0], reverse=True):
+            parent_step, parent_offset = steps[parent]
+            if parent.endswith("M"):
+                # calendar months only nest in months (1M in 3M)
+                nests = timeframe.endswith("M") and int(timeframe[:-1]) % int(parent[:-1]) == 0
+            elif timeframe.endswith("M"):
+                # and hold whole days, so any bar splitting a day nests in them
+                nests = DAY_MS % parent_step == 0 and parent_offset == 0
+            else:
+                nests = step % parent_step == 0 and (offset - parent_offset) % parent_step == 0
+            if nests:
+                source = built[parent]
+                break
+        built[timeframe] = resample_ohlcv(*source, timeframe)
+    return {timeframe: built[timeframe] for timeframe in timeframes}
+
+
+class _BUCKET:
+    "running aggregate of the closed base bars of the forming higher timeframe bar"
+    __slots__ = ("time", "open", "high", "low", "close", "volume", "empty")
+
+    def __init__(self):
+        self.time = -1
+        self.empty = True
+        self.open = self.high = self.low = self.close = self.volume = 0.0
+
+    def start(self, _time):
+        self.time = _time
+        self.empty = True
+
+    def add(self, _open, _high, _low, _close, _volume):
+        if self.empty:
+            self.open, self.high, self.low = _open, _high, _low
+            self.volume = _volume
+            self.empty = False
+        else:
+            self.high = max(self.high, _high)
+            self.low = min(self.low, _low)
+            self.volume += _volume
+        self.close = _close
+
+
+class RESAMPLER:
+    """Derive every higher timeframe of a symbol from one 1m feed.
+
+    History is aggregated with `nb_resample_ohlcv` in one pass per timeframe.
+    Live bars go through `update`: each higher timeframe keeps the aggregate
+    of its already closed 1m bars, so a tick of the forming 1m bar (or a new
+    1m bar) costs O(1) per timeframe whatever the history length. A single
+    watch_ohlcv subscription on the base timeframe can therefore feed all
+    timeframes, and switching timeframe needs no network round trip.
+    """
+
+    def __init__(self, base: CANDLE_STORE, base_timeframe: str = "1m", precision: int = 6):
+        self.base = base
+        self.base_timeframe = base_timeframe
+        self.base_step = timeframe_to_ms(base_timeframe)
+        self.precision = precision
+        self.stores: Dict[str, CANDLE_STORE] = {}
+        self._buckets: Dict[str, _BUCKET] = {}
+
+    @property
+    def timeframes(self) -> List[str]:
+        return list(self.stores)
+
+    def add_timeframe(self, timeframe: str) -> CANDLE_STORE:
+        "register a timeframe and build its history from the base bars"
+        if timeframe in self.stores:
+            return self.stores[timeframe]
+        step = timeframe_to_ms(timeframe)
+        if step % self.base_step != 0:
+            raise ValueError(f"{timeframe} is not a multiple of {self.base_timeframe}")
+        store = CANDLE_STORE(capacity=max(len(self.base) * self.base_step // step * 2, 16),
+                             precision=self.precision)
+        self.stores[timeframe] = store
+        self._buckets[timeframe] = _BUCKET()
+        self._rebuild(timeframe)
+        return store
+
+    def remove_timeframe(self, timeframe: str):
+        self.stores.pop(timeframe, None)
+        self._buckets.pop(timeframe, None)
+
+    def get_store(self, timeframe: str) -> CANDLE_STORE:
+        if timeframe == self.base_timeframe:
+            return self.base
+        return self.add_timeframe(timeframe)
+
+    def _rebuild(self, timeframe: str):
+        store, bucket = self.stores[timeframe], self._buckets[timeframe]
+        times, _open, _high, _low, _close, _volume = self.base.columns(("time", "open", "high", "low", "close", "volume"))
+        if len(times) == 0:
+            store.reset()
+            bucket.start(-1)
+            return
+        store.load(*resample_ohlcv(times, _open, _high, _low, _close, _volume, timeframe))
+        # re-seed the running aggregate with the closed base bars of the last bucket
+        bucket.start(store.last_time)
+        first = int(np.searchsorted(times, store.last_time))
+        for i in range(first, len(times) - 1):
+            bucket.add(_open[i], _high[i], _low[i], _close[i], _volume[i])
+
+    def reload(self):
+        "call after the base history changed in bulk (first load, scroll-back)"
+        for timeframe in self.stores:
+            self._rebuild(timeframe)
+
+    def update(self, _time: int, _open: float, _high: float, _low: float, _close: float,
+               _volume: float) -> List[Tuple[str, int, bool]]:
+        """push a live base bar (forming update or new bar) into the base store and
+        every registered timeframe; returns (timeframe, bar index, is_new_bar) for
+        each of them, base timeframe first"""
+        base = self.base
+        if len(base) and _time == base.last_time:
+            events = [(self.base_timeframe, base.update_last(_time, _open, _high, _low, _close, _volume), False)]
+            closed = None
+        else:
+            closed = base.get_row(-1) if len(base) else None
+            events = [(self.base_timeframe, base.append(_time, _open, _high, _low, _close, _volume), True)]
+        for timeframe, store in self.stores.items():
+            bucket = self._buckets[timeframe]
+            bucket_time = bar_open_time(_time, timeframe)
+            if closed is not None and bucket.time == bucket_time:
+                # the previous base bar belongs to the forming bucket and is now closed
+                bucket.add(*closed[2:])
+            if bucket_time != bucket.time:
+                bucket.start(bucket_time)
+            if bucket.empty:
+                row = (bucket_time, _open, _high, _low, _close, _volume)
+            else:
+                row = (bucket_time, bucket.open, max(bucket.high, _high), min(bucket.low, _low),
+                       _close, bucket.volume + _volume)
+            index, is_new = store.upsert(*row)
+            events.append((timeframe, index, is_new))
+        return events
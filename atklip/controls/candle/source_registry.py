@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+
+SourceKey = Tuple[Hashable, ...]
+
+
+def source_key(exchange_id: str, symbol: str, interval: str, source_name: str = "japan", *params) -> SourceKey:
+    "key of a candle source: (exchange_id, symbol, interval, source name, extra params...)"
+    return (exchange_id, symbol, interval, source_name, *params)
+
+
+class _ENTRY:
+    __slots__ = ("source", "owners", "subscription", "dispose", "parent")
+
+    def __init__(self, source, dispose, parent):
+        self.source = source
+        # owner -> number of acquires not released yet
+        self.owners: Dict[Hashable, int] = {}
+        self.subscription = None
+        self.dispose = dispose
+        self.parent = parent
+
+
+class SOURCE_REGISTRY:
+    """Reference counted candle sources shared by every chart, tab and SubChart.
+
+    Chart.generate_source asks the registry for a key instead of building its
+    own JAPAN_CANDLE/HEIKINASHI: the first owner runs `factory` (and
+    `subscribe`, which starts the single loop_watch_ohlcv task of the key),
+    later owners get the same object. When the last owner releases the key
+    the live subscription is cancelled, `dispose` runs and the entry goes
+    away. A derived source (Heikin-Ashi, smoothed candles, indicators) names
+    its `parent` key and keeps it alive for as long as it exists itself.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries: Dict[SourceKey, _ENTRY] = {}
+        self._owned: Dict[Hashable, Set[SourceKey]] = {}
+
+    def acquire(self, key: SourceKey, owner: Hashable, factory: Callable[[], Any],
+                subscribe: Optional[Callable[[Any], Any]] = None,
+                dispose: Optional[Callable[[Any], None]] = None,
+                parent: Optional[SourceKey] = None):
+        """return the shared source of `key`, creating it on first use.
+        `subscribe(source)` may return a handle with `cancel()` (asyncio Task,
+        Future...) that is cancelled on the last release"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                if parent is not None and parent not in self._entries:
+                    raise KeyError(f"parent source {parent} must be acquired before {key}")
+                entry = _ENTRY(factory(), dispose, parent)
+                if parent is not None:
+                    self._add_owner(parent, key)
+                self._entries[key] = entry
+                if subscribe is not None:
+                    try:
+                        entry.subscription = subscribe(entry.source)
+                    except BaseException:
+                        # no owner ever saw this source: undo the creation
+                        del self._entries[key]
+                        self._close(key, entry)
+                        raise
+            self._add_owner(key, owner)
+            return entry.source
+
+    def _add_owner(self, key: SourceKey, owner: Hashable):
+        owners = self._entries[key].owners
+        owners[owner] = owners.get(owner, 0) + 1
+        self._owned.setdefault(owner, set()).add(key)
+
+    def release(self, key: SourceKey, owner: Hashable, every: bool = False) -> bool:
+        """drop one acquire of `key` by `owner` (every one of them with `every`),
+        return True when the source was destroyed"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or owner not in entry.owners:
+                return False
+            entry.owners[owner] -= 1
+            if entry.owners[owner] > 0 and not every:
+                return False
+            del entry.owners[owner]
+            owned = self._owned.get(owner)
+            if owned is not None:
+                owned.discard(key)
+                if not owned:
+                    del self._owned[owner]
+            if entry.owners:
+                return False
+            del self._entries[key]
+        self._close(key, entry)
+        return True
+
+    def _close(self, key: SourceKey, entry: _ENTRY):
+        if entry.subscription is not None and hasattr(entry.subscription, "cancel"):
+            entry.subscription.cancel()
+        if entry.dispose is not None:
+            entry.dispose(entry.source)
+        # a derived source owns its parent under its own key
+        if entry.parent is not None:
+            self.release(entry.parent, key)
+
+    def release_owner(self, owner: Hashable) -> List[SourceKey]:
+        "release everything held by a chart that is closing, return destroyed keys"
+        with self._lock:
+            keys = list(self._owned.get(owner, ()))
+            before = list(self._entries)
+        for key in keys:
+            self.release(key, owner, every=True)
+        return [key for key in before if key not in self._entries]
+
+    def get(self, key: SourceKey):
+        with self._lock:
+            entry = self._entries.get(key)
+            return None if entry is None else entry.source
+
+    def set_subscription(self, key: SourceKey, subscription):
+        "replace the live subscription of a key (e.g. after an exchange reconnect)"
+        with self._lock:
+            entry = self._entries[key]
+            if entry.subscription is not None and hasattr(entry.subscription, "cancel"):
+                entry.subscription.cancel()
+            entry.subscription = subscription
+
+    def refcount(self, key: SourceKey) -> int:
+        with self._lock:
+            entry = self._entries.get(key)
+            return 0 if entry is None else sum(entry.owners.values())
+
+    def keys(self) -> List[SourceKey]:
+        with self._lock:
+            return list(self._entries)
+
+    def __contains__(self, key: SourceKey) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+SOURCE_REGISTRY_global = SOURCE_REGISTRY()
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+# number of bars each pattern looks at (CandlestickFinder.required_count)
+PATTERNS: Dict[str, int] = {
+    "bearish_engulfing": 2,
+    "bearish_harami": 2,
+    "bullish_engulfing": 2,
+    "bullish_harami": 2,
+    "dark_cloud_cover": 2,
+    "doji": 1,
+    "doji_star": 2,
+    "dragonfly_doji": 1,
+    "evening_star": 3,
+    "evening_star_doji": 3,
+    "gravestone_doji": 1,
+    "hammer": 1,
+    "hanging_man": 3,
+    "inverted_hammer": 1,
+    "morning_star": 3,
+    "morning_star_doji": 3,
+    "piercing_pattern": 2,
+    "rain_drop": 2,
+    "rain_drop_doji": 2,
+    "shooting_star": 2,
+    "star": 2,
+}
+LOOKBACK = max(PATTERNS.values())
+
+
+def _shift(x: np.ndarray, n: int) -> np.ndarray:
+    result = np.empty_like(x)
+    result[:n] = np.nan
+    result[n:] = x[:-n]
+    return result
+
+
+def detect_patterns(_open, _high, _low, _close) -> Dict[str, np.ndarray]:
+    """every pattern of the candle_pattern finders as one boolean array each.
+    Body, shadows and ranges are computed once for the whole series; bars
+    without enough history are False"""
+    o, h, l, c = (np.asarray(x, dtype=np.float64) for x in (_open, _high, _low, _close))
+    # prev (p) and before prev (b) bars
+    po, ph, pl, pc = (_shift(x, 1) for x in (o, h, l, c))
+    bo, bh, bl, bc = (_shift(x, 2) for x in (o, h, l, c))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        body = np.abs(c - o)
+        rng = h - l
+        upper = h - np.maximum(c, o)
+        lower = np.minimum(c, o) - l
+        body_ratio = body / rng
+        p_body = np.abs(pc - po)
+        p_ratio = p_body / (ph - pl)
+        b_ratio = np.abs(bc - bo) / (bh - bl)
+        p_top, p_bottom = np.maximum(po, pc), np.minimum(po, pc)
+        low_close = (c - l) / (.001 + rng)
+        low_open = (o - l) / (.001 + rng)
+        high_close = (h - c) / (.001 + rng)
+        high_open = (h - o) / (.001 + rng)
+
+        doji = (body_ratio < 0.1) & (upper > 3 * body) & (lower > 3 * body)
+        p_white_long = (pc > po) & (p_ratio >= 0.7)
+        p_black_long = (pc < po) & (p_ratio >= 0.7)
+
+        result = {
+            "bearish_engulfing": (o >= pc) & (pc > po) & (o > c) & (po >= c) & (o - c > pc - po),
+            "bearish_harami": (pc > po) & (po <= c) & (c < o) & (o <= pc) & (o - c < pc - po),
+            "bullish_engulfing": (c >= po) & (po > pc) & (c > o) & (pc >= o) & (c - o > po - pc),
+            "bullish_harami": (po > pc) & (pc <= o) & (o < c) & (c <= po) & (c - o < po - pc),
+            "dark_cloud_cover": p_white_long & (c < o) & (body_ratio >= 0.7) & (o >= pc)
+                                & (po < c) & (c < (po + pc) / 2),
+            "doji": doji,
+            "doji_star": p_white_long & doji & (pc < c) & (pc < o),
+            "dragonfly_doji": (body_ratio < 0.1) & (lower > 3 * body) & (upper < body),
+            "evening_star": (p_bottom > bc) & (bc > bo) & (c < o) & (o < p_bottom),
+            "evening_star_doji": (bc > bo) & (b_ratio >= 0.7) & (p_ratio < 0.1) & (c < o)
+                                 & (body_ratio >= 0.7) & (bc < pc) & (bc < po) & (pc > o)
+                                 & (po > o) & (c < bc),
+            "gravestone_doji": (body_ratio < 0.1) & (upper > 3 * body) & (lower <= body),
+            "hammer": (rng > 3 * (o - c)) & (low_close > 0.6) & (low_open > 0.6),
+            "hanging_man": (rng > 4 * (o - c)) & (low_close >= 0.75) & (low_open >= 0.75)
+                           & (bh < po) & (ph < o),
+            "inverted_hammer": (rng > 3 * (o - c)) & (high_close > 0.6) & (high_open > 0.6),
+            "morning_star": (p_top < bc) & (bc < bo) & (c > o) & (o > p_top),
+            "morning_star_doji": (bc < bo) & (b_ratio >= 0.7) & (p_ratio < 0.1) & (c > o)
+                                 & (body_ratio >= 0.7) & (bc > pc) & (bc > po) & (pc < o)
+                                 & (po < o) & (c > bc) & (p_top - pl > 3 * p_body)
+                                 & (ph - p_top > 3 * p_body),
+            "piercing_pattern": (pc < po) & (o < pl) & (po > c) & (c > pc + (po - pc) / 2),
+            "rain_drop": p_black_long & (body_ratio < 0.3) & (body_ratio >= 0.1) & (pc > c) & (pc > o),
+            "rain_drop_doji": p_black_long & (body_ratio < 0.1) & (pc > c) & (pc > o),
+            "shooting_star": (po < pc) & (pc < o) & (upper >= body * 3) & (lower <= body),
+            "star": p_white_long & (body_ratio < 0.3) & (body_ratio >= 0.1) & (pc < c) & (pc < o),
+        }
+    return result
+
+
+def patterns_frame(df: pd.DataFrame, ohlc: Tuple[str, str, str, str] = ("open", "high", "low", "close")) -> pd.DataFrame:
+    "detect_patterns over the ohlc columns of df, one bool column per pattern"
+    return pd.DataFrame(detect_patterns(*(df[name].to_numpy() for name in ohlc)), index=df.index)
+
+
+class CANDLE_PATTERN_SCANNER:
+    """All candle patterns of a source, vectorized on load and incremental on live bars.
+
+    `load` scans the history in one pass. A pattern only looks at the last
+    three bars, so `add` (new bar) and `update` (tick of the forming bar)
+    evaluate the same expressions on a three bar window and write only the
+    flags of the last bar.
+    """
+
+    def __init__(self, capacity: int = 4096):
+        self.capacity = capacity
+        self.reset()
+
+    def reset(self):
+        self._size = 0
+        self._flags = np.zeros((self.capacity, len(PATTERNS)), dtype=np.bool_)
+        # ohlc of the last LOOKBACK bars, oldest first
+        self._tail = np.empty((0, 4), dtype=np.float64)
+
+    def __len__(self):
+        return self._size
+
+    def _grow(self, size: int):
+        if size > self._flags.shape[0]:
+            grown = np.zeros((max(size, 2 * self._flags.shape[0]), len(PATTERNS)), dtype=np.bool_)
+            grown[:self._size] = self._flags[:self._size]
+            self._flags = grown
+
+    def load(self, _open, _high, _low, _close) -> Dict[str, np.ndarray]:
+        result = detect_patterns(_open, _high, _low, _close)
+        m = len(_close)
+        self._size = 0
+        self._grow(m)
+        self._flags[:m] = np.column_stack(list(result.values())) if m else self._flags[:0]
+        self._size = m
+        self._tail = np.column_stack([np.asarray(x, dtype=np.float64)[-LOOKBACK:]
+                                      for x in (_open, _high, _low, _close)])
+        return result
+
+    def _eval_last(self) -> Dict[str, bool]:
+        flags = detect_patterns(*self._tail.T)
+        self._flags[self._size - 1] = [v[-1] for v in flags.values()]
+        return {name: bool(v[-1]) for name, v in flags.items()}
+
+    def add(self, _open: float, _high: float, _low: float, _close: float) -> Dict[str, bool]:
+        "a new bar opened"
+        self._tail = np.vstack([self._tail, [_open, _high, _low, _close]])[-LOOKBACK:]
+        self._grow(self._size + 1)
+        self._size += 1
+        return self._eval_last()
+
+    def update(self, _open: float, _high: float, _low: float, _close: float) -> Dict[str, bool]:
+        "a tick of the forming bar"
+        if self._size == 0:
+            return self.add(_open, _high, _low, _close)
+        self._tail[-1] = (_open, _high, _low, _close)
+        return self._eval_last()
+
+    def get(self, name: str) -> np.ndarray:
+        return self._flags[:self._size, list(PATTERNS).index(name)]
+
+    def found(self, index: int = -1):
+        "names of the patterns on the bar at position `index`"
+        return [name for name, flag in zip(PATTERNS, self._flags[:self._size][index]) if flag]
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+from numba import njit
+
+from atklip.controls.pandas_ta.utils._nb_rolling import (nb_rolling_max,
+                                                         nb_rolling_mean,
+                                                         nb_rolling_min,
+                                                         nb_rolling_std)
+from atklip.controls.pandas_ta.utils._numba import nb_shift
+
+
+# Least squares line of y[i - n:i] against x = i - n .. i - 1 for every i,
+# like the per-window linalg.lstsq of detect_trendline. The window sums
+# sum(y) and sum(k * y) (k local to the window) slide in O(1) and are
+# recomputed exactly once per window to stop rounding drift.
+@njit(cache=True)
+def nb_rolling_linreg(y, n):
+    m = y.size
+    slope = np.full(m, np.nan)
+    intercept = np.full(m, np.nan)
+    if n < 2 or m <= n:
+        return slope, intercept
+
+    sx = n * (n - 1) / 2.0
+    sxx = (n - 1) * n * (2 * n - 1) / 6.0
+    denom = n * sxx - sx * sx
+    sy, sky = 0.0, 0.0
+    for i in range(n, m):
+        s = i - n
+        if s % n == 0:
+            sy, sky = 0.0, 0.0
+            for k in range(n):
+                sy += y[s + k]
+                sky += k * y[s + k]
+        else:
+            # window moved from s - 1 to s
+            sy += y[s + n - 1] - y[s - 1]
+            sky += n * y[s + n - 1] - sy
+        b = (n * sky - sx * sy) / denom
+        slope[i] = b
+        # intercept of the line in absolute bar positions
+        intercept[i] = (sy - b * sx) / n - b * s
+    return slope, intercept
+
+
+# HH=1, LL=2, LH=3, HL=4, later codes win like the masks of find_pivots
+@njit(cache=True)
+def nb_find_pivots(high, low):
+    m = high.size
+    result = np.zeros(m, dtype=np.int8)
+    for i in range(1, m - 1):
+        hd, hd_next = high[i] - high[i - 1], high[i + 1] - high[i]
+        ld, ld_next = low[i] - low[i - 1], low[i + 1] - low[i]
+        if hd > 0 and hd_next < 0:
+            result[i] = 1
+        if ld < 0 and ld_next > 0:
+            result[i] = 2
+        if hd < 0 and hd_next > 0:
+            result[i] = 3
+        if ld > 0 and ld_next < 0:
+            result[i] = 4
+    return result
+
+
+PIVOT_LABELS = ("", "HH", "LL", "LH", "HL")
+
+# column -> (label when 1, label when -1)
+PATTERN_LABELS: Dict[str, Tuple[str, str]] = {
+    "head_shoulder_pattern": ("Head and Shoulder", "Inverse Head and Shoulder"),
+    "multiple_top_bottom_pattern": ("Multiple Top", "Multiple Bottom"),
+    "triangle_pattern": ("Ascending Triangle", "Descending Triangle"),
+    "wedge_pattern": ("Wedge Up", "Wedge Down"),
+    "channel_pattern": ("Channel Up", "Channel Down"),
+    "double_pattern": ("Double Top", "Double Bottom"),
+}
+
+
+def _code(up: np.ndarray, down: np.ndarray) -> np.ndarray:
+    "1 / -1 / 0, the down mask is assigned last like the .loc writes"
+    return np.where(down, -1, np.where(up, 1, 0)).astype(np.int8)
+
+
+def pattern_codes(high, low, close, window: int = 3, threshold: float = 0.05,
+                  channel_range: float = 0.1) -> Dict[str, np.ndarray]:
+    """every tradingpatterns mask as an int8 array (1 first label, -1 second
+    label, 0 none), computed once per series with O(n) rolling kernels"""
+    high, low, close = (np.ascontiguousarray(x, dtype=np.float64) for x in (high, low, close))
+    high_roll_max = nb_rolling_max(high, window)
+    low_roll_min = nb_rolling_min(low, window)
+    close_roll_max = nb_rolling_max(close, window)
+    close_roll_min = nb_rolling_min(close, window)
+    h1, l1, c1 = nb_shift(high, 1), nb_shift(low, 1), nb_shift(close, 1)
+    hn, ln = nb_shift(high, -1), nb_shift(low, -1)
+    # sign of x[-1] - x[0] over the window, the trend_high/trend_low lambdas
+    trend_high = np.sign(high - nb_shift(high, window - 1))
+    trend_low = np.sign(low - nb_shift(low, window - 1))
+
+    with np.errstate(invalid="ignore"):
+        widening = (high_roll_max >= h1) & (low_roll_min <= l1)
+        narrowing = (high_roll_max <= h1) & (low_roll_min >= l1)
+        tight = high_roll_max - low_roll_min <= channel_range * (high_roll_max + low_roll_min) / 2
+        prev_tight = h1 - l1 <= threshold * (h1 + l1) / 2
+        next_tight = hn - ln <= threshold * (hn + ln) / 2
+        high_dip = (high < h1) & (high < hn)
+        low_peak = (low > l1) & (low > ln)
+        return {
+            "head_shoulder_pattern": _code(
+                (high_roll_max > h1) & (high_roll_max > hn) & high_dip,
+                (low_roll_min < l1) & (low_roll_min < ln) & low_peak),
+            "multiple_top_bottom_pattern": _code(
+                (high_roll_max >= h1) & (close_roll_max < c1),
+                (low_roll_min <= l1) & (close_roll_min > c1)),
+            "triangle_pattern": _code(widening & (close > c1), narrowing & (close < c1)),
+            "wedge_pattern": _code(widening & (trend_high == 1) & (trend_low == 1),
+                                   narrowing & (trend_high == -1) & (trend_low == -1)),
+            "channel_pattern": _code(widening & tight & (trend_high == 1) & (trend_low == 1),
+                                     narrowing & tight & (trend_high == -1) & (trend_low == -1)),
+            "double_pattern": _code(
+                (high_roll_max >= h1) & (high_roll_max >= hn) & high_dip & prev_tight & next_tight,
+                (low_roll_min <= l1) & (low_roll_min <= ln) & low_peak & prev_tight & next_tight),
+        }
+
+
+def support_resistance(high, low, window: int = 3, std_dev: float = 2.0) -> Tuple[np.ndarray, np.ndarray]:
+    "calculate_support_resistance: rolling mean -/+ std_dev rolling std"
+    high, low = (np.ascontiguousarray(x, dtype=np.float64) for x in (high, low))
+    support = nb_rolling_mean(low, window) - std_dev * nb_rolling_std(low, window, 1)
+    resistance = nb_rolling_mean(high, window) + std_dev * nb_rolling_std(high, window, 1)
+    return support, resistance
+
+
+def trendline(close, window: int = 2) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    "detect_trendline: (slope, intercept, support, resistance)"
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    slope, intercept = nb_rolling_linreg(close, window)
+    line = close * slope + intercept
+    with np.errstate(invalid="ignore"):
+        support = np.where(slope > 0, line, np.nan)
+        resistance = np.where(slope < 0, line, np.nan)
+    return slope, intercept, support, resistance
+
+
+def label(column: str, codes: np.ndarray) -> np.ndarray:
+    "int8 codes back to the string labels of the tradingpatterns columns"
+    up, down = PATTERN_LABELS[column]
+    result = np.full(codes.size, np.nan, dtype=object)
+    result[codes == 1] = up
+    result[codes == -1] = down
+    return result
+
+
+def detect_all(df: pd.DataFrame, window: int = 3, threshold: float = 0.05) -> pd.DataFrame:
+    """one pass over df (high, low, close columns) adding every tradingpatterns
+    column, same values as calling the detect_* functions one by one"""
+    high, low, close = (df[name].to_numpy(dtype=np.float64) for name in ("high", "low", "close"))
+    for column, codes in pattern_codes(high, low, close, window, threshold).items():
+        df[column] = label(column, codes)
+    df["support"], df["resistance"] = support_resistance(high, low, window)
+    df["signal"] = np.array(PIVOT_LABELS, dtype=object)[nb_find_pivots(high, low)]
+    return df
+
+
+class CHART_PATTERN_SCANNER:
+    """tradingpatterns masks of a live source.
+
+    A mask at bar i reads the rolling window ending at i and the bars i - 1
+    and i + 1, so a new or updated bar only changes the codes of the last two
+    bars (and the trendline of the new one). `add`/`update` evaluate the
+    same vectorized code on a short tail and rewrite those rows only.
+    Columns of `codes` follow PATTERN_LABELS, then the find_pivots code.
+    """
+
+    def __init__(self, window: int = 3, threshold: float = 0.05, trend_window: int = 2, capacity: int = 4096):
+        self.window = window
+        self.threshold = threshold
+        self.trend_window = trend_window
+        self.tail_size = max(window, trend_window) + 2
+        self._size = 0
+        self._hlc = np.empty((capacity, 3), dtype=np.float64)
+        self._codes = np.zeros((capacity, len(PATTERN_LABELS) + 1), dtype=np.int8)
+        # slope, intercept of the trendline
+        self._line = np.full((capacity, 2), np.nan)
+
+    def __len__(self):
+        return self._size
+
+    def _reserve(self, size: int):
+        if size > self._hlc.shape[0]:
+            capacity = max(size, 2 * self._hlc.shape[0])
+            for name, fill in (("_hlc", 0.0), ("_codes", 0), ("_line", np.nan)):
+                old = getattr(self, name)
+                grown = np.full((capacity, old.shape[1]), fill, dtype=old.dtype)
+                grown[:self._size] = old[:self._size]
+                setattr(self, name, grown)
+
+    @property
+    def codes(self) -> Dict[str, np.ndarray]:
+        return {name: self._codes[:self._size, j] for j, name in enumerate(PATTERN_LABELS)}
+
+    @property
+    def pivots(self) -> np.ndarray:
+        return self._codes[:self._size, -1]
+
+    @property
+    def slope(self) -> np.ndarray:
+        return self._line[:self._size, 0]
+
+    @property
+    def intercept(self) -> np.ndarray:
+        return self._line[:self._size, 1]
+
+    def load(self, high, low, close) -> Dict[str, np.ndarray]:
+        high, low, close = (np.ascontiguousarray(x, dtype=np.float64) for x in (high, low, close))
+        self._size = 0
+        self._reserve(high.size)
+        self._size = m = high.size
+        self._hlc[:m] = np.column_stack((high, low, close))
+        codes = pattern_codes(high, low, close, self.window, self.threshold)
+        for j, name in enumerate(PATTERN_LABELS):
+            self._codes[:m, j] = codes[name]
+        self._codes[:m, -1] = nb_find_pivots(high, low)
+        self._line[:m, 0], self._line[:m, 1] = nb_rolling_linreg(close, self.trend_window)
+        return self.codes
+
+    def _refresh(self) -> Dict[str, int]:
+        start = max(0, self._size - self.tail_size)
+        high, low, close = (np.ascontiguousarray(self._hlc[start:self._size, j]) for j in range(3))
+        codes = pattern_codes(high, low, close, self.window, self.threshold)
+        pivots = nb_find_pivots(high, low)
+        rows = min(2, self._size)
+        for j, name in enumerate(PATTERN_LABELS):
+            self._codes[self._size - rows:self._size, j] = codes[name][-rows:]
+        self._codes[self._size - rows:self._size, -1] = pivots[-rows:]
+        slope, intercept = nb_rolling_linreg(close, self.trend_window)
+        # the tail starts at bar `start`, back to absolute bar positions
+        self._line[self._size - 1] = slope[-1], intercept[-1] - slope[-1] * start
+        return {name: int(values[-1]) for name, values in codes.items()}
+
+    def add(self, high: float, low: float, close: float) -> Dict[str, int]:
+        "a new bar opened, return the codes of that bar"
+        self._reserve(self._size + 1)
+        self._hlc[self._size] = high, low, close
+        self._size += 1
+        return self._refresh()
+
+    def update(self, high: float, low: float, close: float) -> Dict[str, int]:
+        "a tick of the forming bar"
+        if self._size == 0:
+            return self.add(high, low, close)
+        self._hlc[self._size - 1] = high, low, close
+        return self._refresh()
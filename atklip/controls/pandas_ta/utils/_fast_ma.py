@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+from typing import Callable, Dict
+
+import numpy as np
+from pandas import Series
+
+from atklip.controls.pandas_ta.utils._nb_ma import (nb_alma, nb_dema, nb_ema,
+                                                    nb_fwma, nb_hwma, nb_jma,
+                                                    nb_kama, nb_mcgd, nb_rma,
+                                                    nb_sinwma, nb_smma, nb_t3,
+                                                    nb_tema, nb_vidya, nb_zlma)
+from atklip.controls.pandas_ta.utils._numba import nb_sma, nb_wma
+
+
+# mamode -> kernel(x, length, **kwargs), defaults are the pandas_ta ones
+NB_MA: Dict[str, Callable[..., np.ndarray]] = {
+    "sma": lambda x, n: nb_sma(x, n),
+    "ema": lambda x, n: nb_ema(x, n),
+    "rma": lambda x, n: nb_rma(x, n),
+    "smma": lambda x, n: nb_smma(x, n),
+    "wma": lambda x, n, asc=True: nb_wma(x, n, asc, True),
+    "dema": lambda x, n: nb_dema(x, n),
+    "tema": lambda x, n: nb_tema(x, n),
+    "t3": lambda x, n, a=0.7: nb_t3(x, n, a),
+    "jma": lambda x, n, phase=0.0: nb_jma(x, n, float(phase)),
+    "kama": lambda x, n, fast=2, slow=30, drift=1: nb_kama(x, n, fast, slow, drift),
+    "vidya": lambda x, n, drift=1: nb_vidya(x, n, drift),
+    "mcgd": lambda x, n, c=1.0: nb_mcgd(x, n, float(c)),
+    "hwma": lambda x, n=None, na=0.2, nb=0.1, nc=0.1: nb_hwma(x, na, nb, nc),
+    "alma": lambda x, n, sigma=6.0, distribution_offset=0.85: nb_alma(x, n, sigma, distribution_offset),
+    "zlma": lambda x, n: nb_zlma(x, n),
+    "sinwma": lambda x, n: nb_sinwma(x, n),
+    "fwma": lambda x, n, asc=True: nb_fwma(x, n, asc),
+}
+
+
+def fast_ma(mamode: str, source: Series, length: int, **kwargs) -> Series:
+    """numba path of the moving averages dispatched by ma_type/ma_overload,
+    same values as the pandas_ta functions (within float rounding)"""
+    mamode = mamode.lower()
+    if mamode not in NB_MA:
+        raise KeyError(f"{mamode} has no numba kernel, use one of {list(NB_MA)}")
+    x = np.ascontiguousarray(source, dtype=np.float64)
+    length = int(length)
+    if x.size < length:
+        result = np.full(x.size, np.nan)
+    else:
+        result = NB_MA[mamode](x, length, **kwargs)
+    return Series(result, index=getattr(source, "index", None), name=f"{mamode.upper()}_{length}")
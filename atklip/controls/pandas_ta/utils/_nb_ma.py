@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+from numba import njit
+
+from atklip.controls.pandas_ta.utils._nb_rolling import nb_rolling_sum
+from atklip.controls.pandas_ta.utils._numba import fibonacci, nb_shift
+
+
+@njit(cache=True)
+def nb_first_valid(x):
+    for i in range(x.size):
+        if not np.isnan(x[i]):
+            return i
+    return x.size
+
+
+# pandas ewm(adjust=False): starts at the first valid value, a NaN repeats
+# the last value and decays its weight the way pandas does.
+@njit(cache=True)
+def nb_ewm(x, alpha):
+    m = x.size
+    result = np.empty(m, dtype=np.float64)
+    result[:] = np.nan
+    first = nb_first_valid(x)
+    if first == m:
+        return result
+
+    weighted, old_wt = x[first], 1.0
+    result[first] = weighted
+    for i in range(first + 1, m):
+        old_wt *= 1.0 - alpha
+        if not np.isnan(x[i]):
+            weighted = (old_wt * weighted + alpha * x[i]) / (old_wt + alpha)
+            old_wt = 1.0
+        result[i] = weighted
+
+    return result
+
+
+# nb_ewm seeded with the SMA of the first n values after any leading NaN run,
+# like the presma ema and the smma of pandas_ta
+@njit(cache=True)
+def nb_ewm_seeded(x, n, alpha):
+    m = x.size
+    result = np.empty(m, dtype=np.float64)
+    result[:] = np.nan
+    first = nb_first_valid(x)
+    if first + n > m:
+        return result
+
+    weighted, old_wt = np.nanmean(x[first:first + n]), 1.0
+    result[first + n - 1] = weighted
+    for i in range(first + n, m):
+        old_wt *= 1.0 - alpha
+        if not np.isnan(x[i]):
+            weighted = (old_wt * weighted + alpha * x[i]) / (old_wt + alpha)
+            old_wt = 1.0
+        result[i] = weighted
+
+    return result
+
+
+@njit(cache=True)
+def nb_ema(x, n):
+    return nb_ewm_seeded(x, n, 2.0 / (n + 1))
+
+
+# Wilder's smoothing, ewm(alpha=1 / n, adjust=False) like the pandas_ta rma
+@njit(cache=True)
+def nb_rma(x, n):
+    return nb_ewm(x, 1.0 / n)
+
+
+# the same recursion seeded with the SMA of the first n values
+@njit(cache=True)
+def nb_smma(x, n):
+    return nb_ewm_seeded(x, n, 1.0 / n)
+
+
+@njit(cache=True)
+def nb_dema(x, n):
+    ema1 = nb_ema(x, n)
+    return 2 * ema1 - nb_ema(ema1, n)
+
+
+@njit(cache=True)
+def nb_tema(x, n):
+    ema1 = nb_ema(x, n)
+    ema2 = nb_ema(ema1, n)
+    return 3 * (ema1 - ema2) + nb_ema(ema2, n)
+
+
+# Tillson T3: weighted sum of the 3rd to 6th chained emas
+@njit(cache=True)
+def nb_t3(x, n, a):
+    c1 = -a * a ** 2
+    c2 = 3 * a ** 2 + 3 * a ** 3
+    c3 = -6 * a ** 2 - 3 * a - 3 * a ** 3
+    c4 = a ** 3 + 3 * a ** 2 + 3 * a + 1
+
+    e1 = nb_ema(x, n)
+    e2 = nb_ema(e1, n)
+    e3 = nb_ema(e2, n)
+    e4 = nb_ema(e3, n)
+    e5 = nb_ema(e4, n)
+    e6 = nb_ema(e5, n)
+    return c1 * e6 + c2 * e5 + c3 * e4 + c4 * e3
+
+
+# Jurik MA: volatility bands then the 3 stage adaptive filter, x without NaN
+@njit(cache=True)
+def nb_jma_core(x, n, phase):
+    m = x.size
+    result = np.zeros(m)
+    if m == 0:
+        return result
+
+    sum_length = 10
+    length = 0.5 * (n - 1)
+    pr = 0.5 if phase < -100 else 2.5 if phase > 100 else 1.5 + phase * 0.01
+    length1 = max(np.log(np.sqrt(length)) / np.log(2.0) + 2.0, 0.0) if length > 0 else 0.0
+    pow1 = max(length1 - 2.0, 0.5)
+    length2 = length1 * np.sqrt(length)
+    bet = length2 / (length2 + 1)
+    beta = 0.45 * (n - 1) / (0.45 * (n - 1) + 2.0)
+    max_volty = length1 ** (1.0 / pow1)
+
+    volty = np.zeros(m)
+    v_sum = np.zeros(m)
+    det0 = det1 = 0.0
+    window = 0.0  # sum of v_sum over the last 66 bars
+    result[0] = ma1 = u_band = l_band = x[0]
+    for i in range(1, m):
+        price = x[i]
+        # price volatility
+        del1 = price - u_band
+        del2 = price - l_band
+        volty[i] = max(abs(del1), abs(del2)) if abs(del1) != abs(del2) else 0.0
+        # relative price volatility factor
+        v_sum[i] = v_sum[i - 1] + (volty[i] - volty[max(i - sum_length, 0)]) / sum_length
+        window += v_sum[i]
+        if i > 65:
+            window -= v_sum[i - 66]
+        avg_volty = window / (min(i, 65) + 1)
+        d_volty = 0.0 if avg_volty == 0 else volty[i] / avg_volty
+        r_volty = max(1.0, min(max_volty, d_volty))
+        # volatility bands
+        pow2 = r_volty ** pow1
+        kv = bet ** np.sqrt(pow2)
+        u_band = price if del1 > 0 else price - kv * del1
+        l_band = price if del2 < 0 else price - kv * del2
+        # dynamic factor
+        alpha = beta ** pow2
+        # adaptive ema, kalman filter, then jurik adaptive filter
+        ma1 = (1 - alpha) * price + alpha * ma1
+        det0 = (price - ma1) * (1 - beta) + beta * det0
+        ma2 = ma1 + pr * det0
+        det1 = (ma2 - result[i - 1]) * (1 - alpha) * (1 - alpha) + alpha * alpha * det1
+        result[i] = result[i - 1] + det1
+
+    return result
+
+
+@njit(cache=True)
+def nb_jma(x, n, phase):
+    result = np.empty(x.size, dtype=np.float64)
+    result[:] = np.nan
+    first = nb_first_valid(x)
+    if first < x.size:
+        result[first:] = nb_jma_core(x[first:], n, phase)
+    result[:min(first + n - 1, x.size)] = np.nan
+    return result
+
+
+# Kaufman's Adaptive MA, seeded with the close at n - 1
+@njit(cache=True)
+def nb_kama(x, n, fast, slow, drift):
+    m = x.size
+    eps = np.finfo(np.float64).eps
+    fr, sr = 2.0 / (fast + 1), 2.0 / (slow + 1)
+
+    peer_diff = np.empty(m, dtype=np.float64)
+    peer_diff[:drift] = np.nan
+    for i in range(drift, m):
+        d = x[i] - x[i - drift]
+        peer_diff[i] = abs(d) if d != 0 else eps
+    peer_sum = nb_rolling_sum(peer_diff, n)
+
+    result = np.empty(m, dtype=np.float64)
+    result[:] = np.nan
+    if n - 1 < m:
+        result[n - 1] = x[n - 1]
+    for i in range(n, m):
+        d = x[i] - x[i - n]
+        abs_diff = abs(d) if d != 0 else eps
+        er = abs_diff / peer_sum[i] if peer_sum[i] != 0 else np.nan
+        sc = (er * (fr - sr) + sr) ** 2
+        result[i] = sc * x[i] + (1 - sc) * result[i - 1]
+
+    return result
+
+
+# Variable Index Dynamic Average: ema whose alpha is scaled by |cmo|
+@njit(cache=True)
+def nb_vidya(x, n, drift):
+    m = x.size
+    alpha = 2.0 / (n + 1)
+
+    positive = np.empty(m, dtype=np.float64)
+    negative = np.empty(m, dtype=np.float64)
+    positive[:drift] = negative[:drift] = np.nan
+    for i in range(drift, m):
+        mom = x[i] - x[i - drift]
+        positive[i] = max(mom, 0.0)
+        negative[i] = abs(min(mom, 0.0))
+    pos_sum = nb_rolling_sum(positive, n)
+    neg_sum = nb_rolling_sum(negative, n)
+
+    result = np.empty(m, dtype=np.float64)
+    result[:] = np.nan
+    if n - 1 < m:
+        result[n - 1] = np.nanmean(x[:n])
+    for i in range(n, m):
+        total = pos_sum[i] + neg_sum[i]
+        cmo = abs((pos_sum[i] - neg_sum[i]) / total) if total != 0 else np.nan
+        result[i] = alpha * cmo * x[i] + result[i - 1] * (1 - alpha * cmo)
+
+    return result
+
+
+# McGinley Dynamic
+@njit(cache=True)
+def nb_mcgd(x, n, c):
+    m = x.size
+    result = np.empty(m, dtype=np.float64)
+    if m == 0:
+        return result
+
+    result[0] = x[0]
+    for i in range(1, m):
+        prev = result[i - 1]
+        if prev != 0:
+            denom = max(c * n * (x[i] / prev) ** 4, 1e-10)
+            result[i] = prev + (x[i] - prev) / denom
+        else:
+            result[i] = x[i]
+
+    return result
+
+
+# Holt-Winter MA
+@njit(cache=True)
+def nb_hwma(x, na, nb, nc):
+    m = x.size
+    result = np.empty(m, dtype=np.float64)
+    if m == 0:
+        return result
+
+    last_a, last_v, last_f = 0.0, 0.0, x[0]
+    for i in range(m):
+        f = (1.0 - na) * (last_f + last_v + 0.5 * last_a) + na * x[i]
+        v = (1.0 - nb) * (last_v + last_a) + nb * (f - last_f)
+        a = (1.0 - nc) * last_a + nc * (v - last_v)
+        result[i] = f + v + 0.5 * a
+        last_a, last_f, last_v = a, f, v
+
+    return result
+
+
+# Weighted MA with weights w laid out oldest to newest
+@njit(cache=True)
+def nb_weighted_ma(x, w):
+    m, n = x.size, w.size
+    result = np.empty(m, dtype=np.float64)
+    result[:min(n - 1, m)] = np.nan
+    for i in range(n - 1, m):
+        total = 0.0
+        for j in range(n):
+            total += w[j] * x[i - n + 1 + j]
+        result[i] = total
+    return result
+
+
+# Arnaud Legoux MA, w[j] weights the close j bars back like pandas_ta
+@njit(cache=True)
+def nb_alma(x, n, sigma, distribution_offset):
+    mo = distribution_offset * (n - 1)
+    s = n / sigma
+    w = np.empty(n, dtype=np.float64)
+    for i in range(n):
+        w[i] = np.exp(-1 * ((i - mo) * (i - mo)) / (2 * s * s))
+    w /= w.sum()
+    return nb_weighted_ma(x, w[::-1].copy())
+
+
+@njit(cache=True)
+def nb_sinwma(x, n):
+    w = np.empty(n, dtype=np.float64)
+    for i in range(n):
+        w[i] = np.sin((i + 1) * np.pi / (n + 1))
+    return nb_weighted_ma(x, w / w.sum())
+
+
+@njit(cache=True)
+def nb_fwma(x, n, asc):
+    w = fibonacci(n, True)
+    if not asc:
+        w = w[::-1].copy()
+    return nb_weighted_ma(x, w)
+
+
+# Zero Lag MA (ema of the de-lagged close)
+@njit(cache=True)
+def nb_zlma(x, n):
+    lag = int(0.5 * (n - 1))
+    if lag == 0:
+        return nb_ema(x, n)
+    return nb_ema(2 * x - nb_shift(x, lag), n)
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+from numba import njit
+
+
+# Group sorted bar times into buckets of `step` ms (shifted by `offset`) and
+# aggregate OHLCV per bucket. Used to derive higher timeframes from 1m bars.
+@njit(cache=True)
+def nb_resample_ohlcv(times, np_open, np_high, np_low, np_close, np_volume, step, offset):
+    m = times.size
+    out_time = np.empty(m, dtype=np.int64)
+    out_open, out_high = np.empty(m, dtype=np.float64), np.empty(m, dtype=np.float64)
+    out_low, out_close = np.empty(m, dtype=np.float64), np.empty(m, dtype=np.float64)
+    out_volume = np.empty(m, dtype=np.float64)
+
+    j = -1
+    for i in range(m):
+        bucket = (times[i] - offset) // step * step + offset
+        if j < 0 or bucket != out_time[j]:
+            j += 1
+            out_time[j] = bucket
+            out_open[j] = np_open[i]
+            out_high[j] = np_high[i]
+            out_low[j] = np_low[i]
+            out_close[j] = np_close[i]
+            out_volume[j] = np_volume[i]
+        else:
+            if np_high[i] > out_high[j]:
+                out_high[j] = np_high[i]
+            if np_low[i] < out_low[j]:
+                out_low[j] = np_low[i]
+            out_close[j] = np_close[i]
+            out_volume[j] += np_volume[i]
+
+    _n = j + 1
+    return out_time[:_n], out_open[:_n], out_high[:_n], out_low[:_n], out_close[:_n], out_volume[:_n]
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+from numba import njit
+
+
+# Rolling extrema with a monotonic deque of indices, O(n) whatever the window.
+# Windows holding a NaN give NaN like x.rolling(n).max(). On ties the oldest
+# position is kept, like np.argmax over the window.
+@njit(cache=True)
+def nb_rolling_extrema(x, n, is_max):
+    m = x.size
+    value = np.empty(m, dtype=np.float64)
+    index = np.empty(m, dtype=np.int64)
+    dq = np.empty(m, dtype=np.int64)
+    head, tail, nans = 0, 0, 0
+
+    for i in range(m):
+        xi = x[i]
+        if np.isnan(xi):
+            nans += 1
+        else:
+            if is_max:
+                while tail > head and x[dq[tail - 1]] < xi:
+                    tail -= 1
+            else:
+                while tail > head and x[dq[tail - 1]] > xi:
+                    tail -= 1
+            dq[tail] = i
+            tail += 1
+        if i >= n and np.isnan(x[i - n]):
+            nans -= 1
+        while tail > head and dq[head] <= i - n:
+            head += 1
+
+        if i < n - 1 or nans > 0 or tail == head:
+            value[i] = np.nan
+            index[i] = -1
+        else:
+            value[i] = x[dq[head]]
+            index[i] = dq[head]
+
+    return value, index
+
+
+@njit(cache=True)
+def nb_rolling_max(x, n):
+    return nb_rolling_extrema(x, n, True)[0]
+
+
+@njit(cache=True)
+def nb_rolling_min(x, n):
+    return nb_rolling_extrema(x, n, False)[0]
+
+
+# Position of the max inside each window (0 = oldest bar), like
+# x.rolling(n).apply(np.argmax)
+@njit(cache=True)
+def nb_rolling_argmax(x, n):
+    _, index = nb_rolling_extrema(x, n, True)
+    result = np.empty(x.size, dtype=np.float64)
+    for i in range(x.size):
+        result[i] = np.nan if index[i] < 0 else index[i] - (i - n + 1)
+    return result
+
+
+@njit(cache=True)
+def nb_rolling_argmin(x, n):
+    _, index = nb_rolling_extrema(x, n, False)
+    result = np.empty(x.size, dtype=np.float64)
+    for i in range(x.size):
+        result[i] = np.nan if index[i] < 0 else index[i] - (i - n + 1)
+    return result
+
+
+# Running (Kahan compensated) window sum, O(n). NaN windows give NaN.
+@njit(cache=True)
+def nb_rolling_sum(x, n):
+    m = x.size
+    result = np.empty(m, dtype=np.float64)
+    total, comp, nans = 0.0, 0.0, 0
+
+    for i in range(m):
+        xi = x[i]
+        if np.isnan(xi):
+            nans += 1
+        else:
+            y = xi - comp
+            t = total + y
+            comp = (t - total) - y
+            total = t
+        if i >= n:
+            xo = x[i - n]
+            if np.isnan(xo):
+                nans -= 1
+            else:
+                y = -xo - comp
+                t = total + y
+                comp = (t - total) - y
+                total = t
+        result[i] = np.nan if i < n - 1 or nans > 0 else total
+
+    return result
+
+
+@njit(cache=True)
+def nb_rolling_mean(x, n):
+    return nb_rolling_sum(x, n) / n
+
+
+# Windowed Welford mean/variance with removal, O(n). ddof=1 like pandas.
+# A window of equal values gives 0 exactly, like pandas, instead of the
+# rounding left in m2 by the removals.
+@njit(cache=True)
+def nb_rolling_std(x, n, ddof=1):
+    m = x.size
+    result = np.empty(m, dtype=np.float64)
+    mean, m2, count, nans, same = 0.0, 0.0, 0, 0, 0
+
+    for i in range(m):
+        xi = x[i]
+        if np.isnan(xi):
+            nans += 1
+            same = 0
+        else:
+            same = same + 1 if i > 0 and xi == x[i - 1] else 1
+            count += 1
+            delta = xi - mean
+            mean += delta / count
+            m2 += delta * (xi - mean)
+        if i >= n:
+            xo = x[i - n]
+            if np.isnan(xo):
+                nans -= 1
+            else:
+                count -= 1
+                if count == 0:
+                    mean, m2 = 0.0, 0.0
+                else:
+                    delta = xo - mean
+                    mean -= delta / count
+                    m2 -= delta * (xo - mean)
+        if i < n - 1 or nans > 0 or n - ddof <= 0:
+            result[i] = np.nan
+        elif same >= n:
+            result[i] = 0.0
+        else:
+            result[i] = np.sqrt(m2 / (n - ddof)) if m2 > 0 else 0.0
+
+    return result
+
+
+# Swing highs/lows: bars that are the extreme of the window centred on them.
+@njit(cache=True)
+def nb_rolling_hl(np_high, np_low, window_size):
+    m = np_high.size
+    # a bar can be both a swing low and a swing high
+    idx = np.zeros(2 * m)
+    swing = np.zeros(2 * m)  # where a high = 1 and low = -1
+    value = np.zeros(2 * m)
+
+    extremums = 0
+    left = int(np.floor(window_size / 2))
+    right = left + 1
+    # sample_array = [*[left-window], *[center], *[right-window]]
+    # the window of center i ends at i + left, so its extrema are the
+    # O(n) rolling extrema read `left` bars later
+    width = left + right
+    low_min = nb_rolling_min(np_low, width)
+    high_max = nb_rolling_max(np_high, width)
+    for i in range(left, m - right):
+        low_center = np_low[i]
+        high_center = np_high[i]
+
+        if low_center <= low_min[i + left]:
+            idx[extremums] = i
+            swing[extremums] = -1
+            value[extremums] = low_center
+            extremums += 1
+
+        if high_center >= high_max[i + left]:
+            idx[extremums] = i
+            swing[extremums] = 1
+            value[extremums] = high_center
+            extremums += 1
+
+    return idx[:extremums], swing[:extremums], value[:extremums]
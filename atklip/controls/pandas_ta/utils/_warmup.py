@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+import importlib
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+# name of the optional ahead-of-time compiled module, see build_aot
+AOT_MODULE = "atklip.controls.pandas_ta.utils._numba_aot"
+
+# pure python kernel modules, first match wins: the compiled _numba build
+# predates the MA and rolling kernels
+KERNEL_MODULES = (
+    "atklip.controls.pandas_ta.utils._nb_ma",
+    "atklip.controls.pandas_ta.utils._nb_rolling",
+    "atklip.controls.pandas_ta.utils._numba",
+)
+
+# hot kernels compiled ahead of time: name -> numba.pycc signature
+AOT_SIGNATURES = {
+    "nb_ema": "f8[:](f8[:], i8)",
+    "nb_rma": "f8[:](f8[:], i8)",
+    "nb_sma": "f8[:](f8[:], i8)",
+    "nb_jma": "f8[:](f8[:], i8, f8)",
+    "nb_rolling_max": "f8[:](f8[:], i8)",
+    "nb_rolling_min": "f8[:](f8[:], i8)",
+    "nb_rolling_sum": "f8[:](f8[:], i8)",
+    "nb_rolling_std": "f8[:](f8[:], i8, i8)",
+}
+
+_SIZE = 64
+_LENGTH = 5
+
+
+def _f8(size: int = _SIZE) -> np.ndarray:
+    "deterministic price-like float64 sample, long enough for every window"
+    return 100.0 + np.cumsum(np.sin(np.arange(size, dtype=np.float64)))
+
+
+def _ohlcv():
+    c = _f8()
+    return c - 0.5, c + 1.0, c - 1.0, c, np.full(c.size, 10.0)
+
+
+def _default_kernels() -> List[Tuple[str, Callable[[], object]]]:
+    """one call per kernel with the dtypes used at runtime: float64 arrays,
+    int64 lengths/times and python bools, so each call compiles (or loads
+    from the numba cache) exactly the specialization the app will hit"""
+    from atklip.controls.pandas_ta.utils import _numba as nb
+    from atklip.controls.pandas_ta.utils import _nb_ma as nbm
+    from atklip.controls.pandas_ta.utils import _nb_resample
+    from atklip.controls.pandas_ta.utils import _nb_rolling as nbr
+    from atklip.controls import stream_kernels as sk
+    from atklip.controls.candle import incremental_smooth as ism
+
+    x, n = _f8(), _LENGTH
+    o, h, l, c, v = _ohlcv()
+    times = np.arange(_SIZE, dtype=np.int64) * 60_000
+    kinds, lengths = np.array([1, 0], dtype=np.int64), np.array([n, n], dtype=np.int64)
+    return [
+        ("nb_sma", lambda: nb.nb_sma(x, n)),
+        ("nb_ema", lambda: nbm.nb_ema(x, n)),
+        ("nb_rma", lambda: nbm.nb_rma(x, n)),
+        ("nb_smma", lambda: nbm.nb_smma(x, n)),
+        ("nb_dema", lambda: nbm.nb_dema(x, n)),
+        ("nb_tema", lambda: nbm.nb_tema(x, n)),
+        ("nb_t3", lambda: nbm.nb_t3(x, n, 0.7)),
+        ("nb_jma", lambda: nbm.nb_jma(x, n, 0.0)),
+        ("nb_kama", lambda: nbm.nb_kama(x, n, 2, 30, 1)),
+        ("nb_vidya", lambda: nbm.nb_vidya(x, n, 1)),
+        ("nb_mcgd", lambda: nbm.nb_mcgd(x, n, 1.0)),
+        ("nb_hwma", lambda: nbm.nb_hwma(x, 0.2, 0.1, 0.1)),
+        ("nb_alma", lambda: nbm.nb_alma(x, n, 6.0, 0.85)),
+        ("nb_zlma", lambda: nbm.nb_zlma(x, n)),
+        ("nb_sinwma", lambda: nbm.nb_sinwma(x, n)),
+        ("nb_fwma", lambda: nbm.nb_fwma(x, n, True)),
+        ("nb_wma", lambda: nb.nb_wma(x, n, True, True)),
+        ("nb_ssf", lambda: nb.nb_ssf(x, n, np.pi, np.sqrt(2))),
+        ("nb_ssf3", lambda: nb.nb_ssf3(x, n, np.pi, np.sqrt(3))),
+        ("nb_mama", lambda: nb.nb_mama(x, 0.5, 0.05, True)),
+        ("nb_rolling_max", lambda: nbr.nb_rolling_max(x, n)),
+        ("nb_rolling_min", lambda: nbr.nb_rolling_min(x, n)),
+        ("nb_rolling_sum", lambda: nbr.nb_rolling_sum(x, n)),
+        ("nb_rolling_argmax", lambda: nbr.nb_rolling_argmax(x, n)),
+        ("nb_rolling_argmin", lambda: nbr.nb_rolling_argmin(x, n)),
+        ("nb_rolling_mean", lambda: nbr.nb_rolling_mean(x, n)),
+        ("nb_rolling_std", lambda: nbr.nb_rolling_std(x, n, 1)),
+        ("nb_rolling_hl", lambda: nbr.nb_rolling_hl(h, l, n)),
+        ("nb_find_zigzags", lambda: nb.nb_find_zigzags(*nbr.nb_rolling_hl(h, l, n), 1.0)),
+        ("np_ha", lambda: nb.np_ha(o, h, l, c)),
+        ("nb_resample_ohlcv", lambda: _nb_resample.nb_resample_ohlcv(times, o, h, l, c, v, 300_000, 0)),
+        ("nb_ma_stream", lambda: [sk.MA_KERNEL(mamode, n).load(x) for mamode in ("sma", "ema", "rma", "wma")]),
+        ("nb_rsi_stream", lambda: sk.RSI_KERNEL(n).load(x)),
+        ("nb_atr_stream", lambda: sk.ATR_KERNEL(n).load(h, l, c)),
+        ("nb_macd_stream", lambda: sk.MACD_KERNEL(3, 6, 2).load(x)),
+        ("nb_smooth_ohlc", lambda: ism.nb_smooth_ohlc(o, h, l, c, kinds, lengths,
+                                                      np.zeros((8, 3 + n), dtype=np.float64))),
+    ]
+
+
+class KERNEL_WARMUP:
+    """Compile (or load from the numba cache) the numba kernels before the user
+    asks for an indicator.
+
+    Kernels are `@njit(cache=True)`, so on a fresh install the first call of
+    each one stalls for its JIT compile. `start()` runs every registered call
+    once on a daemon thread, reporting `progress(done, total, name, seconds)`
+    after each kernel. Kernels found in the AOT module are skipped. Other
+    modules add their kernels with `register`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._extra: List[Tuple[str, Callable[[], object]]] = []
+        self.timings: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self.aot = None
+        self.done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, name: str, call: Callable[[], object]):
+        with self._lock:
+            self._extra.append((name, call))
+
+    def load_aot(self):
+        "the AOT module if it was built for this platform, else None"
+        try:
+            self.aot = importlib.import_module(AOT_MODULE)
+        except ImportError:
+            self.aot = None
+        return self.aot
+
+    def run(self, progress: Optional[Callable[[int, int, str, float], None]] = None) -> Dict[str, float]:
+        try:
+            self.load_aot()
+            try:
+                kernels = _default_kernels()
+            except Exception as e:
+                # a kernel module failed to import, still warm up the registered ones
+                self.errors["_default_kernels"] = repr(e)
+                kernels = []
+            with self._lock:
+                kernels += self._extra
+            total = len(kernels)
+            for done, (name, call) in enumerate(kernels, 1):
+                start = time.perf_counter()
+                if self.aot is None or not hasattr(self.aot, name):
+                    try:
+                        call()
+                    except Exception as e:
+                        self.errors[name] = repr(e)
+                self.timings[name] = time.perf_counter() - start
+                if progress is not None:
+                    progress(done, total, name, self.timings[name])
+        finally:
+            self.done.set()
+        return self.timings
+
+    def start(self, progress: Optional[Callable[[int, int, str, float], None]] = None) -> threading.Thread:
+        if self._thread is None or not self._thread.is_alive():
+            self.done.clear()
+            self._thread = threading.Thread(target=self.run, args=(progress,), name="numba-warmup", daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self.done.wait(timeout)
+
+    @property
+    def total_time(self) -> float:
+        return sum(self.timings.values())
+
+
+KERNEL_WARMUP_global = KERNEL_WARMUP()
+
+
+def get_kernel(name: str):
+    "AOT build of a hot kernel when present, else the njit one"
+    aot = KERNEL_WARMUP_global.aot
+    if aot is not None and hasattr(aot, name):
+        return getattr(aot, name)
+    return _njit_kernel(name)
+
+
+def _njit_kernel(name: str):
+    "the njit kernel `name` from the first of KERNEL_MODULES defining it"
+    for module in KERNEL_MODULES:
+        module = importlib.import_module(module)
+        if hasattr(module, name):
+            return getattr(module, name)
+    raise AttributeError(f"no numba kernel named {name!r}")
+
+
+def build_aot(output_dir: Optional[str] = None):
+    """compile AOT_SIGNATURES into the _numba_aot extension with numba.pycc,
+    run once per platform at packaging time.
+
+    numba.pycc is deprecated and due for removal; without it the app keeps
+    using the njit kernels and their on-disk cache."""
+    import os
+    import warnings
+
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning)
+            warnings.simplefilter("ignore", PendingDeprecationWarning)
+            from numba.pycc import CC
+    except ImportError as e:
+        raise RuntimeError("numba.pycc is not available in this numba version, "
+                           "skip the AOT build and rely on the numba cache") from e
+
+    cc = CC(AOT_MODULE.rsplit(".", 1)[-1])
+    cc.output_dir = output_dir or os.path.dirname(os.path.abspath(__file__))
+    for name, signature in AOT_SIGNATURES.items():
+        cc.export(name, signature)(_njit_kernel(name).py_func)
+    cc.compile()
+    return cc.output_dir
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+import threading
+import weakref
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+import numpy as np
+
+from atklip.controls.stream_kernels import (ATR_KERNEL, MA_KERNEL, RSI_KERNEL,
+                                            STREAM_KERNEL, TRUE_RANGE_KERNEL)
+
+
+def _ma_builder(mamode: str):
+    def build(length: int, source: str = "close"):
+        return MA_KERNEL(mamode, length), (source,)
+    return build
+
+
+def _rsi_builder(length: int, source: str = "close"):
+    return RSI_KERNEL(length), (source,)
+
+
+def _true_range_builder():
+    return TRUE_RANGE_KERNEL(), ("high", "low", "close")
+
+
+def _atr_builder(length: int, mamode: str = "rma"):
+    return ATR_KERNEL(length, mamode), ("high", "low", "close")
+
+
+# name -> builder(**params) returning (kernel, input columns)
+STREAM_BUILDERS: Dict[str, Callable[..., Tuple[STREAM_KERNEL, Tuple[str, ...]]]] = {
+    "sma": _ma_builder("sma"),
+    "ema": _ma_builder("ema"),
+    "rma": _ma_builder("rma"),
+    "wma": _ma_builder("wma"),
+    "rsi": _rsi_builder,
+    "true_range": _true_range_builder,
+    "atr": _atr_builder,
+}
+
+
+def _hashable(value):
+    "params as part of a dict key, lists become tuples"
+    if isinstance(value, (list, tuple)):
+        return tuple(_hashable(x) for x in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _hashable(x)) for key, x in value.items()))
+    return value
+
+
+class _SERIES:
+    "one cached output aligned with the rows of the source"
+    __slots__ = ("kernel", "inputs", "values", "size")
+
+    def __init__(self, kernel, inputs):
+        self.kernel = kernel
+        self.inputs = inputs
+        self.values = np.empty(0, dtype=np.float64)
+        self.size = 0
+
+    def set(self, values: np.ndarray):
+        self.values = np.array(values, dtype=np.float64)
+        self.size = self.values.size
+
+    def push(self, value: float):
+        if self.size == self.values.size:
+            grown = np.empty(max(2 * self.values.size, 16), dtype=np.float64)
+            grown[:self.size] = self.values[:self.size]
+            self.values = grown
+        self.values[self.size] = value
+        self.size += 1
+
+    def view(self) -> np.ndarray:
+        return self.values[:self.size]
+
+
+class SERIES_CACHE:
+    """Memo of the intermediate series (ATR, EMA, RMA, true range...) of one source.
+
+    Indicators ask `get("atr", length=14)` instead of recomputing it, so ten
+    trend indicators on the same candles share one ATR per length. Entries
+    built from STREAM_BUILDERS are advanced in O(1) when the source adds or
+    updates a bar; entries registered with a plain batch function are
+    dropped on every change and recomputed on the next request. The owner of
+    the source calls `on_add`/`on_update` after writing the bar and
+    `on_reset` after a reload or scroll-back.
+    """
+
+    def __init__(self, source, source_id: Optional[Hashable] = None):
+        # weak: the module level cache is keyed weakly by the source, a strong
+        # reference here would keep the key, and this cache, alive forever
+        self._source = weakref.ref(source)
+        self.source_id = source_id if source_id is not None else id(source)
+        self._lock = threading.RLock()
+        self._entries: Dict[Tuple, _SERIES] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def store(self):
+        source = self._source()
+        if source is None:
+            raise ReferenceError("the source of this SERIES_CACHE was deleted")
+        return getattr(source, "store", source)
+
+    def _key(self, name: str, fn: Optional[Callable], params: dict) -> Tuple:
+        # the batch function itself is part of the key: two functions registered
+        # under one name must not share an entry
+        return (self.source_id, name, fn, tuple(sorted((key, _hashable(value)) for key, value in params.items())))
+
+    def _inputs(self, names, start: int = 0):
+        return [self.store.column(name, start) for name in names]
+
+    def get(self, name: str, fn: Optional[Callable[..., np.ndarray]] = None, **params) -> np.ndarray:
+        """cached series `name(**params)` over the whole source. `fn(*columns, **params)`
+        plus `inputs=(...)` in params is needed for names outside STREAM_BUILDERS"""
+        key = self._key(name, fn, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.size == len(self.store):
+                self.hits += 1
+                return entry.view()
+            self.misses += 1
+            entry = self._build(name, fn, params)
+            self._entries[key] = entry
+            return entry.view()
+
+    def _build(self, name: str, fn, params: dict) -> _SERIES:
+        if fn is None and name in STREAM_BUILDERS:
+            entry = _SERIES(*STREAM_BUILDERS[name](**params))
+            entry.set(entry.kernel.load(*self._inputs(entry.inputs)))
+            return entry
+        if fn is None:
+            raise KeyError(f"{name} is not a streaming series, pass its batch function as fn")
+        params = dict(params)
+        inputs = tuple(params.pop("inputs", ("close",)))
+        entry = _SERIES(None, inputs)
+        entry.set(fn(*self._inputs(inputs), **params))
+        return entry
+
+    def on_add(self):
+        "the source appended a bar"
+        store = self.store
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if entry.kernel is None or entry.size != len(store) - 1:
+                    del self._entries[key]
+                    continue
+                if entry.size:
+                    # the closed bar may have changed since the last on_update (its
+                    # final tick can come with the new bar), re-evaluate it before
+                    # the kernel commits it
+                    x = [store.column(name, -2)[0] for name in entry.inputs]
+                    entry.values[entry.size - 1] = entry.kernel.update(*x)
+                x = [store.column(name, -1)[0] for name in entry.inputs]
+                entry.push(entry.kernel.add(*x))
+
+    def on_update(self):
+        "the source rewrote its forming bar"
+        store = self.store
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if entry.kernel is None or entry.size != len(store) or entry.size == 0:
+                    del self._entries[key]
+                    continue
+                x = [store.column(name, -1)[0] for name in entry.inputs]
+                entry.values[entry.size - 1] = entry.kernel.update(*x)
+
+    def on_reset(self):
+        "the source was reloaded or got older bars in front, drop everything"
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+_CACHES: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_CACHES_LOCK = threading.Lock()
+
+
+def get_series_cache(source) -> SERIES_CACHE:
+    "the SERIES_CACHE shared by every indicator of `source`"
+    with _CACHES_LOCK:
+        cache = _CACHES.get(source)
+        if cache is None:
+            cache = SERIES_CACHE(source)
+            _CACHES[source] = cache
+        return cache
@@ -0,0 +1,899 @@
+# -*- coding: utf-8 -*-
+import heapq
+from collections import deque
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+from numba import njit
+
+from atklip.controls.pandas_ta.utils._nb_rolling import nb_rolling_max, nb_rolling_min
+
+
+# Swings of smc.swing_highs_lows before the end bars are forced: high[i] is the
+# max of high[i - n + 1:i + n + 1] (low likewise, highs first), from the bar
+# where the shifted rolling window of smc is full. A run of swings of one kind
+# keeps its first highest high / lowest low, which is where the pairwise
+# removal loop of smc converges.
+@njit(cache=True)
+def nb_swing_highs_lows(high, low, n):
+    m = high.size
+    hl = np.full(m, np.nan)
+    high_max = nb_rolling_max(high, 2 * n)
+    low_min = nb_rolling_min(low, 2 * n)
+    last = -1
+    for i in range(2 * n - 1, m - n):
+        if high[i] == high_max[i + n]:
+            kind = 1.0
+        elif low[i] == low_min[i + n]:
+            kind = -1.0
+        else:
+            continue
+        if last >= 0 and hl[last] == kind:
+            if not (high[i] > high[last] if kind == 1.0 else low[i] < low[last]):
+                continue
+            hl[last] = np.nan
+        hl[i] = kind
+        last = i
+    return hl
+
+
+# smc sets the first (and last) bar to the opposite of the first (and last)
+# swing, reading the swing back after each write like its if statements
+@njit(cache=True)
+def nb_force_end_swings(hl, force_last):
+    m = hl.size
+    first, last = -1, -1
+    for i in range(m):
+        if not np.isnan(hl[i]):
+            if first < 0:
+                first = i
+            last = i
+    if first < 0:
+        return hl
+    if hl[first] == 1:
+        hl[0] = -1
+    if hl[first] == -1:
+        hl[0] = 1
+    if force_last:
+        if hl[last] == -1:
+            hl[m - 1] = 1
+        if hl[last] == 1:
+            hl[m - 1] = -1
+    return hl
+
+
+# Fair value gaps with the mitigation bar of every gap found in one sweep:
+# open gaps wait in a heap keyed by the price that mitigates them, so a bar
+# only pops the gaps it mitigates instead of each gap scanning forward.
+@njit(cache=True)
+def nb_fvg(_open, _high, _low, _close, join_consecutive):
+    m = _close.size
+    fvg = np.full(m, np.nan)
+    top = np.full(m, np.nan)
+    bottom = np.full(m, np.nan)
+    for i in range(1, m - 1):
+        if _close[i] > _open[i] and _high[i - 1] < _low[i + 1]:
+            fvg[i], top[i], bottom[i] = 1.0, _low[i + 1], _high[i - 1]
+        elif _close[i] < _open[i] and _low[i - 1] > _high[i + 1]:
+            fvg[i], top[i], bottom[i] = -1.0, _low[i - 1], _high[i + 1]
+
+    if join_consecutive:
+        for i in range(m - 1):
+            if fvg[i] == fvg[i + 1]:
+                top[i + 1] = max(top[i], top[i + 1])
+                bottom[i + 1] = min(bottom[i], bottom[i + 1])
+                fvg[i] = top[i] = bottom[i] = np.nan
+
+    mitigated = np.where(np.isnan(fvg), np.nan, 0.0)
+    bull = [(0.0, 0)]
+    bear = [(0.0, 0)]
+    bull.pop()
+    bear.pop()
+    for j in range(2, m):
+        # a gap can be mitigated from two bars after its own bar
+        i = j - 2
+        if fvg[i] == 1:
+            heapq.heappush(bull, (-top[i], i))
+        elif fvg[i] == -1:
+            heapq.heappush(bear, (bottom[i], i))
+        while bull and -bull[0][0] >= _low[j]:
+            mitigated[heapq.heappop(bull)[1]] = j
+        while bear and bear[0][0] <= _high[j]:
+            mitigated[heapq.heappop(bear)[1]] = j
+    return fvg, top, bottom, mitigated
+
+
+# BOS/CHoCH of smc.bos_choch before its filters, with the float32 levels of
+# smc. broken is the first bar from i + 2 whose close (or high/low) crosses
+# the level, found with one heap sweep.
+@njit(cache=True)
+def nb_bos_choch(hl, level, up, down):
+    m = hl.size
+    bos = np.zeros(m, dtype=np.int32)
+    choch = np.zeros(m, dtype=np.int32)
+    lvl = np.zeros(m, dtype=np.float32)
+    broken = np.zeros(m, dtype=np.int64)
+
+    pos = np.flatnonzero(~np.isnan(hl))
+    for q in range(3, pos.size):
+        a, b, c, d = hl[pos[q - 3]], hl[pos[q - 2]], hl[pos[q - 1]], hl[pos[q]]
+        la, lb, lc, ld = level[pos[q - 3]], level[pos[q - 2]], level[pos[q - 1]], level[pos[q]]
+        i = pos[q - 2]
+        bullish = a == -1 and b == 1 and c == -1 and d == 1
+        bearish = a == 1 and b == -1 and c == 1 and d == -1
+        if bullish and la < lc < lb < ld:
+            bos[i] = 1
+        elif bearish and la > lc > lb > ld:
+            bos[i] = -1
+        else:
+            bos[i] = 0
+        if bullish and ld > lb > la > lc:
+            choch[i] = 1
+        elif bearish and ld < lb < la < lc:
+            choch[i] = -1
+        else:
+            choch[i] = 0
+        lvl[i] = lb if bos[i] != 0 or choch[i] != 0 else 0.0
+
+    bull = [(0.0, 0)]
+    bear = [(0.0, 0)]
+    bull.pop()
+    bear.pop()
+    for j in range(2, m):
+        i = j - 2
+        if bos[i] == 1 or choch[i] == 1:
+            heapq.heappush(bull, (np.float64(lvl[i]), i))
+        elif bos[i] == -1 or choch[i] == -1:
+            heapq.heappush(bear, (-np.float64(lvl[i]), i))
+        while bull and up[j] > bull[0][0]:
+            broken[heapq.heappop(bull)[1]] = j
+        while bear and down[j] < -bear[0][0]:
+            broken[heapq.heappop(bear)[1]] = j
+    return bos, choch, lvl, broken
+
+
+# smc drops every level that never broke, and a broken level when a later
+# level broke on or before its break bar (that one keeps its BrokenIndex)
+@njit(cache=True)
+def nb_bos_choch_filter(bos, choch, lvl, broken):
+    first_later = np.iinfo(np.int64).max
+    for k in range(bos.size - 1, -1, -1):
+        if bos[k] == 0 and choch[k] == 0:
+            continue
+        if broken[k] == 0 or first_later <= broken[k]:
+            bos[k] = choch[k] = 0
+            lvl[k] = 0.0
+        if broken[k] != 0:
+            first_later = min(first_later, broken[k])
+
+
+@njit(cache=True)
+def _nb_ob_index(_high, _low, side, last, i):
+    "bar of the order block of the bar i crossing the swing at last"
+    if i - last <= 1:
+        return i - 1
+    # last lowest low (bullish) / highest high (bearish) after the swing
+    idx = last + 1
+    for k in range(last + 2, i):
+        if (_low[k] <= _low[idx]) if side == 1 else (_high[k] >= _high[idx]):
+            idx = k
+    return idx
+
+
+@njit(cache=True)
+def _nb_ob_create(_high, _low, _volume, side, last, i, ob, top, bottom, ob_volume, percentage):
+    "order block of the bar i crossing the swing at last, returns its index"
+    idx = _nb_ob_index(_high, _low, side, last, i)
+    if i - last > 1:
+        obtop, obbtm = _high[idx], _low[idx]
+    elif side == 1:
+        # smc swaps top and bottom of the default block
+        obtop, obbtm = _low[idx], _high[idx]
+    else:
+        obtop, obbtm = _high[idx], _low[idx]
+    vol_cur = _volume[i]
+    vol_prev1 = _volume[i - 1] if i >= 1 else 0.0
+    vol_prev2 = _volume[i - 2] if i >= 2 else 0.0
+    if side == 1:
+        low_volume, high_volume = np.float32(vol_prev2), np.float32(vol_cur + vol_prev1)
+    else:
+        low_volume, high_volume = np.float32(vol_cur + vol_prev1), np.float32(vol_prev2)
+    ob[idx] = side
+    top[idx] = obtop
+    bottom[idx] = obbtm
+    ob_volume[idx] = vol_cur + vol_prev1 + vol_prev2
+    max_vol = max(high_volume, low_volume)
+    if max_vol != 0:
+        ratio = np.float32(np.float64(min(high_volume, low_volume)) / np.float64(max_vol))
+        percentage[idx] = np.float64(ratio) * 100.0
+    else:
+        percentage[idx] = 100.0
+    return idx
+
+
+# Order blocks of smc.ob: a full bullish pass then a full bearish pass over
+# shared arrays. Active blocks wait in heaps keyed by the price that mitigates
+# them, or that removes them once they are breakers; entries left behind by a
+# block rewritten at the same bar are dropped when popped.
+@njit(cache=True)
+def nb_ob(_open, _high, _low, _close, _volume, hl, close_mitigation):
+    m = _close.size
+    crossed = np.zeros(m, dtype=np.bool_)
+    ob = np.zeros(m, dtype=np.int32)
+    top = np.zeros(m, dtype=np.float32)
+    bottom = np.zeros(m, dtype=np.float32)
+    ob_volume = np.zeros(m, dtype=np.float32)
+    percentage = np.zeros(m, dtype=np.float32)
+    mitigated = np.zeros(m, dtype=np.int32)
+    breaker = np.zeros(m, dtype=np.bool_)
+
+    for side in (1, -1):
+        swings = np.flatnonzero(hl == side)
+        waiting = [(0.0, 0)]
+        breakers = [(0.0, 0)]
+        waiting.pop()
+        breakers.pop()
+        p = 0
+        for i in range(m):
+            if side == 1:
+                while breakers and _high[i] > breakers[0][0]:
+                    key, idx = heapq.heappop(breakers)
+                    if ob[idx] == side and breaker[idx] and key == top[idx]:
+                        ob[idx] = 0
+                        top[idx] = bottom[idx] = ob_volume[idx] = percentage[idx] = 0.0
+                        mitigated[idx] = 0
+                price = min(_open[i], _close[i]) if close_mitigation else _low[i]
+                while waiting and price < -waiting[0][0]:
+                    key, idx = heapq.heappop(waiting)
+                    if ob[idx] == side and not breaker[idx] and -key == bottom[idx]:
+                        breaker[idx] = True
+                        mitigated[idx] = i - 1
+                        heapq.heappush(breakers, (np.float64(top[idx]), idx))
+            else:
+                while breakers and _low[i] < -breakers[0][0]:
+                    key, idx = heapq.heappop(breakers)
+                    if ob[idx] == side and breaker[idx] and -key == bottom[idx]:
+                        ob[idx] = 0
+                        top[idx] = bottom[idx] = ob_volume[idx] = percentage[idx] = 0.0
+                        mitigated[idx] = 0
+                price = max(_open[i], _close[i]) if close_mitigation else _high[i]
+                while waiting and price > waiting[0][0]:
+                    key, idx = heapq.heappop(waiting)
+                    if ob[idx] == side and not breaker[idx] and key == top[idx]:
+                        breaker[idx] = True
+                        mitigated[idx] = i
+                        heapq.heappush(breakers, (-np.float64(bottom[idx]), idx))
+
+            while p < swings.size and swings[p] < i:
+                p += 1
+            if p == 0:
+                continue
+            last = swings[p - 1]
+            if crossed[last] or not (_close[i] > _high[last] if side == 1 else _close[i] < _low[last]):
+                continue
+            crossed[last] = True
+            idx = _nb_ob_create(_high, _low, _volume, side, last, i, ob, top, bottom, ob_volume, percentage)
+            if breaker[idx]:
+                key = np.float64(top[idx]) if side == 1 else -np.float64(bottom[idx])
+                heapq.heappush(breakers, (key, idx))
+            else:
+                key = -np.float64(bottom[idx]) if side == 1 else np.float64(top[idx])
+                heapq.heappush(waiting, (key, idx))
+
+    return ob, top, bottom, ob_volume, mitigated, percentage, crossed, breaker
+
+
+# Pops every position in [lo, hi) whose value is >= threshold from a max
+# segment tree (leaves at size + k, removed leaves hold -inf), in position
+# order. O(log n) per position taken.
+@njit(cache=True)
+def _nb_tree_take(tree, size, lo, hi, threshold, taken):
+    count = 0
+    nodes = np.empty(128, dtype=np.int64)
+    starts = np.empty(128, dtype=np.int64)
+    widths = np.empty(128, dtype=np.int64)
+    nodes[0], starts[0], widths[0], top = 1, 0, size, 1
+    while top > 0:
+        top -= 1
+        node, start, width = nodes[top], starts[top], widths[top]
+        if start >= hi or start + width <= lo or tree[node] < threshold:
+            continue
+        if width == 1:
+            taken[count] = start
+            count += 1
+            continue
+        half = width // 2
+        # right child first so the left one pops first
+        nodes[top], starts[top], widths[top] = 2 * node + 1, start + half, half
+        nodes[top + 1], starts[top + 1], widths[top + 1] = 2 * node, start, half
+        top += 2
+    for k in range(count):
+        node = size + taken[k]
+        tree[node] = -np.inf
+        node //= 2
+        while node >= 1:
+            tree[node] = max(tree[2 * node], tree[2 * node + 1])
+            node //= 2
+    return count
+
+
+# smc.liquidity: the sweep bar of every swing comes from one heap sweep, then
+# each unused swing groups the later unused swings of its kind within
+# pip_range of its level, up to its sweep bar. A later swing high above
+# level + pip_range would have swept it, so only the other bound is left to
+# test: the unused swings past it are taken from a max tree over their
+# levels (negated for lows) instead of a scan of every later swing.
+# Besides the smc columns it returns the sweep bar of every swing, the pool
+# each grouped swing went to, and the level sum and size of every pool.
+@njit(cache=True)
+def nb_liquidity_pools(_high, _low, hl, level, pip_range):
+    m = hl.size
+    liquidity = np.full(m, np.nan, dtype=np.float32)
+    liquidity_level = np.full(m, np.nan, dtype=np.float32)
+    liquidity_end = np.full(m, np.nan, dtype=np.float32)
+    liquidity_swept = np.full(m, np.nan, dtype=np.float32)
+    swept = np.zeros(m, dtype=np.int64)
+    head = np.full(m, -1, dtype=np.int64)
+    pool_total = np.zeros(m, dtype=np.float64)
+    pool_size = np.zeros(m, dtype=np.int64)
+
+    for side in (1, -1):
+        candidates = np.flatnonzero(hl == side)
+        pending = [(0.0, 0)]
+        pending.pop()
+        c = 0
+        for j in range(m):
+            # a swing can be swept from the next bar on
+            while c < candidates.size and candidates[c] < j:
+                i = candidates[c]
+                key = level[i] + pip_range if side == 1 else -(level[i] - pip_range)
+                heapq.heappush(pending, (key, i))
+                c += 1
+            if side == 1:
+                while pending and _high[j] >= pending[0][0]:
+                    swept[heapq.heappop(pending)[1]] = j
+            else:
+                while pending and _low[j] <= -pending[0][0]:
+                    swept[heapq.heappop(pending)[1]] = j
+
+        size = 1
+        while size < candidates.size:
+            size *= 2
+        tree = np.full(2 * size, -np.inf)
+        for a in range(candidates.size):
+            tree[size + a] = side * level[candidates[a]]
+        for node in range(size - 1, 0, -1):
+            tree[node] = max(tree[2 * node], tree[2 * node + 1])
+        used = np.zeros(candidates.size, dtype=np.bool_)
+        taken = np.empty(candidates.size, dtype=np.int64)
+
+        for a in range(candidates.size):
+            if used[a]:
+                continue
+            i = candidates[a]
+            end = candidates.size if swept[i] == 0 else np.searchsorted(candidates, swept[i])
+            count = _nb_tree_take(tree, size, a + 1, end, side * level[i] - pip_range, taken)
+            if count == 0:
+                continue
+            total = level[i]
+            for k in range(count):
+                used[taken[k]] = True
+                head[candidates[taken[k]]] = i
+                total += level[candidates[taken[k]]]
+            liquidity[i] = side
+            liquidity_level[i] = total / (count + 1)
+            liquidity_end[i] = candidates[taken[count - 1]]
+            liquidity_swept[i] = swept[i]
+            pool_total[i] = total
+            pool_size[i] = count
+
+    return liquidity, liquidity_level, liquidity_end, liquidity_swept, swept, head, pool_total, pool_size
+
+
+@njit(cache=True)
+def nb_liquidity(_high, _low, hl, level, pip_range):
+    "the smc.liquidity columns of nb_liquidity_pools"
+    pools = nb_liquidity_pools(_high, _low, hl, level, pip_range)
+    return pools[0], pools[1], pools[2], pools[3]
+
+
+# per bar arrays of SMC_ENGINE: name -> (dtype, fill)
+_COLUMNS = {
+    "open": (np.float64, 0.0), "high": (np.float64, 0.0), "low": (np.float64, 0.0),
+    "close": (np.float64, 0.0), "volume": (np.float64, 0.0),
+    "fvg": (np.float64, np.nan), "fvg_top": (np.float64, np.nan), "fvg_bottom": (np.float64, np.nan),
+    "fvg_mitigated": (np.float64, np.nan),
+    "swings": (np.float64, np.nan), "hl": (np.float64, np.nan), "level": (np.float64, np.nan),
+    "bos": (np.int32, 0), "choch": (np.int32, 0), "bos_level": (np.float32, 0.0), "broken": (np.int64, 0),
+    "ob": (np.int32, 0), "ob_top": (np.float32, 0.0), "ob_bottom": (np.float32, 0.0),
+    "ob_volume": (np.float32, 0.0), "ob_mitigated": (np.int32, 0), "ob_percentage": (np.float32, 0.0),
+    "crossed": (np.bool_, False), "breaker": (np.bool_, False),
+    "liquidity": (np.float32, np.nan), "liquidity_level": (np.float32, np.nan),
+    "liquidity_end": (np.float32, np.nan), "liquidity_swept": (np.float32, np.nan),
+    "swing_swept": (np.int64, 0), "pool_head": (np.int64, -1), "pool_total": (np.float64, 0.0),
+    "pool_size": (np.int64, 0),
+}
+# order block arrays a swing change rewinds
+_OB_COLUMNS = ("ob", "ob_top", "ob_bottom", "ob_volume", "ob_mitigated", "ob_percentage", "crossed", "breaker")
+
+
+def _nan_zero(x: np.ndarray) -> np.ndarray:
+    return np.where(x != 0, x, np.nan)
+
+
+class SMC_ENGINE:
+    """Smart Money Concepts of one source: swings, FVG, BOS/CHoCH, order
+    blocks and liquidity, with the columns of the smc functions.
+
+    The historic pass is a few numba sweeps where open gaps, order blocks,
+    BOS levels and liquidity pools wait in heaps keyed by the price that
+    closes them, O(n log n) instead of a forward scan per zone. `add` feeds
+    one closed bar and only pops the zones that bar mitigates, breaks or
+    sweeps. smc confirms a swing `swing_length` bars later; when a new bar
+    confirms (or replaces) one, only the BOS/CHoCH pattern ending at it is
+    evaluated, the order block steps since the swing are rewound and
+    replayed, and the swing joins the first open pool in range. The pip
+    range of the liquidity spans the whole history, so a new extreme
+    regroups every pool: that rebuild waits for the next read of the
+    liquidity columns.
+
+    smc.swing_highs_lows also forces a swing on the last bar of the frame,
+    which moves with every bar: `load(force_last=True)` keeps it for parity
+    with smc, live bars leave it out. Live bars run the bullish and the
+    bearish order block step bar by bar, which only differs from the two full
+    passes of smc when one bar holds both kinds of block.
+    """
+
+    def __init__(self, swing_length: int = 50, close_break: bool = True, close_mitigation: bool = False,
+                 range_percent: float = 0.01, join_consecutive: bool = False, capacity: int = 4096):
+        self.swing_length = int(swing_length)
+        self.close_break = close_break
+        self.close_mitigation = close_mitigation
+        self.range_percent = range_percent
+        self.join_consecutive = join_consecutive
+        self._size = 0
+        self._force_last = False
+        self._arrays = {name: np.full(capacity, fill, dtype=dtype) for name, (dtype, fill) in _COLUMNS.items()}
+
+    def __len__(self):
+        return self._size
+
+    def _reserve(self, size: int):
+        capacity = self._arrays["close"].size
+        if size > capacity:
+            capacity = max(size, 2 * capacity)
+            for name, (dtype, fill) in _COLUMNS.items():
+                grown = np.full(capacity, fill, dtype=dtype)
+                grown[:self._size] = self._arrays[name][:self._size]
+                self._arrays[name] = grown
+
+    def _col(self, name: str) -> np.ndarray:
+        return self._arrays[name][:self._size]
+
+    def _set(self, names: str, values):
+        for name, x in zip(names.split(), values):
+            self._arrays[name][:self._size] = x
+
+    @property
+    def ohlcv(self) -> Tuple[np.ndarray, ...]:
+        return tuple(self._col(name) for name in ("open", "high", "low", "close", "volume"))
+
+    def load(self, _open, _high, _low, _close, _volume, force_last: bool = False):
+        "historic bars, force_last keeps the forced swing of smc on the last bar"
+        m = len(_close)
+        self._size = 0
+        self._reserve(m)
+        for name, (dtype, fill) in _COLUMNS.items():
+            self._arrays[name][:] = fill
+        self._size = m
+        self._set("open high low close volume",
+                  (np.asarray(x, dtype=np.float64) for x in (_open, _high, _low, _close, _volume)))
+        self._force_last = force_last
+        o, h, l, c, v = self.ohlcv
+        self._set("fvg fvg_top fvg_bottom fvg_mitigated", nb_fvg(o, h, l, c, self.join_consecutive))
+        self._fvg_heaps: Dict[int, List[Tuple[float, int]]] = {1: [], -1: []}
+        fvg, mitigated = self._col("fvg"), self._col("fvg_mitigated")
+        for i in np.flatnonzero(~np.isnan(fvg[:m - 2]) & (mitigated[:m - 2] == 0)):
+            self._push_fvg(int(i))
+        self._set("swings", (nb_swing_highs_lows(h, l, self.swing_length),))
+        swings = np.flatnonzero(~np.isnan(self._col("swings")))
+        self._last_swing = int(swings[-1]) if swings.size else -1
+        self._build_structure()
+
+    # --- rebuilt on swing changes ---
+
+    def _build_structure(self):
+        o, h, l, c, v = self.ohlcv
+        hl = nb_force_end_swings(self._col("swings").copy(), self._force_last)
+        level = np.where(np.isnan(hl), np.nan, np.where(hl == 1, h, l))
+        self._set("hl level", (hl, level))
+        self._hl_pos = np.flatnonzero(~np.isnan(hl)).tolist()
+        up, down = (c, c) if self.close_break else (h, l)
+        self._set("bos choch bos_level broken", nb_bos_choch(hl, level, up, down))
+        # order blocks up to the last swing, the bars after it run the live
+        # step so a swing they confirm can rewind them
+        cut = self._last_swing + 1 if self._last_swing >= 0 else self._size
+        for name, x in zip(_OB_COLUMNS, nb_ob(o[:cut], h[:cut], l[:cut], c[:cut], v[:cut], hl[:cut],
+                                              self.close_mitigation)):
+            self._arrays[name][:cut] = x
+            self._arrays[name][cut:] = _COLUMNS[name][1]
+        self._build_liquidity()
+
+        # zones still open after the last bar
+        bos, choch, lvl, broken = (self._col(name) for name in ("bos", "choch", "bos_level", "broken"))
+        self._bos_heaps: Dict[int, List[Tuple[float, int]]] = {1: [], -1: []}
+        for i in np.flatnonzero(((bos != 0) | (choch != 0)) & (broken == 0)):
+            side = 1 if bos[i] == 1 or choch[i] == 1 else -1
+            self._bos_heaps[side].append((side * float(lvl[i]), int(i)))
+        ob, breaker = self._col("ob"), self._col("breaker")
+        self._ob_heaps: Dict[Tuple[int, bool], List[Tuple[float, int]]] = {
+            key: [] for key in ((1, False), (1, True), (-1, False), (-1, True))}
+        for i in np.flatnonzero(ob != 0):
+            self._ob_heaps[int(ob[i]), bool(breaker[i])].append((self._ob_key(int(i)), int(i)))
+        for heap in (*self._bos_heaps.values(), *self._ob_heaps.values()):
+            heapq.heapify(heap)
+        self._last_side_swing = {}
+        for side in (1, -1):
+            idx = np.flatnonzero(hl[:cut] == side)
+            self._last_side_swing[side] = int(idx[-1]) if idx.size else -1
+        # (bar, index, old values) of the order block writes since the last swing
+        self._ob_log: deque = deque()
+        for j in range(cut, self._size):
+            self._add_ob(j)
+
+    def _build_liquidity(self):
+        _, h, l, _, _ = self.ohlcv
+        self._high_max, self._low_min = (h.max(), l.min()) if self._size else (-np.inf, np.inf)
+        self._pip_range = (self._high_max - self._low_min) * self.range_percent
+        self._liquidity_stale = False
+        hl = self._col("hl")
+        self._set("liquidity liquidity_level liquidity_end liquidity_swept swing_swept pool_head pool_total pool_size",
+                  nb_liquidity_pools(h, l, hl, self._col("level"), self._pip_range))
+        # unswept swings keyed by the high (low, negated) that sweeps them, and
+        # the swings swept after the bar a next confirmed swing can be at
+        swept = self._col("swing_swept")
+        self._liquidity_heaps: Dict[int, List[Tuple[float, int]]] = {1: [], -1: []}
+        self._liquidity_recent: Dict[int, List[Tuple[int, int]]] = {1: [], -1: []}
+        for i in np.flatnonzero(~np.isnan(hl) & (swept == 0)):
+            self._liquidity_heaps[int(hl[i])].append((self._sweep_key(int(i)), int(i)))
+        for i in np.flatnonzero(~np.isnan(hl) & (swept > self._size - self.swing_length)):
+            self._liquidity_recent[int(hl[i])].append((int(swept[i]), int(i)))
+        for heap in self._liquidity_heaps.values():
+            heapq.heapify(heap)
+
+    def _sweep_key(self, i: int) -> float:
+        "heap key of the swing at i: the high (low, negated) that sweeps it"
+        level = float(self._arrays["level"][i])
+        return level + self._pip_range if self._arrays["hl"][i] == 1 else -(level - self._pip_range)
+
+    # --- live bars ---
+
+    def add(self, _open: float, _high: float, _low: float, _close: float, _volume: float):
+        "append one closed bar"
+        self._reserve(self._size + 1)
+        j = self._size
+        for name, x in zip(("open", "high", "low", "close", "volume"), (_open, _high, _low, _close, _volume)):
+            self._arrays[name][j] = x
+        self._size += 1
+        self._add_fvg(j)
+        first = self._last_swing < 0
+        swing, replaced = self._add_swing(j)
+        if self._force_last or (swing >= 0 and first):
+            # the forced end swings move
+            self._force_last = False
+            self._build_structure()
+            return
+        if _high > self._high_max or _low < self._low_min:
+            self._liquidity_stale = True
+        if swing >= 0:
+            self._move_swing(j, swing, replaced)
+        self._add_bos(j)
+        self._add_ob(j)
+        if not self._liquidity_stale:
+            self._add_liquidity(j)
+        # a later swing only replaces the last one, the writes before it stay
+        while self._ob_log and self._ob_log[0][0] <= self._last_swing:
+            self._ob_log.popleft()
+
+    def _push_fvg(self, i: int):
+        if self._arrays["fvg"][i] == 1:
+            heapq.heappush(self._fvg_heaps[1], (-self._arrays["fvg_top"][i], i))
+        else:
+            heapq.heappush(self._fvg_heaps[-1], (self._arrays["fvg_bottom"][i], i))
+
+    def _add_fvg(self, j: int):
+        o, h, l, c, _ = self.ohlcv
+        fvg, top, bottom, mitigated = (self._col(name) for name in ("fvg", "fvg_top", "fvg_bottom", "fvg_mitigated"))
+        # bar j completes the gap of bar j - 1
+        i = j - 1
+        if i >= 1:
+            if c[i] > o[i] and h[i - 1] < l[i + 1]:
+                fvg[i], top[i], bottom[i] = 1.0, l[i + 1], h[i - 1]
+            elif c[i] < o[i] and l[i - 1] > h[i + 1]:
+                fvg[i], top[i], bottom[i] = -1.0, l[i - 1], h[i + 1]
+            if self.join_consecutive and fvg[i - 1] == fvg[i]:
+                top[i] = max(top[i - 1], top[i])
+                bottom[i] = min(bottom[i - 1], bottom[i])
+                fvg[i - 1] = top[i - 1] = bottom[i - 1] = mitigated[i - 1] = np.nan
+            if not np.isnan(fvg[i]):
+                mitigated[i] = 0.0
+        if j >= 2 and not np.isnan(fvg[j - 2]):
+            self._push_fvg(j - 2)
+        bull, bear = self._fvg_heaps[1], self._fvg_heaps[-1]
+        while bull and -bull[0][0] >= l[j]:
+            mitigated[heapq.heappop(bull)[1]] = j
+        while bear and bear[0][0] <= h[j]:
+            mitigated[heapq.heappop(bear)[1]] = j
+
+    def _add_swing(self, j: int) -> Tuple[int, int]:
+        """bar j confirms the swing candidate swing_length bars back, returns
+        the new swing and the one it replaced, -1 for none"""
+        n = self.swing_length
+        i = j - n
+        if i < 2 * n - 1:
+            return -1, -1
+        _, h, l, _, _ = self.ohlcv
+        if h[i] == h[i - n + 1:j + 1].max():
+            kind = 1.0
+        elif l[i] == l[i - n + 1:j + 1].min():
+            kind = -1.0
+        else:
+            return -1, -1
+        swings, last = self._col("swings"), self._last_swing
+        replaced = -1
+        if last >= 0 and swings[last] == kind:
+            if not (h[i] > h[last] if kind == 1 else l[i] < l[last]):
+                return -1, -1
+            swings[last] = np.nan
+            replaced = last
+        swings[i] = kind
+        self._last_swing = i
+        return i, replaced
+
+    def _move_swing(self, j: int, i: int, replaced: int):
+        "the structures of the swing at i confirmed by bar j, in place of the one at replaced"
+        _, h, l, _, _ = self.ohlcv
+        hl, level = self._col("hl"), self._col("level")
+        kind = self._arrays["swings"][i]
+        side = int(kind)
+        if replaced >= 0:
+            hl[replaced] = level[replaced] = np.nan
+            self._hl_pos.pop()
+        hl[i], level[i] = kind, h[i] if kind == 1 else l[i]
+        self._hl_pos.append(i)
+        self._add_bos_level(j)
+
+        # order block steps since the moved swing, with the swing each bar sees
+        start = replaced + 1 if replaced >= 0 else i + 1
+        self._rewind_ob(start)
+        if replaced >= 0:
+            self._last_side_swing[side] = next((k for k in reversed(self._hl_pos[:-1]) if hl[k] == kind), -1)
+            for k in range(start, i + 1):
+                self._add_ob(k)
+        self._last_side_swing[side] = i
+        for k in range(i + 1, j):
+            self._add_ob(k)
+
+        if not self._liquidity_stale:
+            if replaced >= 0:
+                self._ungroup_swing(replaced)
+            self._group_swing(j, i)
+
+    def _add_bos_level(self, j: int):
+        "BOS/CHoCH of the pattern ending at the last swing, broken by a bar before j"
+        pos = self._hl_pos
+        if len(pos) < 4:
+            return
+        _, h, l, c, _ = self.ohlcv
+        hl, level = self._col("hl"), self._col("level")
+        bos, choch, lvl, broken = (self._col(name) for name in ("bos", "choch", "bos_level", "broken"))
+        a, b, c_, d = (hl[k] for k in pos[-4:])
+        la, lb, lc, ld = (level[k] for k in pos[-4:])
+        i = pos[-3]
+        bullish = a == -1 and b == 1 and c_ == -1 and d == 1
+        bearish = a == 1 and b == -1 and c_ == 1 and d == -1
+        bos[i] = 1 if bullish and la < lc < lb < ld else -1 if bearish and la > lc > lb > ld else 0
+        choch[i] = 1 if bullish and ld > lb > la > lc else -1 if bearish and ld < lb < la < lc else 0
+        lvl[i] = lb if bos[i] != 0 or choch[i] != 0 else 0.0
+        broken[i] = 0
+        if bos[i] == 0 and choch[i] == 0:
+            return
+        side = 1 if bos[i] == 1 or choch[i] == 1 else -1
+        up, down = (c, c) if self.close_break else (h, l)
+        crossed = np.flatnonzero(up[i + 2:j] > lvl[i] if side == 1 else down[i + 2:j] < lvl[i])
+        if crossed.size:
+            broken[i] = i + 2 + crossed[0]
+        else:
+            heapq.heappush(self._bos_heaps[side], (side * float(lvl[i]), i))
+
+    def _bos_valid(self, key: float, i: int, side: int) -> bool:
+        bos, choch = self._arrays["bos"][i], self._arrays["choch"][i]
+        return (self._arrays["broken"][i] == 0 and (bos == side or choch == side)
+                and key == side * float(self._arrays["bos_level"][i]))
+
+    def _add_bos(self, j: int):
+        _, h, l, c, _ = self.ohlcv
+        broken = self._col("broken")
+        up, down = (c[j], c[j]) if self.close_break else (h[j], l[j])
+        bull, bear = self._bos_heaps[1], self._bos_heaps[-1]
+        while bull and up > bull[0][0]:
+            key, i = heapq.heappop(bull)
+            if self._bos_valid(key, i, 1):
+                broken[i] = j
+        while bear and down < -bear[0][0]:
+            key, i = heapq.heappop(bear)
+            if self._bos_valid(key, i, -1):
+                broken[i] = j
+
+    def _ob_key(self, i: int) -> float:
+        "heap key of the order block at i: the price that mitigates or removes it"
+        top, bottom = float(self._arrays["ob_top"][i]), float(self._arrays["ob_bottom"][i])
+        if self._arrays["ob"][i] == 1:
+            return top if self._arrays["breaker"][i] else -bottom
+        return -bottom if self._arrays["breaker"][i] else top
+
+    def _ob_valid(self, key: float, i: int, side: int, breaker: bool) -> bool:
+        return self._arrays["ob"][i] == side and self._arrays["breaker"][i] == breaker and key == self._ob_key(i)
+
+    def _save_ob(self, j: int, i: int):
+        self._ob_log.append((j, i, tuple(self._arrays[name][i] for name in _OB_COLUMNS)))
+
+    def _rewind_ob(self, start: int):
+        "undo the order block writes of the bars from start, the blocks they touched wait again"
+        touched = set()
+        while self._ob_log and self._ob_log[-1][0] >= start:
+            _, i, values = self._ob_log.pop()
+            for name, x in zip(_OB_COLUMNS, values):
+                self._arrays[name][i] = x
+            touched.add(i)
+        ob, breaker = self._arrays["ob"], self._arrays["breaker"]
+        for i in touched:
+            if ob[i] != 0:
+                heapq.heappush(self._ob_heaps[int(ob[i]), bool(breaker[i])], (self._ob_key(i), i))
+
+    def _add_ob(self, j: int):
+        "one bar of the nb_ob passes"
+        o, h, l, c, v = self.ohlcv
+        ob, top, bottom, ob_volume, mitigated, percentage, crossed, breaker = (
+            self._col(name) for name in ("ob", "ob_top", "ob_bottom", "ob_volume", "ob_mitigated",
+                                         "ob_percentage", "crossed", "breaker"))
+        for side in (1, -1):
+            removing, waiting = self._ob_heaps[side, True], self._ob_heaps[side, False]
+            if side == 1:
+                price = min(o[j], c[j]) if self.close_mitigation else l[j]
+                remove, mitigate = (lambda key: h[j] > key), (lambda key: price < -key)
+            else:
+                price = max(o[j], c[j]) if self.close_mitigation else h[j]
+                remove, mitigate = (lambda key: l[j] < -key), (lambda key: price > key)
+            while removing and remove(removing[0][0]):
+                key, idx = heapq.heappop(removing)
+                if self._ob_valid(key, idx, side, True):
+                    self._save_ob(j, idx)
+                    ob[idx] = mitigated[idx] = 0
+                    top[idx] = bottom[idx] = ob_volume[idx] = percentage[idx] = 0.0
+            mitigated_now = []
+            while waiting and mitigate(waiting[0][0]):
+                key, idx = heapq.heappop(waiting)
+                if self._ob_valid(key, idx, side, False):
+                    self._save_ob(j, idx)
+                    breaker[idx] = True
+                    mitigated[idx] = j - 1 if side == 1 else j
+                    mitigated_now.append(idx)
+            for idx in mitigated_now:
+                heapq.heappush(removing, (self._ob_key(idx), idx))
+
+            last = self._last_side_swing[side]
+            if last < 0 or crossed[last] or not (c[j] > h[last] if side == 1 else c[j] < l[last]):
+                continue
+            self._save_ob(j, last)
+            crossed[last] = True
+            self._save_ob(j, _nb_ob_index(h, l, side, last, j))
+            idx = _nb_ob_create(h, l, v, side, last, j, ob, top, bottom, ob_volume, percentage)
+            heapq.heappush(self._ob_heaps[side, bool(breaker[idx])], (self._ob_key(idx), idx))
+
+    def _group_swing(self, j: int, i: int):
+        """the swing at i confirmed by bar j joins the first ungrouped swing of
+        its kind within pip_range that no bar swept before i"""
+        _, h, l, _, _ = self.ohlcv
+        hl, level, swept, head = (self._col(name) for name in ("hl", "level", "swing_swept", "pool_head"))
+        side = int(hl[i])
+        recent = [(k, a) for k, a in self._liquidity_recent[side] if k > i and hl[a] == side]
+        self._liquidity_recent[side] = recent
+        open_swings = [a for _, a in self._liquidity_heaps[side] if hl[a] == side and swept[a] == 0]
+        pool = min((a for a in open_swings + [a for _, a in recent]
+                    if a < i and head[a] < 0 and side * level[i] >= side * level[a] - self._pip_range), default=-1)
+        if pool >= 0:
+            head[i] = pool
+            total = self._arrays["pool_total"][pool] if self._arrays["pool_size"][pool] else level[pool]
+            self._arrays["pool_size"][pool] += 1
+            self._set_pool(pool, total + level[i], i)
+
+        key = self._sweep_key(i)
+        crossed = np.flatnonzero(h[i + 1:j] >= key if side == 1 else l[i + 1:j] <= -key)
+        if crossed.size:
+            self._sweep(i, i + 1 + int(crossed[0]))
+        else:
+            heapq.heappush(self._liquidity_heaps[side], (key, i))
+
+    def _ungroup_swing(self, i: int):
+        "the replaced swing at i leaves its pool"
+        level, head = self._col("level"), self._col("pool_head")
+        self._arrays["swing_swept"][i] = 0
+        pool = int(head[i])
+        if pool < 0:
+            return
+        head[i] = -1
+        self._arrays["pool_size"][pool] -= 1
+        members = pool + 1 + np.flatnonzero(head[pool + 1:i] == pool)
+        if not members.size:
+            self._arrays["pool_total"][pool] = 0.0
+            for name in ("liquidity", "liquidity_level", "liquidity_end", "liquidity_swept"):
+                self._arrays[name][pool] = np.nan
+            return
+        # the sum in the order nb_liquidity_pools adds the levels
+        total = level[pool]
+        for k in members:
+            total += level[k]
+        self._set_pool(pool, total, int(members[-1]))
+
+    def _set_pool(self, pool: int, total: float, end: int):
+        size = self._arrays["pool_size"][pool]
+        self._arrays["pool_total"][pool] = total
+        self._arrays["liquidity"][pool] = self._arrays["hl"][pool]
+        self._arrays["liquidity_level"][pool] = total / (size + 1)
+        self._arrays["liquidity_end"][pool] = end
+        self._arrays["liquidity_swept"][pool] = self._arrays["swing_swept"][pool]
+
+    def _sweep(self, i: int, j: int):
+        self._arrays["swing_swept"][i] = j
+        if not np.isnan(self._arrays["liquidity"][i]):
+            self._arrays["liquidity_swept"][i] = j
+        self._liquidity_recent[int(self._arrays["hl"][i])].append((j, i))
+
+    def _add_liquidity(self, j: int):
+        _, h, l, _, _ = self.ohlcv
+        hl, swept = self._col("hl"), self._col("swing_swept")
+        highs, lows = self._liquidity_heaps[1], self._liquidity_heaps[-1]
+        while highs and h[j] >= highs[0][0]:
+            i = heapq.heappop(highs)[1]
+            if hl[i] == 1 and swept[i] == 0:
+                self._sweep(i, j)
+        while lows and l[j] <= -lows[0][0]:
+            i = heapq.heappop(lows)[1]
+            if hl[i] == -1 and swept[i] == 0:
+                self._sweep(i, j)
+
+    # --- smc columns ---
+
+    def swing_highs_lows(self) -> pd.DataFrame:
+        return pd.DataFrame({"HighLow": self._col("hl"), "Level": self._col("level")})
+
+    def fvg(self) -> pd.DataFrame:
+        return pd.DataFrame({"FVG": self._col("fvg"), "Top": self._col("fvg_top"),
+                             "Bottom": self._col("fvg_bottom"), "MitigatedIndex": self._col("fvg_mitigated")})
+
+    def bos_choch(self) -> pd.DataFrame:
+        bos, choch, lvl, broken = (self._col(name).copy() for name in ("bos", "choch", "bos_level", "broken"))
+        nb_bos_choch_filter(bos, choch, lvl, broken)
+        return pd.DataFrame({"BOS": _nan_zero(bos), "CHOCH": _nan_zero(choch),
+                             "Level": _nan_zero(lvl), "BrokenIndex": _nan_zero(broken)})
+
+    def ob(self) -> pd.DataFrame:
+        ob = _nan_zero(self._col("ob"))
+        valid = ~np.isnan(ob)
+        columns = {"OB": ob}
+        for column, name in (("Top", "ob_top"), ("Bottom", "ob_bottom"), ("OBVolume", "ob_volume"),
+                             ("MitigatedIndex", "ob_mitigated"), ("Percentage", "ob_percentage")):
+            columns[column] = np.where(valid, self._col(name), np.nan)
+        return pd.DataFrame(columns)
+
+    def liquidity(self) -> pd.DataFrame:
+        if self._liquidity_stale:
+            self._build_liquidity()
+        return pd.DataFrame({"Liquidity": self._col("liquidity"), "Level": self._col("liquidity_level"),
+                             "End": self._col("liquidity_end"), "Swept": self._col("liquidity_swept")})
+
+    def all(self) -> Dict[str, pd.DataFrame]:
+        return {"swing_highs_lows": self.swing_highs_lows(), "fvg": self.fvg(), "bos_choch": self.bos_choch(),
+                "ob": self.ob(), "liquidity": self.liquidity()}
@@ -0,0 +1,396 @@
+# -*- coding: utf-8 -*-
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from numba import njit
+
+
+LONG = 1
+SHORT = -1
+
+# exit reasons
+EXIT_SIGNAL = 0
+EXIT_STOP_LOSS = 1
+EXIT_TAKE_PROFIT = 2
+EXIT_TRAILING = 3
+EXIT_END = 4
+EXIT_REASONS = ("signal", "stop_loss", "take_profit", "trailing", "end")
+
+TRADE = np.dtype([("side", np.int8), ("entry_index", np.int64), ("exit_index", np.int64),
+                  ("entry_price", np.float64), ("exit_price", np.float64), ("qty", np.float64),
+                  ("fee", np.float64), ("pnl", np.float64), ("reason", np.int8)])
+
+
+@njit(cache=True)
+def nb_reserve_trade(trades, k):
+    "trades with room for row k, doubled when full"
+    if k < trades.shape[0]:
+        return trades
+    grown = np.empty((2 * trades.shape[0], trades.shape[1]), dtype=trades.dtype)
+    grown[:k] = trades[:k]
+    return grown
+
+
+# Close the open position at `price` on bar i and write its trade row.
+# pos: [side, entry index, entry price, qty, entry fee, stop, take profit,
+# trailing stop, extreme price since entry]. Returns the net pnl.
+@njit(cache=True)
+def nb_close_position(pos, i, price, reason, taker_fee, trades, k):
+    side, qty = pos[0], pos[3]
+    exit_fee = qty * price * taker_fee / 100
+    pnl = side * qty * (price - pos[2]) - pos[4] - exit_fee
+    trades[k, 0], trades[k, 1], trades[k, 2] = side, pos[1], i
+    trades[k, 3], trades[k, 4], trades[k, 5] = pos[2], price, qty
+    trades[k, 6], trades[k, 7], trades[k, 8] = pos[4] + exit_fee, pnl, reason
+    pos[0] = 0.0
+    return pnl
+
+
+@njit(cache=True)
+def nb_open_position(pos, side, i, price, stop, sl_pct, tp_pct, tp_ratio, trail_pct, margin, leverage, taker_fee):
+    qty = margin * leverage / price
+    if np.isnan(stop) and sl_pct > 0:
+        stop = price * (1 - side * sl_pct / 100)
+    take_profit = np.nan
+    if tp_pct > 0:
+        take_profit = price * (1 + side * tp_pct / 100)
+    elif tp_ratio > 0 and not np.isnan(stop):
+        take_profit = price + tp_ratio * (price - stop)
+    pos[0], pos[1], pos[2], pos[3] = side, i, price, qty
+    pos[4] = qty * price * taker_fee / 100
+    pos[5], pos[6] = stop, take_profit
+    pos[7] = price * (1 - side * trail_pct / 100) if trail_pct > 0 else np.nan
+    pos[8] = price
+
+
+# Stop loss, trailing stop and take profit of the open position against bar
+# i. The stops are tested first, so a bar reaching both sides counts as a
+# loss (the bar alone can't tell the order); a bar opening beyond a level
+# fills at its open. Returns (exit price, reason) or (nan, -1).
+@njit(cache=True)
+def nb_check_exit(pos, o, h, l):
+    side = pos[0]
+    stop, reason = pos[5], EXIT_STOP_LOSS
+    trail = pos[7]
+    if not np.isnan(trail) and (np.isnan(stop) or side * (trail - stop) > 0):
+        stop, reason = trail, EXIT_TRAILING
+    if not np.isnan(stop):
+        if side == LONG and l <= stop:
+            return min(o, stop), reason
+        if side == SHORT and h >= stop:
+            return max(o, stop), reason
+    target = pos[6]
+    if not np.isnan(target):
+        if side == LONG and h >= target:
+            return max(o, target), EXIT_TAKE_PROFIT
+        if side == SHORT and l <= target:
+            return min(o, target), EXIT_TAKE_PROFIT
+    return np.nan, -1
+
+
+@njit(cache=True)
+def nb_trail(pos, h, l, trail_pct):
+    "move the trailing stop with the extreme price of a bar the position survived"
+    if trail_pct <= 0:
+        return
+    if pos[0] == LONG and h > pos[8]:
+        pos[8] = h
+        pos[7] = h * (1 - trail_pct / 100)
+    elif pos[0] == SHORT and l < pos[8]:
+        pos[8] = l
+        pos[7] = l * (1 + trail_pct / 100)
+
+
+# A bar reaching both the stop (or trailing stop) and the take profit of the
+# open position: its OHLC can't tell which was hit first.
+@njit(cache=True)
+def nb_exit_ambiguous(pos, h, l):
+    side, target = pos[0], pos[6]
+    if np.isnan(target) or not (side == LONG and h >= target or side == SHORT and l <= target):
+        return False
+    for stop in (pos[5], pos[7]):
+        if not np.isnan(stop) and (side == LONG and l <= stop or side == SHORT and h >= stop):
+            return True
+    return False
+
+
+# Exit of the open position replayed on the sub-bars [first, last) of a
+# bar, in time order, moving the trailing stop after each one it survives.
+@njit(cache=True)
+def nb_replay_exit(pos, sub_open, sub_high, sub_low, first, last, trail_pct):
+    for j in range(first, last):
+        price, reason = nb_check_exit(pos, sub_open[j], sub_high[j], sub_low[j])
+        if reason >= 0:
+            return price, reason
+        nb_trail(pos, sub_high[j], sub_low[j], trail_pct)
+    return np.nan, -1
+
+
+# Bar loop of the backtest from bar `start`. Signals are read on the bar
+# close; entries fill at that close, or at the next open with next_open. An
+# opposite entry signal closes the position (and reverses it with
+# `reverse`), like the chart side check_active_other_side_pos. Once the
+# realized equity is gone (initial_equity + realized <= 0) the account is
+# ruined and no new position is opened.
+# With `intrabar`, an ambiguous exit bar is resolved on its sub-bars
+# sub_first[i]:sub_last[i] (OHLC rule when it has none); when the bar is
+# outside the loaded bars [loaded_lo, loaded_hi) the loop stops there and
+# returns its index so the caller can load them and resume.
+# state: [realized pnl, trade count, pending side, pending stop], kept with
+# pos, trades, equity and fees across calls. Returns (trades, next bar).
+@njit(cache=True)
+def nb_backtest_range(_open, _high, _low, _close, long_entry, short_entry, long_exit, short_exit,
+                      stop_long, stop_short, sl_pct, tp_pct, tp_ratio, trail_pct, capital, leverage,
+                      taker_fee, initial_equity, compound, reverse, next_open, intrabar, sub_open, sub_high,
+                      sub_low, sub_first, sub_last, loaded_lo, loaded_hi, start, state, pos, trades, equity, fees):
+    m = _close.size
+    realized, k = state[0], int(state[1])
+    pending, pending_stop = int(state[2]), state[3]
+    for i in range(start, m):
+        if pending != 0:
+            margin = capital * (initial_equity + realized) / initial_equity if compound else capital
+            nb_open_position(pos, pending, i, _open[i], pending_stop, sl_pct, tp_pct, tp_ratio, trail_pct,
+                             margin, leverage, taker_fee)
+            fees[i] += pos[4]
+            pending = 0
+        side = int(pos[0])
+        if side != 0 and (pos[1] < i or next_open):
+            if intrabar and nb_exit_ambiguous(pos, _high[i], _low[i]):
+                if i < loaded_lo or i >= loaded_hi:
+                    state[0], state[1], state[2], state[3] = realized, k, pending, pending_stop
+                    return trades, i
+                if sub_first[i] < sub_last[i]:
+                    price, reason = nb_replay_exit(pos, sub_open, sub_high, sub_low, sub_first[i], sub_last[i],
+                                                   trail_pct)
+                else:
+                    price, reason = nb_check_exit(pos, _open[i], _high[i], _low[i])
+            else:
+                price, reason = nb_check_exit(pos, _open[i], _high[i], _low[i])
+            if reason >= 0:
+                trades = nb_reserve_trade(trades, k)
+                fee_open = pos[4]
+                realized += nb_close_position(pos, i, price, reason, taker_fee, trades, k)
+                fees[i] += trades[k, 6] - fee_open
+                k += 1
+            else:
+                nb_trail(pos, _high[i], _low[i], trail_pct)
+        side = int(pos[0])
+        signal = 0
+        if long_entry[i] and not short_entry[i]:
+            signal = LONG
+        elif short_entry[i] and not long_entry[i]:
+            signal = SHORT
+        if side != 0 and ((side == LONG and long_exit[i]) or (side == SHORT and short_exit[i])
+                          or signal == -side):
+            trades = nb_reserve_trade(trades, k)
+            fee_open = pos[4]
+            realized += nb_close_position(pos, i, _close[i], EXIT_SIGNAL, taker_fee, trades, k)
+            fees[i] += trades[k, 6] - fee_open
+            k += 1
+            if not reverse:
+                signal = 0
+        if pos[0] == 0 and signal != 0 and initial_equity + realized > 0:
+            stop = stop_long[i] if signal == LONG else stop_short[i]
+            if next_open:
+                if i + 1 < m:
+                    pending, pending_stop = signal, stop
+            else:
+                margin = capital * (initial_equity + realized) / initial_equity if compound else capital
+                nb_open_position(pos, signal, i, _close[i], stop, sl_pct, tp_pct, tp_ratio, trail_pct,
+                                 margin, leverage, taker_fee)
+                fees[i] += pos[4]
+        equity[i] = initial_equity + realized
+        if pos[0] != 0:
+            equity[i] += pos[0] * pos[3] * (_close[i] - pos[2]) - pos[4]
+    state[0], state[1], state[2], state[3] = realized, k, pending, pending_stop
+    return trades, m
+
+
+@njit(cache=True)
+def nb_close_end(_close, taker_fee, initial_equity, state, pos, trades, equity, fees):
+    "close the position still open after the last bar, returns (trades, trade count)"
+    m = _close.size
+    k = int(state[1])
+    if pos[0] != 0:
+        trades = nb_reserve_trade(trades, k)
+        fee_open = pos[4]
+        state[0] += nb_close_position(pos, m - 1, _close[m - 1], EXIT_END, taker_fee, trades, k)
+        fees[m - 1] += trades[k, 6] - fee_open
+        equity[m - 1] = initial_equity + state[0]
+        k += 1
+    state[1] = k
+    return trades, k
+
+
+# The whole bar loop on OHLC only. Returns (trade rows, trade count, equity
+# on every close, fee paid on every bar).
+@njit(cache=True)
+def nb_backtest(_open, _high, _low, _close, long_entry, short_entry, long_exit, short_exit,
+                stop_long, stop_short, sl_pct, tp_pct, tp_ratio, trail_pct, capital, leverage,
+                taker_fee, initial_equity, compound, reverse, next_open):
+    m = _close.size
+    state = np.array([0.0, 0.0, 0.0, np.nan])
+    pos = np.zeros(9, dtype=np.float64)
+    trades = np.empty((64, 9), dtype=np.float64)
+    equity = np.empty(m, dtype=np.float64)
+    fees = np.zeros(m, dtype=np.float64)
+    no_sub = np.empty(0, dtype=np.float64)
+    no_index = np.empty(0, dtype=np.int64)
+    trades, _ = nb_backtest_range(_open, _high, _low, _close, long_entry, short_entry, long_exit, short_exit,
+                                  stop_long, stop_short, sl_pct, tp_pct, tp_ratio, trail_pct, capital, leverage,
+                                  taker_fee, initial_equity, compound, reverse, next_open, False, no_sub, no_sub,
+                                  no_sub, no_index, no_index, 0, 0, 0, state, pos, trades, equity, fees)
+    trades, k = nb_close_end(_close, taker_fee, initial_equity, state, pos, trades, equity, fees)
+    return trades, k, equity, fees
+
+
+def candle_arrays(source) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    "(time, open, high, low, close) of a CANDLE_STORE, an ohlc DataFrame or a dict of columns"
+    if isinstance(source, (pd.DataFrame, dict)):
+        columns = [source[name] for name in ("time", "open", "high", "low", "close")]
+    else:
+        columns = source.columns(("time", "open", "high", "low", "close"))
+    return tuple(np.ascontiguousarray(x, dtype=np.int64 if j == 0 else np.float64)
+                 for j, x in enumerate(columns))
+
+
+class BACKTEST_RESULT:
+    "trades, equity and drawdown of one backtest run"
+
+    def __init__(self, times: np.ndarray, trades: np.ndarray, equity: np.ndarray, fees: np.ndarray,
+                 initial_equity: float):
+        self.times = times
+        self.trades = trades
+        self.equity = equity
+        self.fees = fees
+        self.initial_equity = initial_equity
+
+    @property
+    def drawdown(self) -> np.ndarray:
+        "percent below the running equity peak, <= 0"
+        peak = np.maximum.accumulate(np.maximum(self.equity, self.initial_equity)) if self.equity.size else self.equity
+        return (self.equity / peak - 1) * 100
+
+    @property
+    def max_drawdown(self) -> float:
+        return float(-self.drawdown.min()) if self.equity.size else 0.0
+
+    @property
+    def net_profit(self) -> float:
+        return float(self.trades["pnl"].sum())
+
+    @property
+    def total_fee(self) -> float:
+        return float(self.fees.sum())
+
+    def equity_series(self) -> pd.Series:
+        "equity indexed by bar time, the input of the pandas_ta _metrics functions"
+        return pd.Series(self.equity, index=pd.to_datetime(self.times, unit="ms"), name="equity")
+
+    def trades_df(self) -> pd.DataFrame:
+        df = pd.DataFrame(self.trades)
+        df["reason"] = np.array(EXIT_REASONS, dtype=object)[df["reason"].to_numpy(dtype=np.int64)]
+        for name in ("entry", "exit"):
+            df[f"{name}_time"] = self.times[df[f"{name}_index"].to_numpy()]
+        return df
+
+    def summary(self) -> Dict[str, float]:
+        pnl = self.trades["pnl"]
+        wins, losses = pnl[pnl > 0], pnl[pnl <= 0]
+        return {"trades": int(pnl.size),
+                "net_profit": self.net_profit,
+                "net_profit_percent": self.net_profit / self.initial_equity * 100,
+                "total_fee": self.total_fee,
+                "win_rate": float(wins.size / pnl.size * 100) if pnl.size else 0.0,
+                "profit_factor": float(wins.sum() / -losses.sum()) if losses.sum() < 0 else np.inf,
+                "max_drawdown": self.max_drawdown}
+
+
+def _load_sub_bars(intrabar, times: np.ndarray, step: int, i: int, sub_first: np.ndarray,
+                   sub_last: np.ndarray) -> Tuple[int, np.ndarray, np.ndarray, np.ndarray]:
+    """sub-bars of the intrabar segment holding bar i, for bar i and the bars
+    after it that end inside it; returns (end bar, open, high, low)"""
+    end_time = max((times[i] // intrabar.span + 1) * intrabar.span, times[i] + step)
+    rows = intrabar.read(int(times[i]), int(end_time))
+    hi = max(i + 1, int(np.searchsorted(times, end_time - step, side="right")))
+    bar_end = times[i:hi] + step
+    if hi < times.size:
+        bar_end = np.minimum(bar_end, times[i + 1:hi + 1])
+    else:
+        bar_end[:-1] = np.minimum(bar_end[:-1], times[i + 1:hi])
+    sub_times = rows[:, 0]
+    sub_first[i:hi] = np.searchsorted(sub_times, times[i:hi])
+    sub_last[i:hi] = np.searchsorted(sub_times, bar_end)
+    return hi, *(np.ascontiguousarray(rows[:, j]) for j in (1, 2, 3))
+
+
+def _intrabar_backtest(times: np.ndarray, args: tuple, intrabar):
+    "nb_backtest_range resumed each time it stops on an ambiguous bar whose sub-bars aren't loaded"
+    _close, taker_fee, initial_equity = args[3], args[16], args[17]
+    m = _close.size
+    step = int(np.diff(times).min()) if m > 1 else 0
+    state = np.array([0.0, 0.0, 0.0, np.nan])
+    pos = np.zeros(9, dtype=np.float64)
+    trades = np.empty((64, 9), dtype=np.float64)
+    equity = np.empty(m, dtype=np.float64)
+    fees = np.zeros(m, dtype=np.float64)
+    sub_first = np.zeros(m, dtype=np.int64)
+    sub_last = np.zeros(m, dtype=np.int64)
+    sub_open = sub_high = sub_low = np.empty(0, dtype=np.float64)
+    lo = hi = i = 0
+    while True:
+        trades, i = nb_backtest_range(*args, True, sub_open, sub_high, sub_low, sub_first, sub_last, lo, hi, i,
+                                      state, pos, trades, equity, fees)
+        if i >= m:
+            break
+        lo = i
+        hi, sub_open, sub_high, sub_low = _load_sub_bars(intrabar, times, step, i, sub_first, sub_last)
+    trades, k = nb_close_end(_close, taker_fee, initial_equity, state, pos, trades, equity, fees)
+    return trades, k, equity, fees
+
+
+def backtest(source, long_entry, short_entry, long_exit=None, short_exit=None,
+             stop_long=None, stop_short=None, sl_pct: float = 0.0, tp_pct: float = 0.0,
+             tp_ratio: float = 0.0, trail_pct: float = 0.0, capital: float = 100.0, leverage: float = 1.0,
+             taker_fee: float = 0.05, initial_equity: Optional[float] = None, compound: bool = False,
+             reverse: bool = True, next_open: bool = False, intrabar=None) -> BACKTEST_RESULT:
+    """Headless backtest of signal arrays on a candle source.
+
+    Entry/exit inputs are bool arrays aligned with the candles (the
+    long/short columns of a StrategyBase). stop_long / stop_short are stop
+    prices read on the entry signal bar (stoploss_low / stoploss_high of
+    the chart side), NaN falls back to sl_pct. Take profit is tp_pct or
+    tp_ratio times the initial risk. Percent inputs are in %, like the
+    pl_calculator fees. Each trade puts `capital` margin at `leverage`
+    (scaled with equity when `compound`).
+
+    `intrabar` (an INTRABAR_SOURCE of lower timeframe bars) resolves the
+    bars that reach both the stop and the take profit on their sub-bars
+    instead of counting them as losses; sub-bars are read only for the
+    cache segments where such a bar occurs.
+    """
+    times, _open, _high, _low, _close = candle_arrays(source)
+    m = _close.size
+    no_signal = np.zeros(m, dtype=np.bool_)
+    no_stop = np.full(m, np.nan)
+
+    def _bools(x):
+        return no_signal if x is None else np.ascontiguousarray(x, dtype=np.bool_)
+
+    def _prices(x):
+        return no_stop if x is None else np.ascontiguousarray(x, dtype=np.float64)
+
+    initial_equity = float(capital if initial_equity is None else initial_equity)
+    args = (_open, _high, _low, _close, _bools(long_entry), _bools(short_entry), _bools(long_exit),
+            _bools(short_exit), _prices(stop_long), _prices(stop_short), float(sl_pct), float(tp_pct),
+            float(tp_ratio), float(trail_pct), float(capital), float(leverage), float(taker_fee),
+            initial_equity, bool(compound), bool(reverse), bool(next_open))
+    if intrabar is None or m == 0:
+        trades, k, equity, fees = nb_backtest(*args)
+    else:
+        trades, k, equity, fees = _intrabar_backtest(times, args, intrabar)
+    rows = np.empty(k, dtype=TRADE)
+    for j, name in enumerate(TRADE.names):
+        rows[name] = trades[:k, j]
+    return BACKTEST_RESULT(times, rows, equity, fees, initial_equity)
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+import random
+import threading
+from concurrent.futures import Executor, Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from atklip.app_utils.helpers import dna_to_hp
+from atklip.appmanager.worker.threadpool import Heavy_ProcessPoolExecutor_global, ThreadPoolExecutor_global
+from atklip.controls.pandas_ta.utils._metrics import calmar_ratio, sharpe_ratio, sortino_ratio
+from atklip.controls.strategies.backtest import BACKTEST_RESULT
+from atklip.controls.strategies.optimizer import SHARED_CANDLES, attach_candles, param_key, run_backtest
+
+
+# the gene alphabet of dna_to_hp, chr(40) .. chr(119)
+GENE_MIN, GENE_MAX = 40, 119
+
+FITNESS = {"sharpe": sharpe_ratio, "calmar": calmar_ratio, "sortino": sortino_ratio}
+
+
+def fitness_score(result: BACKTEST_RESULT, fitness: str = "sharpe", min_trades: int = 5) -> float:
+    """FITNESS ratio of the daily equity curve, -inf when it can't rank the
+    run (too few trades, equity wiped out, undefined ratio)"""
+    if result.trades.size < min_trades or result.equity.size == 0 or result.equity.min() <= 0:
+        return -np.inf
+    daily = result.equity_series().resample("1D").last().dropna()
+    if daily.size < 2:
+        return -np.inf
+    with np.errstate(all="ignore"):
+        score = float(FITNESS[fitness](daily))
+    return score if np.isfinite(score) else -np.inf
+
+
+def evaluate_genomes(spec: Tuple[str, int], signal_fn: Callable, batch: List[Dict[str, Any]],
+                     backtest_kwargs: Dict[str, Any], fitness: str, min_trades: int
+                     ) -> List[Tuple[float, Dict[str, float]]]:
+    "(fitness, summary) of decoded genomes, the process pool task"
+    candles = attach_candles(spec)
+    scores = []
+    for params in batch:
+        result = run_backtest(candles, signal_fn, params, backtest_kwargs)
+        scores.append((fitness_score(result, fitness, min_trades), result.summary()))
+    return scores
+
+
+class GENETIC_OPTIMIZER:
+    """Genetic search of strategy hyperparameters on the jesse DNA encoding.
+
+    `hyperparameters` are jesse style dicts (name, type int/float, min,
+    max); a genome is one gene character per hyperparameter, decoded by
+    dna_to_hp. Each generation keeps the `elitism` best genomes, breeds the
+    rest by tournament selection, one point crossover and per gene
+    mutation, and evaluates the children in the process pool against
+    shared-memory candles. Fitness is cached per decoded parameter set, so
+    genomes decoding to an evaluated set (frequent for int genes) cost
+    nothing.
+    """
+
+    def __init__(self, signal_fn: Callable, hyperparameters: List[Dict[str, Any]],
+                 backtest_kwargs: Optional[Dict[str, Any]] = None, fitness: str = "sharpe",
+                 population_size: int = 50, generations: int = 30, elitism: int = 2,
+                 mutation_rate: float = 0.1, tournament_size: int = 3, min_trades: int = 5,
+                 batch_size: int = 4, seed: Optional[int] = None,
+                 executor: Optional[Executor] = Heavy_ProcessPoolExecutor_global):
+        if fitness not in FITNESS:
+            raise ValueError(f"fitness must be one of {list(FITNESS)}")
+        self.signal_fn = signal_fn
+        self.hyperparameters = hyperparameters
+        self.backtest_kwargs = dict(backtest_kwargs or {})
+        self.fitness = fitness
+        self.population_size = population_size
+        self.generations = generations
+        self.elitism = min(elitism, population_size)
+        self.mutation_rate = mutation_rate
+        self.tournament_size = tournament_size
+        self.min_trades = min_trades
+        self.batch_size = max(1, batch_size)
+        self.executor = executor
+        self.rng = random.Random(seed)
+        self._cancel = threading.Event()
+        # param key -> (fitness, summary)
+        self.cache: Dict[str, Tuple[float, Dict[str, float]]] = {}
+        self.population: List[Tuple[float, str]] = []
+        self.evaluated = 0
+
+    def decode(self, dna: str) -> Dict[str, Any]:
+        return dna_to_hp(self.hyperparameters, dna)
+
+    def _random_dna(self) -> str:
+        return "".join(chr(self.rng.randint(GENE_MIN, GENE_MAX)) for _ in self.hyperparameters)
+
+    def _select(self) -> str:
+        "tournament selection over the ranked population"
+        picks = self.rng.sample(range(len(self.population)), min(self.tournament_size, len(self.population)))
+        return self.population[min(picks)][1]
+
+    def _child(self) -> str:
+        mother, father = self._select(), self._select()
+        cut = self.rng.randint(1, len(mother) - 1) if len(mother) > 1 else 0
+        genes = list(mother[:cut] + father[cut:])
+        for j in range(len(genes)):
+            if self.rng.random() < self.mutation_rate:
+                genes[j] = chr(self.rng.randint(GENE_MIN, GENE_MAX))
+        return "".join(genes)
+
+    def _evaluate(self, spec: Tuple[str, int], genomes: List[str]) -> List[Tuple[float, str]]:
+        "fitness of the genomes, only decoded sets missing from the cache are backtested"
+        todo: Dict[str, Dict[str, Any]] = {}
+        for dna in genomes:
+            params = self.decode(dna)
+            key = param_key(params)
+            if key not in self.cache:
+                todo[key] = params
+        keys = list(todo)
+        batches = [keys[i:i + self.batch_size] for i in range(0, len(keys), self.batch_size)]
+        args = [(spec, self.signal_fn, [todo[key] for key in batch], self.backtest_kwargs, self.fitness,
+                 self.min_trades) for batch in batches]
+        if self.executor is None or len(batches) < 2:
+            results = [evaluate_genomes(*x) for x in args]
+        else:
+            futures = [self.executor.submit(evaluate_genomes, *x) for x in args]
+            results = [future.result() for future in futures]
+        for batch, scores in zip(batches, results):
+            for key, score in zip(batch, scores):
+                self.cache[key] = score
+        self.evaluated += len(keys)
+        return [(self.cache[param_key(self.decode(dna))][0], dna) for dna in genomes]
+
+    @staticmethod
+    def _rank(scored: List[Tuple[float, str]]) -> List[Tuple[float, str]]:
+        "best first, stored as (-fitness, dna) so min() is the best"
+        return sorted((-score, dna) for score, dna in scored)
+
+    def cancel(self):
+        self._cancel.set()
+
+    def run(self, source, callback: Optional[Callable[[int, "GENETIC_OPTIMIZER"], None]] = None
+            ) -> List[Tuple[Dict[str, Any], float, Dict[str, float]]]:
+        """evolve for `generations` (or until cancelled), calling
+        callback(generation, self) after each one; returns the ranking"""
+        self._cancel.clear()
+        with SHARED_CANDLES(source) as candles:
+            genomes = [self._random_dna() for _ in range(self.population_size)]
+            self.population = self._rank(self._evaluate(candles.spec, genomes))
+            if callback is not None:
+                callback(0, self)
+            for generation in range(1, self.generations + 1):
+                if self._cancel.is_set():
+                    break
+                elites = self.population[:self.elitism]
+                children = [self._child() for _ in range(self.population_size - len(elites))]
+                scored = self._evaluate(candles.spec, children)
+                # duplicate genomes stay, so the population keeps its size
+                self.population = sorted(elites + self._rank(scored))
+                if callback is not None:
+                    callback(generation, self)
+        return self.ranking()
+
+    def ranking(self, n: Optional[int] = None) -> List[Tuple[Dict[str, Any], float, Dict[str, float]]]:
+        "(params, fitness, summary) of the current population, best first, one row per parameter set"
+        rows, seen = [], set()
+        for _, dna in self.population:
+            params = self.decode(dna)
+            key = param_key(params)
+            if key not in seen:
+                seen.add(key)
+                score, summary = self.cache[key]
+                rows.append((params, score, summary))
+        return rows[:n]
+
+    @property
+    def best(self) -> Optional[Tuple[Dict[str, Any], float, Dict[str, float]]]:
+        top = self.ranking(1)
+        return top[0] if top else None
+
+    def start(self, source, callback=None) -> Future:
+        "run() on the thread pool, for the GUI"
+        return ThreadPoolExecutor_global.submit(self.run, source, callback)
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+from typing import Optional
+
+import numpy as np
+
+from atklip.exchanges.ohlcv_cache import CACHE_ROOT, OHLCV_CACHE, OHLCV_CACHE_global, OHLCV_FIELDS, timeframe_to_ms
+
+
+class INTRABAR_SOURCE:
+    """Lower timeframe bars of the OHLCV_CACHE for `backtest(intrabar=...)`.
+
+    The backtest reads one cache segment (`span` ms) at a time and only
+    for the segments holding a bar it can't resolve on OHLC, so precise
+    fills on years of 1h/4h bars touch a small part of the 1m history.
+    Tick data fits too, stored as bars with open = high = low = close.
+    Pickles without the cache lock, so it can go to the process pool with
+    the optimizers' backtest_kwargs.
+    """
+
+    def __init__(self, exchange_id: str, symbol: str, timeframe: str = "1m",
+                 cache: Optional[OHLCV_CACHE] = None):
+        self.exchange_id = exchange_id
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.cache = cache if cache is not None else OHLCV_CACHE_global
+        self.span = timeframe_to_ms(timeframe) * self.cache.segment_bars
+
+    def read(self, start: int, end: int) -> np.ndarray:
+        "cached rows with start <= time < end, n x 6 like OHLCV_CACHE.read"
+        return self.cache.read(self.exchange_id, self.symbol, self.timeframe, start, end - 1)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        cache = state.pop("cache")
+        state["_cache"] = (cache.root, cache.segment_bars)
+        return state
+
+    def __setstate__(self, state):
+        root, segment_bars = state.pop("_cache", (CACHE_ROOT, 50_000))
+        self.__dict__.update(state)
+        self.cache = OHLCV_CACHE(root, segment_bars)
+
+
+class INTRABAR_ROWS:
+    "in-memory sub-bars (n x 6 time, open, high, low, close, volume) for `backtest(intrabar=...)`"
+
+    def __init__(self, rows: np.ndarray, span: int = 30 * 24 * 60 * 60 * 1000):
+        rows = np.asarray(rows, dtype=np.float64).reshape(-1, len(OHLCV_FIELDS))
+        self.rows = rows[np.argsort(rows[:, 0], kind="stable")]
+        self.span = span
+
+    def read(self, start: int, end: int) -> np.ndarray:
+        first, last = np.searchsorted(self.rows[:, 0], (start, end))
+        return self.rows[first:last]
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+import atexit
+import bisect
+import inspect
+import itertools
+import json
+import math
+import os
+import random
+import threading
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, wait
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from atklip.appmanager.worker.threadpool import Heavy_ProcessPoolExecutor_global, ThreadPoolExecutor_global
+from atklip.controls.strategies.backtest import backtest
+
+
+CANDLE_COLUMNS = ("time", "open", "high", "low", "close", "volume")
+BACKTEST_ARGS = frozenset(inspect.signature(backtest).parameters) - {"source"}
+
+
+class SHARED_CANDLES:
+    """Candle columns in one multiprocessing.shared_memory block.
+
+    The owner copies the arrays once; tasks only carry `spec` (block name
+    and length) and workers map the block with `attach_candles`, so no
+    DataFrame is pickled per task.
+    """
+
+    def __init__(self, source):
+        if isinstance(source, (pd.DataFrame, dict)):
+            columns = [source[name] if name in source else np.zeros(len(source["close"])) for name in CANDLE_COLUMNS]
+        else:
+            columns = source.columns(CANDLE_COLUMNS)
+        size = len(columns[0])
+        self.shm = shared_memory.SharedMemory(create=True, size=max(8 * size * len(CANDLE_COLUMNS), 8))
+        block = np.ndarray((len(CANDLE_COLUMNS), size), dtype=np.float64, buffer=self.shm.buf)
+        for j, x in enumerate(columns):
+            block[j] = np.asarray(x, dtype=np.float64)
+        del block
+        self.spec = (self.shm.name, size)
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# worker side blocks, kept open for the next tasks of the same run
+_ATTACHED: Dict[str, Tuple[shared_memory.SharedMemory, Dict[str, np.ndarray]]] = {}
+# blocks of earlier runs whose views were still alive, closed once they are released
+_RETIRED: List[shared_memory.SharedMemory] = []
+
+
+def _try_close(shm: shared_memory.SharedMemory) -> bool:
+    try:
+        shm.close()
+    except BufferError:
+        # a caller still holds views of the block
+        return False
+    return True
+
+
+@atexit.register
+def detach_candles():
+    "drop the cached views of the attached blocks and close every block no view is left of"
+    # the cached views go with their entry, before the block is closed
+    _RETIRED.extend(_ATTACHED.pop(name)[0] for name in list(_ATTACHED))
+    _RETIRED[:] = [shm for shm in _RETIRED if not _try_close(shm)]
+
+
+def attach_candles(spec: Tuple[str, int]) -> Dict[str, np.ndarray]:
+    "read only column views of a SHARED_CANDLES block"
+    name, size = spec
+    if name not in _ATTACHED:
+        detach_candles()
+        shm = shared_memory.SharedMemory(name=name)
+        # frombuffer views hold the buffer, so a live view keeps its block mapped
+        block = np.frombuffer(shm.buf, dtype=np.float64, count=len(CANDLE_COLUMNS) * size)
+        block = block.reshape(len(CANDLE_COLUMNS), size)
+        block.flags.writeable = False
+        columns = {column: block[j] for j, column in enumerate(CANDLE_COLUMNS)}
+        columns["time"] = columns["time"].astype(np.int64)
+        _ATTACHED[name] = (shm, columns)
+    return _ATTACHED[name][1]
+
+
+def run_backtest(candles: Dict[str, np.ndarray], signal_fn: Callable, params: Dict[str, Any],
+                 backtest_kwargs: Dict[str, Any]):
+    "signal_fn on the candles, then backtest; params named like backtest arguments go to backtest"
+    signal_params = {key: value for key, value in params.items() if key not in BACKTEST_ARGS}
+    kwargs = dict(backtest_kwargs)
+    kwargs.update({key: value for key, value in params.items() if key in BACKTEST_ARGS})
+    signals = signal_fn(candles, **signal_params)
+    return backtest(candles, **signals, **kwargs)
+
+
+def evaluate_batch(spec: Tuple[str, int], signal_fn: Callable, batch: List[Dict[str, Any]],
+                   backtest_kwargs: Dict[str, Any]) -> List[Dict[str, float]]:
+    "summaries of a batch of parameter sets, the process pool task"
+    candles = attach_candles(spec)
+    return [run_backtest(candles, signal_fn, params, backtest_kwargs).summary() for params in batch]
+
+
+def param_key(params: Dict[str, Any]) -> str:
+    return json.dumps(params, sort_keys=True, default=float)
+
+
+def grid_params(space: Dict[str, Sequence]) -> Iterator[Dict[str, Any]]:
+    "every combination of the space values"
+    names = list(space)
+    for values in itertools.product(*(space[name] for name in names)):
+        yield dict(zip(names, values))
+
+
+def random_params(space: Dict[str, Sequence], n: int, seed: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    "n distinct random combinations (fewer when the space is smaller)"
+    rng = random.Random(seed)
+    # repeated values would make the distinct count unreachable
+    space = {name: list({param_key({name: value}): value for value in values}.values())
+             for name, values in space.items()}
+    total = math.prod(len(values) for values in space.values())
+    seen = set()
+    while len(seen) < min(n, total):
+        params = {name: rng.choice(values) for name, values in space.items()}
+        key = param_key(params)
+        if key not in seen:
+            seen.add(key)
+            yield params
+
+
+class PARAMETER_SWEEP:
+    """Grid or random search of a signal function's parameters.
+
+    Candles go to shared memory once per run, parameter sets are sent to
+    the process pool in batches and a bounded number of batches is kept in
+    flight, so cancelling stops quickly and huge grids are never
+    materialized. Results are ranked by `metric` as they arrive and pushed
+    to `callback(new results, ranking)` (hook a Qt signal emit there).
+    With `checkpoint`, evaluated sets are saved to that JSON file and a
+    later run skips them, which is how an interrupted sweep resumes.
+    """
+
+    def __init__(self, signal_fn: Callable, backtest_kwargs: Optional[Dict[str, Any]] = None,
+                 metric: str = "net_profit", maximize: bool = True, batch_size: int = 8,
+                 max_pending: Optional[int] = None, checkpoint: Optional[str] = None, checkpoint_every: int = 20,
+                 executor: Optional[Executor] = Heavy_ProcessPoolExecutor_global):
+        self.signal_fn = signal_fn
+        self.backtest_kwargs = dict(backtest_kwargs or {})
+        self.metric = metric
+        self.maximize = maximize
+        self.batch_size = max(1, int(batch_size))
+        self.max_pending = max_pending or 2 * (os.cpu_count() or 2)
+        self.checkpoint = checkpoint
+        self.checkpoint_every = checkpoint_every
+        self._batches_done = 0
+        self.executor = executor
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        # param key -> (params, summary), and (-score, key) sorted
+        self.results: Dict[str, Tuple[Dict[str, Any], Dict[str, float]]] = {}
+        self._ranking: List[Tuple[float, str]] = []
+        if checkpoint and os.path.exists(checkpoint):
+            self._load_checkpoint()
+
+    def _score(self, summary: Dict[str, float]) -> float:
+        score = float(summary[self.metric])
+        if np.isnan(score):
+            return np.inf
+        return -score if self.maximize else score
+
+    def _record(self, params: Dict[str, Any], summary: Dict[str, float]):
+        key = param_key(params)
+        with self._lock:
+            if key in self.results:
+                return
+            self.results[key] = (params, summary)
+            bisect.insort(self._ranking, (self._score(summary), key))
+
+    def ranking(self, n: Optional[int] = None) -> List[Tuple[Dict[str, Any], Dict[str, float]]]:
+        "(params, summary) best first"
+        with self._lock:
+            keys = [key for _, key in self._ranking[:n]]
+            return [self.results[key] for key in keys]
+
+    @property
+    def best(self) -> Optional[Tuple[Dict[str, Any], Dict[str, float]]]:
+        top = self.ranking(1)
+        return top[0] if top else None
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def _load_checkpoint(self):
+        with open(self.checkpoint, "r") as f:
+            for params, summary in json.load(f):
+                self._record(params, summary)
+
+    def save_checkpoint(self):
+        if not self.checkpoint:
+            return
+        with self._lock:
+            rows = list(self.results.values())
+        tmp = f"{self.checkpoint}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(rows, f, default=float)
+        os.replace(tmp, self.checkpoint)
+
+    def _batches(self, params: Iterable[Dict[str, Any]]) -> Iterator[List[Dict[str, Any]]]:
+        batch = []
+        for p in params:
+            if param_key(p) in self.results:
+                continue
+            batch.append(p)
+            if len(batch) == self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def run(self, source, params: Iterable[Dict[str, Any]],
+            callback: Optional[Callable[[List[Tuple[Dict[str, Any], Dict[str, float]]], "PARAMETER_SWEEP"], None]] = None
+            ) -> List[Tuple[Dict[str, Any], Dict[str, float]]]:
+        "evaluate `params` (grid_params / random_params), blocking; returns the ranking"
+        self._cancel.clear()
+        batches = self._batches(params)
+        with SHARED_CANDLES(source) as candles:
+            if self.executor is None:
+                for batch in batches:
+                    if self.cancelled:
+                        break
+                    self._done(batch, evaluate_batch(candles.spec, self.signal_fn, batch, self.backtest_kwargs),
+                               callback)
+            else:
+                pending: Dict[Future, List[Dict[str, Any]]] = {}
+                try:
+                    while True:
+                        while not self.cancelled and len(pending) < self.max_pending:
+                            batch = next(batches, None)
+                            if batch is None:
+                                break
+                            future = self.executor.submit(evaluate_batch, candles.spec, self.signal_fn, batch,
+                                                          self.backtest_kwargs)
+                            pending[future] = batch
+                        if not pending:
+                            break
+                        finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            batch = pending.pop(future)
+                            if not future.cancelled():
+                                self._done(batch, future.result(), callback)
+                        if self.cancelled:
+                            for future in pending:
+                                future.cancel()
+                            # batches already running still have to release the block
+                            wait(pending)
+                            for future, batch in pending.items():
+                                if not future.cancelled() and future.exception() is None:
+                                    self._done(batch, future.result(), callback)
+                            pending.clear()
+                finally:
+                    for future in pending:
+                        future.cancel()
+        self.save_checkpoint()
+        return self.ranking()
+
+    def _done(self, batch: List[Dict[str, Any]], summaries: List[Dict[str, float]], callback):
+        for params, summary in zip(batch, summaries):
+            self._record(params, summary)
+        self._batches_done += 1
+        if self._batches_done % self.checkpoint_every == 0:
+            self.save_checkpoint()
+        if callback is not None:
+            callback(list(zip(batch, summaries)), self)
+
+    def start(self, source, params: Iterable[Dict[str, Any]], callback=None) -> Future:
+        "run() on the thread pool, for the GUI"
+        return ThreadPoolExecutor_global.submit(self.run, source, params, callback)
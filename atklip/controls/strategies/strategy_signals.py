@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+from typing import Callable, Dict
+
+import numpy as np
+from numba import njit
+
+from atklip.controls.stream_kernels import ATR_KERNEL, MA_KERNEL
+
+
+# UT Bot trailing stop: follows src at n_loss (key value * atr) and flips
+# side when src crosses it.
+@njit(cache=True)
+def nb_utbot_trail(src, n_loss):
+    m = src.size
+    trail = np.zeros(m, dtype=np.float64)
+    for i in range(m):
+        loss = 0.0 if np.isnan(n_loss[i]) else n_loss[i]
+        prev = trail[i - 1] if i > 0 else 0.0
+        prev_src = src[i - 1] if i > 0 else src[i]
+        if src[i] > prev and prev_src > prev:
+            trail[i] = max(prev, src[i] - loss)
+        elif src[i] < prev and prev_src < prev:
+            trail[i] = min(prev, src[i] + loss)
+        elif src[i] > prev:
+            trail[i] = src[i] - loss
+        else:
+            trail[i] = src[i] + loss
+    return trail
+
+
+@njit(cache=True)
+def nb_crossover(x, y):
+    m = x.size
+    result = np.zeros(m, dtype=np.bool_)
+    for i in range(1, m):
+        result[i] = x[i] > y[i] and x[i - 1] <= y[i - 1]
+    return result
+
+
+def utbot_signals(candles: Dict[str, np.ndarray], key_value_long: float = 1.0, key_value_short: float = 1.0,
+                  atr_long_period: int = 10, atr_short_period: int = 10, ema_long_period: int = 1,
+                  ema_short_period: int = 1) -> Dict[str, np.ndarray]:
+    """UT Bot alerts with separate long and short settings (the ATKBOT inputs):
+    buy when ema(close) crosses over the long trailing stop, sell when it
+    crosses under the short one"""
+    high, low, close = (np.ascontiguousarray(candles[name], dtype=np.float64) for name in ("high", "low", "close"))
+    result = {}
+    for side, key_value, atr_period, ema_period in (("long", key_value_long, atr_long_period, ema_long_period),
+                                                    ("short", key_value_short, atr_short_period, ema_short_period)):
+        trail = nb_utbot_trail(close, ATR_KERNEL(int(atr_period), "rma").load(high, low, close) * key_value)
+        ema = close if int(ema_period) <= 1 else MA_KERNEL("ema", int(ema_period)).load(close)
+        if side == "long":
+            result["long_entry"] = (close > trail) & nb_crossover(ema, trail)
+        else:
+            result["short_entry"] = (close < trail) & nb_crossover(trail, ema)
+    return result
+
+
+# name -> signal function, the strategies the optimizers can search
+SIGNALS: Dict[str, Callable[..., Dict[str, np.ndarray]]] = {
+    "utbot": utbot_signals,
+}
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+from collections import OrderedDict
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from atklip.appmanager.worker.threadpool import Heavy_ProcessPoolExecutor_global
+from atklip.controls.strategies.backtest import BACKTEST_RESULT, TRADE, backtest
+from atklip.controls.strategies.genetic import FITNESS, fitness_score
+from atklip.controls.strategies.optimizer import BACKTEST_ARGS, SHARED_CANDLES, attach_candles, param_key
+
+
+# (in sample start, in sample end, out of sample start, out of sample end), bar rows, ends excluded
+WINDOW = Tuple[int, int, int, int]
+
+
+def walk_forward_windows(size: int, in_sample: int, out_sample: int, anchored: bool = False,
+                         step: Optional[int] = None) -> List[WINDOW]:
+    """consecutive out of sample windows of `out_sample` bars, each after
+    the `in_sample` bars before it (all bars from 0 when anchored). A
+    `step` below `out_sample` would overlap the out of sample windows and
+    count their bars twice in the stitched run, so it is rejected."""
+    step = step or out_sample
+    if step < out_sample:
+        raise ValueError(f"step {step} is shorter than the out of sample window {out_sample}")
+    windows = []
+    start = 0
+    while start + in_sample + out_sample <= size:
+        is_end = start + in_sample
+        windows.append((0 if anchored else start, is_end, is_end, is_end + out_sample))
+        start += step
+    return windows
+
+
+# signals per (candles block, signal params), kept across the tasks a
+# worker runs so windows and OOS passes of a parameter set share them
+_SIGNAL_CACHE: "OrderedDict[Tuple[str, str], Dict[str, np.ndarray]]" = OrderedDict()
+SIGNAL_CACHE_SIZE = 32
+
+
+def cached_signals(block: str, candles: Dict[str, np.ndarray], signal_fn: Callable,
+                   params: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    "signal_fn on the whole series once per parameter set; indicators are causal so windows slice it"
+    signal_params = {key: value for key, value in params.items() if key not in BACKTEST_ARGS}
+    key = (block, f"{signal_fn.__module__}.{signal_fn.__qualname__}:{param_key(signal_params)}")
+    signals = _SIGNAL_CACHE.get(key)
+    if signals is None:
+        signals = {name: np.asarray(x) for name, x in signal_fn(candles, **signal_params).items()}
+        _SIGNAL_CACHE[key] = signals
+        while len(_SIGNAL_CACHE) > SIGNAL_CACHE_SIZE:
+            _SIGNAL_CACHE.popitem(last=False)
+    else:
+        _SIGNAL_CACHE.move_to_end(key)
+    return signals
+
+
+def backtest_window(spec: Tuple[str, int], signal_fn: Callable, params: Dict[str, Any],
+                    backtest_kwargs: Dict[str, Any], start: int, stop: int) -> BACKTEST_RESULT:
+    "backtest of bars [start, stop) with the cached full series signals"
+    candles = attach_candles(spec)
+    signals = cached_signals(spec[0], candles, signal_fn, params)
+    kwargs = dict(backtest_kwargs)
+    kwargs.update({key: value for key, value in params.items() if key in BACKTEST_ARGS})
+    window = {name: x[start:stop] for name, x in candles.items()}
+    return backtest(window, **{name: x[start:stop] for name, x in signals.items()}, **kwargs)
+
+
+def score_windows(spec: Tuple[str, int], signal_fn: Callable, batch: List[Dict[str, Any]],
+                  backtest_kwargs: Dict[str, Any], windows: List[Tuple[int, int]], fitness: str,
+                  min_trades: int) -> np.ndarray:
+    "fitness of every parameter set (rows) on every window (columns), the process pool task"
+    scores = np.empty((len(batch), len(windows)), dtype=np.float64)
+    for i, params in enumerate(batch):
+        for j, (start, stop) in enumerate(windows):
+            result = backtest_window(spec, signal_fn, params, backtest_kwargs, start, stop)
+            scores[i, j] = fitness_score(result, fitness, min_trades)
+    return scores
+
+
+def oos_results(spec: Tuple[str, int], signal_fn: Callable, picks: List[Tuple[Dict[str, Any], int, int]],
+                backtest_kwargs: Dict[str, Any]) -> List[BACKTEST_RESULT]:
+    "out of sample backtests of the chosen parameter set of each window"
+    return [backtest_window(spec, signal_fn, params, backtest_kwargs, start, stop) for params, start, stop in picks]
+
+
+class WALK_FORWARD_RESULT:
+    "chosen parameters per window and the stitched out of sample run"
+
+    def __init__(self, windows: List[WINDOW], picks: List[Dict[str, Any]], is_scores: np.ndarray,
+                 oos: List[BACKTEST_RESULT], initial_equity: float, fitness: str = "sharpe"):
+        self.windows = windows
+        self.picks = picks
+        self.is_scores = is_scores
+        self.oos = oos
+        self.initial_equity = initial_equity
+        self.oos_scores = np.array([fitness_score(x, fitness, 0) for x in oos], dtype=np.float64)
+        # each segment continues from the equity the previous one ended with,
+        # its trade rows point into the stitched bars
+        parts, trades, carry, offset = [], [], 0.0, 0
+        for result in oos:
+            parts.append(result.equity + carry)
+            carry += result.equity[-1] - initial_equity if result.equity.size else 0.0
+            rows = result.trades.copy()
+            rows["entry_index"] += offset
+            rows["exit_index"] += offset
+            trades.append(rows)
+            offset += result.equity.size
+        self.equity = np.concatenate(parts) if parts else np.empty(0)
+        self.times = np.concatenate([x.times for x in oos]) if oos else np.empty(0, dtype=np.int64)
+        self.trades = np.concatenate(trades) if trades else np.empty(0, dtype=TRADE)
+        self.fees = np.concatenate([x.fees for x in oos]) if oos else np.empty(0)
+
+    def stitched(self) -> BACKTEST_RESULT:
+        "the out of sample segments as one BACKTEST_RESULT (summary, metrics, drawdown)"
+        return BACKTEST_RESULT(self.times, self.trades, self.equity, self.fees, self.initial_equity)
+
+    def report(self) -> List[Dict[str, Any]]:
+        return [{"window": window, "params": params, "is_score": float(is_score), "oos_score": float(oos_score),
+                 "oos_net_profit": result.net_profit, "oos_max_drawdown": result.max_drawdown}
+                for window, params, is_score, oos_score, result in zip(self.windows, self.picks, self.is_scores,
+                                                                       self.oos_scores, self.oos)]
+
+
+class WALK_FORWARD:
+    """Walk-forward validation of a signal function's parameters.
+
+    Every parameter set is scored on all in sample windows in one process
+    pool task, so its signals are computed once on the whole series and
+    each window backtests a slice of them (`cached_signals`). The best set
+    of each window is then run on the following out of sample window and
+    the segments are stitched into one equity curve.
+    """
+
+    def __init__(self, signal_fn: Callable, backtest_kwargs: Optional[Dict[str, Any]] = None,
+                 fitness: str = "sharpe", min_trades: int = 5, batch_size: int = 4,
+                 executor: Optional[Executor] = Heavy_ProcessPoolExecutor_global):
+        if fitness not in FITNESS:
+            raise ValueError(f"fitness must be one of {list(FITNESS)}")
+        self.signal_fn = signal_fn
+        self.backtest_kwargs = dict(backtest_kwargs or {})
+        self.fitness = fitness
+        self.min_trades = min_trades
+        self.batch_size = max(1, batch_size)
+        self.executor = executor
+
+    def _map(self, fn: Callable, args: List[tuple]) -> list:
+        if self.executor is None or len(args) < 2:
+            return [fn(*x) for x in args]
+        futures = [self.executor.submit(fn, *x) for x in args]
+        return [future.result() for future in futures]
+
+    def run(self, source, params: Iterable[Dict[str, Any]], in_sample: int, out_sample: int,
+            anchored: bool = False, step: Optional[int] = None) -> WALK_FORWARD_RESULT:
+        """optimize over `params` (grid_params / random_params) on each in
+        sample window, window sizes in bars of the source"""
+        params = list(params)
+        with SHARED_CANDLES(source) as candles:
+            windows = walk_forward_windows(candles.spec[1], in_sample, out_sample, anchored, step)
+            in_windows = [(w[0], w[1]) for w in windows]
+            batches = [params[i:i + self.batch_size] for i in range(0, len(params), self.batch_size)]
+            scores = self._map(score_windows, [(candles.spec, self.signal_fn, batch, self.backtest_kwargs,
+                                                in_windows, self.fitness, self.min_trades) for batch in batches])
+            scores = np.vstack(scores) if scores else np.empty((0, len(windows)))
+            best = np.argmax(scores, axis=0) if scores.size else np.empty(0, dtype=np.int64)
+            picks = [params[i] for i in best]
+            jobs = [(p, w[2], w[3]) for p, w in zip(picks, windows)]
+            chunks = [jobs[i:i + self.batch_size] for i in range(0, len(jobs), self.batch_size)]
+            oos = [x for chunk in self._map(oos_results, [(candles.spec, self.signal_fn, chunk, self.backtest_kwargs)
+                                                         for chunk in chunks]) for x in chunk]
+        is_scores = scores[best, np.arange(len(windows))] if scores.size else np.empty(0)
+        initial_equity = self.backtest_kwargs.get("initial_equity") or self.backtest_kwargs.get("capital", 100.0)
+        return WALK_FORWARD_RESULT(windows, picks, is_scores, oos, float(initial_equity), self.fitness)
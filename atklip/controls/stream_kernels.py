@@ -0,0 +1,387 @@
+# -*- coding: utf-8 -*-
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Tuple
+
+import numpy as np
+from numba import njit
+
+from atklip.controls.pandas_ta.utils._nb_rolling import nb_rolling_extrema
+
+
+# moving averages that can be advanced with a fixed size state
+MA_KINDS = {"sma": 0, "ema": 1, "rma": 2, "wma": 3, "smma": 4}
+
+
+def ma_state_size(length: int) -> int:
+    "slots of one MA block: count, ring position, last value, then the window"
+    return 3 + int(length)
+
+
+def new_ma_state(length: int) -> np.ndarray:
+    state = np.zeros(ma_state_size(length), dtype=np.float64)
+    state[2] = np.nan
+    return state
+
+
+# One MA step on a state block laid out as [count, pos, value, window...].
+# The window ring holds the last `length` committed inputs and `pos` is the
+# slot to overwrite next. With commit=False the value for input x is returned
+# without touching the state: that is how the forming bar is re-evaluated on
+# every tick. NaN inputs (warm-up of an upstream series) are skipped, so each
+# MA seeds on its first `length` valid values like the SMA seeded ema/smma of
+# pandas_ta. The rma is ewm(alpha=1/length, adjust=False) like pandas_ta rma:
+# no seed, it starts at the first valid value, and a later NaN repeats the
+# last value while decaying its weight (kept in the first window slot).
+@njit(cache=True)
+def nb_ma_update(kind, length, state, x, commit):
+    if kind == 2:
+        return nb_rma_update(length, state, x, commit)
+    if np.isnan(x):
+        return np.nan
+    count = int(state[0])
+    pos = int(state[1])
+
+    result = np.nan
+    if count + 1 >= length:
+        if (kind == 1 or kind == 4) and count + 1 > length:
+            alpha = 2.0 / (length + 1) if kind == 1 else 1.0 / length
+            result = (1.0 - alpha) * state[2] + alpha * x
+        elif kind == 3:
+            total = 0.0
+            for k in range(length - 1):
+                total += (k + 1) * state[3 + (pos + 1 + k) % length]
+            total += length * x
+            result = total * 2.0 / (length * length + length)
+        else:
+            total = 0.0
+            for k in range(length - 1):
+                total += state[3 + (pos + 1 + k) % length]
+            result = (total + x) / length
+
+    if commit:
+        state[3 + pos] = x
+        state[1] = (pos + 1) % length
+        state[0] = count + 1
+        state[2] = result
+    return result
+
+
+@njit(cache=True)
+def nb_rma_update(length, state, x, commit):
+    alpha = 1.0 / length
+    if state[0] == 0:
+        if np.isnan(x):
+            return np.nan
+        result, weight = x, 1.0
+    else:
+        weight = state[3] * (1.0 - alpha)
+        if np.isnan(x):
+            result = state[2]
+        else:
+            result = (weight * state[2] + alpha * x) / (weight + alpha)
+            weight = 1.0
+    if commit:
+        state[0] += 1
+        state[2] = result
+        state[3] = weight
+    return result
+
+
+@njit(cache=True)
+def nb_ma_stream_batch(kind, length, state, x):
+    m = x.size
+    result = np.empty(m, dtype=np.float64)
+    for i in range(m):
+        result[i] = nb_ma_update(kind, length, state, x[i], i < m - 1)
+    return result
+
+
+# RSI: [prev close, rma(gains) block, rma(losses) block]
+@njit(cache=True)
+def nb_rsi_update(length, scalar, state, close, commit):
+    diff = close - state[0]
+    size = 3 + length
+    gain = diff if diff > 0 else 0.0
+    loss = -diff if diff < 0 else 0.0
+    if np.isnan(diff):
+        gain = loss = np.nan
+    avg_gain = nb_ma_update(2, length, state[1:1 + size], gain, commit)
+    avg_loss = nb_ma_update(2, length, state[1 + size:1 + 2 * size], loss, commit)
+    if commit:
+        state[0] = close
+    total = avg_gain + avg_loss
+    if total == 0:
+        return np.nan
+    return scalar * avg_gain / total
+
+
+@njit(cache=True)
+def nb_rsi_stream_batch(length, scalar, state, close):
+    m = close.size
+    result = np.empty(m, dtype=np.float64)
+    for i in range(m):
+        result[i] = nb_rsi_update(length, scalar, state, close[i], i < m - 1)
+    return result
+
+
+# True range: [prev close]
+@njit(cache=True)
+def nb_true_range_update(state, high, low, close, commit):
+    prev_close = state[0]
+    result = np.nan
+    if not np.isnan(prev_close):
+        result = max(high - low, abs(high - prev_close), abs(low - prev_close))
+    if commit:
+        state[0] = close
+    return result
+
+
+@njit(cache=True)
+def nb_true_range_stream_batch(state, high, low, close):
+    m = close.size
+    result = np.empty(m, dtype=np.float64)
+    for i in range(m):
+        result[i] = nb_true_range_update(state, high[i], low[i], close[i], i < m - 1)
+    return result
+
+
+# ATR: [prev close, ma(true range) block]
+@njit(cache=True)
+def nb_atr_update(kind, length, state, high, low, close, commit):
+    tr = nb_true_range_update(state[0:1], high, low, close, commit)
+    return nb_ma_update(kind, length, state[1:], tr, commit)
+
+
+@njit(cache=True)
+def nb_atr_stream_batch(kind, length, state, high, low, close):
+    m = close.size
+    result = np.empty(m, dtype=np.float64)
+    for i in range(m):
+        result[i] = nb_atr_update(kind, length, state, high[i], low[i], close[i], i < m - 1)
+    return result
+
+
+# MACD: [ema(fast) block, ema(slow) block, ema(signal) block]
+@njit(cache=True)
+def nb_macd_update(fast, slow, signal, state, close, out, commit):
+    a, b = 3 + fast, 3 + fast + 3 + slow
+    fast_ma = nb_ma_update(1, fast, state[:a], close, commit)
+    slow_ma = nb_ma_update(1, slow, state[a:b], close, commit)
+    macd = fast_ma - slow_ma
+    signal_ma = nb_ma_update(1, signal, state[b:], macd, commit)
+    out[0] = macd
+    out[1] = macd - signal_ma
+    out[2] = signal_ma
+
+
+@njit(cache=True)
+def nb_macd_stream_batch(fast, slow, signal, state, close):
+    m = close.size
+    result = np.empty((m, 3), dtype=np.float64)
+    for i in range(m):
+        nb_macd_update(fast, slow, signal, state, close[i], result[i], i < m - 1)
+    return result
+
+
+class STREAM_KERNEL(ABC):
+    """Stateful indicator kernel, the streaming counterpart of a pandas_ta call.
+
+    `load` runs the historic pass and leaves the state right before the last
+    (forming) bar. `update` re-evaluates the forming bar without mutating the
+    state; `add` first commits the previous forming bar, then evaluates the
+    new one. Both are O(1) (O(window) for windowed MAs) whatever the history
+    length, and the historic pass is the same step function in a loop, so
+    streaming and batch outputs are identical.
+    """
+
+    def __init__(self):
+        self.state = self._new_state()
+        self._forming = None
+
+    @abstractmethod
+    def _new_state(self) -> np.ndarray:
+        "fresh state, right before the first bar"
+
+    @abstractmethod
+    def _batch(self, state, *inputs):
+        "historic pass over the inputs, commits every bar but the last one"
+
+    @abstractmethod
+    def _step(self, state, x, commit):
+        "one bar of inputs x, the state only changes with commit=True"
+
+    def reset(self):
+        self.state = self._new_state()
+        self._forming = None
+
+    def load(self, *inputs):
+        self.reset()
+        inputs = tuple(np.ascontiguousarray(x, dtype=np.float64) for x in inputs)
+        result = self._batch(self.state, *inputs)
+        if len(inputs[0]):
+            self._forming = np.array([x[-1] for x in inputs], dtype=np.float64)
+        return result
+
+    def update(self, *x):
+        self._forming = np.array(x, dtype=np.float64)
+        return self._step(self.state, self._forming, False)
+
+    def add(self, *x):
+        if self._forming is not None:
+            self._step(self.state, self._forming, True)
+        return self.update(*x)
+
+
+class MA_KERNEL(STREAM_KERNEL):
+    "sma/ema/rma/smma/wma of one series"
+
+    def __init__(self, mamode: str = "ema", length: int = 10):
+        if mamode not in MA_KINDS:
+            raise ValueError(f"{mamode} has no streaming form, use one of {list(MA_KINDS)}")
+        self.kind = MA_KINDS[mamode]
+        self.length = int(length)
+        super().__init__()
+
+    def _new_state(self):
+        return new_ma_state(self.length)
+
+    def _batch(self, state, x):
+        return nb_ma_stream_batch(self.kind, self.length, state, x)
+
+    def _step(self, state, x, commit) -> float:
+        return nb_ma_update(self.kind, self.length, state, x[0], commit)
+
+
+class RSI_KERNEL(STREAM_KERNEL):
+    "pandas_ta rsi (Wilder smoothing of gains/losses) of close"
+
+    def __init__(self, length: int = 14, scalar: float = 100.0):
+        self.length = int(length)
+        self.scalar = float(scalar)
+        super().__init__()
+
+    def _new_state(self):
+        return np.concatenate([[np.nan], new_ma_state(self.length), new_ma_state(self.length)])
+
+    def _batch(self, state, close):
+        return nb_rsi_stream_batch(self.length, self.scalar, state, close)
+
+    def _step(self, state, x, commit) -> float:
+        return nb_rsi_update(self.length, self.scalar, state, x[0], commit)
+
+
+class TRUE_RANGE_KERNEL(STREAM_KERNEL):
+    "pandas_ta true_range, inputs high, low, close"
+
+    def _new_state(self):
+        return np.array([np.nan])
+
+    def _batch(self, state, high, low, close):
+        return nb_true_range_stream_batch(state, high, low, close)
+
+    def _step(self, state, x, commit) -> float:
+        return nb_true_range_update(state, x[0], x[1], x[2], commit)
+
+
+class ATR_KERNEL(STREAM_KERNEL):
+    "pandas_ta atr: ma(mamode) of the true range, inputs high, low, close"
+
+    def __init__(self, length: int = 14, mamode: str = "rma"):
+        if mamode not in MA_KINDS:
+            raise ValueError(f"{mamode} has no streaming form, use one of {list(MA_KINDS)}")
+        self.kind = MA_KINDS[mamode]
+        self.length = int(length)
+        super().__init__()
+
+    def _new_state(self):
+        return np.concatenate([[np.nan], new_ma_state(self.length)])
+
+    def _batch(self, state, high, low, close):
+        return nb_atr_stream_batch(self.kind, self.length, state, high, low, close)
+
+    def _step(self, state, x, commit) -> float:
+        return nb_atr_update(self.kind, self.length, state, x[0], x[1], x[2], commit)
+
+
+class MACD_KERNEL(STREAM_KERNEL):
+    "pandas_ta macd of close, outputs (macd, histogram, signal)"
+
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
+        if slow < fast:
+            fast, slow = slow, fast
+        self.fast, self.slow, self.signal = int(fast), int(slow), int(signal)
+        super().__init__()
+
+    def _new_state(self):
+        return np.concatenate([new_ma_state(self.fast), new_ma_state(self.slow), new_ma_state(self.signal)])
+
+    def _batch(self, state, close):
+        result = nb_macd_stream_batch(self.fast, self.slow, self.signal, state, close)
+        return result[:, 0], result[:, 1], result[:, 2]
+
+    def _step(self, state, x, commit) -> Tuple[float, float, float]:
+        out = np.empty(3, dtype=np.float64)
+        nb_macd_update(self.fast, self.slow, self.signal, state, x[0], out, commit)
+        return out[0], out[1], out[2]
+
+
+class ROLLING_EXTREMA_KERNEL(STREAM_KERNEL):
+    """rolling max/min of one series with its monotonic deque of (index, value),
+    outputs (extremum, bars since the extremum). Used by donchian, willr, stoch
+    and chandelier exit on live bars: O(1) amortized per bar"""
+
+    def __init__(self, length: int = 20, mode: str = "max"):
+        if mode not in ("max", "min"):
+            raise ValueError("mode must be 'max' or 'min'")
+        self.length = int(length)
+        self.is_max = mode == "max"
+        super().__init__()
+
+    def _new_state(self):
+        # committed (index, value) candidates, front is the extremum
+        self.count = 0
+        self.nans = deque()
+        return deque()
+
+    def _better(self, a: float, b: float) -> bool:
+        return a > b if self.is_max else a < b
+
+    def _commit(self, x: float):
+        i = self.count
+        if np.isnan(x):
+            self.nans.append(i)
+        else:
+            candidates = self.state
+            while candidates and self._better(x, candidates[-1][1]):
+                candidates.pop()
+            candidates.append((i, x))
+        self.count = i + 1
+        # keep only what the next window [count - length + 1, count] can see
+        first = self.count - self.length + 1
+        while self.state and self.state[0][0] < first:
+            self.state.popleft()
+        while self.nans and self.nans[0] < first:
+            self.nans.popleft()
+
+    def _batch(self, state, x):
+        value, index = nb_rolling_extrema(x, self.length, self.is_max)
+        m = x.size
+        # rebuild the deque from the committed tail only
+        self.count = max(0, m - self.length)
+        for v in x[self.count:m - 1]:
+            self._commit(v)
+        bars = np.where(index < 0, np.nan, np.arange(m) - index)
+        return value, bars
+
+    def _step(self, state, x, commit):
+        x = float(x[0])
+        if commit:
+            self._commit(x)
+            return None
+        i = self.count
+        if i < self.length - 1 or self.nans or np.isnan(x):
+            return np.nan, np.nan
+        if not state or self._better(x, state[0][1]):
+            return x, 0.0
+        return state[0][1], float(i - state[0][0])
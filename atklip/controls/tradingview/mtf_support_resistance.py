@@ -0,0 +1,333 @@
+# -*- coding: utf-8 -*-
+from concurrent.futures import Executor
+from typing import List, Optional
+
+import numpy as np
+from numba import njit
+
+from atklip.appmanager.worker.threadpool import Heavy_ProcessPoolExecutor_global
+from atklip.controls.candle.resample import resample_many
+from atklip.controls.stream_kernels import ATR_KERNEL
+from atklip.exchanges.ohlcv_cache import bar_open_time, timeframe_to_ms
+
+
+RESISTANCE = 1
+SUPPORT = -1
+
+# one row per level, the SRLevel attributes. timeframe is the position in
+# the timeframes list, break_time / last_retest are -1 when not set.
+SR_LEVEL = np.dtype([("price", np.float64), ("sr_type", np.int8), ("strength", np.int32),
+                     ("timeframe", np.int16), ("start_time", np.int64), ("break_time", np.int64),
+                     ("last_retest", np.int64)])
+
+
+# One bar j of the level scan. Active levels whose level the close crossed
+# (close above a resistance, below a support) break, those the bar range
+# touched within atr * tolerance are retested; a run of touching bars
+# counts once. Then the pivot whose `pivot_length` right side bars closed
+# with j becomes an active level. Columns need room for two more levels,
+# bars are -1 when not set. Returns the new (level count, active count).
+@njit(cache=True)
+def nb_sr_levels_update(high, low, close, atr, j, pivot_length, tolerance, bar, sr_type, price,
+                        retests, last_touch, last_retest, broken, active, k, n_active):
+    tol = 0.0 if np.isnan(atr[j]) else atr[j] * tolerance
+    a = 0
+    while a < n_active:
+        e = active[a]
+        if (sr_type[e] == 1 and close[j] > price[e]) or (sr_type[e] == -1 and close[j] < price[e]):
+            broken[e] = j
+            n_active -= 1
+            active[a] = active[n_active]
+            continue
+        if high[j] >= price[e] - tol and low[j] <= price[e] + tol:
+            if last_touch[e] != j - 1:
+                retests[e] += 1
+                last_retest[e] = j
+            last_touch[e] = j
+        a += 1
+    i = j - pivot_length
+    if i < pivot_length:
+        return k, n_active
+    is_high, is_low = True, True
+    for w in range(i - pivot_length, j + 1):
+        is_high = is_high and high[w] <= high[i]
+        is_low = is_low and low[w] >= low[i]
+    for side in (1, -1):
+        if (side == 1 and is_high) or (side == -1 and is_low):
+            bar[k], sr_type[k], price[k] = i, side, high[i] if side == 1 else low[i]
+            retests[k], last_touch[k], last_retest[k], broken[k] = 0, -2, -1, -1
+            active[n_active] = k
+            n_active += 1
+            k += 1
+    return k, n_active
+
+
+# Sorted price sweep: levels are ordered by (sr_type, price), a new group
+# starts on a type change or when the price is more than `percent` % above
+# the first price of the current group. Returns the group start positions.
+@njit(cache=True)
+def nb_sr_merge_groups(sr_type, price, percent):
+    m = price.size
+    starts = np.empty(m, dtype=np.int64)
+    g = 0
+    for i in range(m):
+        if i == 0 or sr_type[i] != sr_type[starts[g - 1]] or \
+                price[i] - price[starts[g - 1]] > price[starts[g - 1]] * percent / 100:
+            starts[g] = i
+            g += 1
+    return starts[:g]
+
+
+@njit(cache=True)
+def nb_sr_levels(high, low, close, atr, pivot_length, tolerance, bar, sr_type, price, retests,
+                 last_touch, last_retest, broken, active, k, n_active, start):
+    for j in range(start, close.size):
+        k, n_active = nb_sr_levels_update(high, low, close, atr, j, pivot_length, tolerance, bar, sr_type,
+                                          price, retests, last_touch, last_retest, broken, active, k, n_active)
+    return k, n_active
+
+
+# bar and level columns of SR_LEVELS
+_BAR_COLUMNS = (("time", np.int64), ("high", np.float64), ("low", np.float64), ("close", np.float64),
+                ("atr", np.float64))
+_COLUMNS = (("bar", np.int64), ("sr_type", np.int8), ("price", np.float64), ("retests", np.int64),
+            ("last_touch", np.int64), ("last_retest", np.int64), ("broken", np.int64), ("active", np.int64))
+
+
+class SR_LEVELS:
+    """Support and resistance levels of one timeframe, fed with closed bars.
+
+    Levels are only created, retested or broken by the bar being scanned,
+    so `add` runs nb_sr_levels_update on the new bar against the active
+    levels; the history is never rescanned.
+    """
+
+    def __init__(self, pivot_length: int = 10, atr_length: int = 14, tolerance: float = 0.5,
+                 timeframe: int = 0, capacity: int = 1024):
+        self.pivot_length = int(pivot_length)
+        self.tolerance = float(tolerance)
+        self.timeframe = timeframe
+        self.atr = ATR_KERNEL(atr_length, "rma")
+        self._size = 0
+        self._bars = {name: np.empty(capacity, dtype=dtype) for name, dtype in _BAR_COLUMNS}
+        self._k = self._active = 0
+        self._columns = {name: np.empty(capacity, dtype=dtype) for name, dtype in _COLUMNS}
+
+    def __len__(self):
+        return self._size
+
+    def _reserve(self, bars: int, levels: int):
+        for columns, size, used in ((self._bars, bars, self._size), (self._columns, levels, self._k)):
+            for name, x in columns.items():
+                if size > x.size:
+                    grown = np.empty(max(size, 2 * x.size), dtype=x.dtype)
+                    grown[:used] = x[:used]
+                    columns[name] = grown
+
+    def _scan(self, start: int):
+        # every bar adds at most two levels
+        self._reserve(self._size, self._k + 2 * (self._size - start))
+        columns = self._columns
+        bars = {name: x[:self._size] for name, x in self._bars.items()}
+        self._k, self._active = nb_sr_levels(
+            bars["high"], bars["low"], bars["close"], bars["atr"], self.pivot_length, self.tolerance, columns["bar"],
+            columns["sr_type"], columns["price"], columns["retests"], columns["last_touch"],
+            columns["last_retest"], columns["broken"], columns["active"], self._k, self._active, start)
+
+    def load(self, times, _high, _low, _close) -> np.ndarray:
+        _high, _low, _close = (np.ascontiguousarray(x, dtype=np.float64) for x in (_high, _low, _close))
+        self._size = self._k = self._active = 0
+        self._reserve(_high.size, 2 * _high.size)
+        self._size = _high.size
+        for name, x in (("time", times), ("high", _high), ("low", _low), ("close", _close),
+                        ("atr", self.atr.load(_high, _low, _close))):
+            self._bars[name][:self._size] = x
+        self._scan(0)
+        return self.levels
+
+    def add(self, _time: int, _high: float, _low: float, _close: float):
+        "a closed bar"
+        self._reserve(self._size + 1, 0)
+        if self._size:
+            atr = self.atr.add(_high, _low, _close)
+        else:
+            atr = self.atr.load([_high], [_low], [_close])[0]
+        for name, x in (("time", _time), ("high", _high), ("low", _low), ("close", _close), ("atr", atr)):
+            self._bars[name][self._size] = x
+        self._size += 1
+        self._scan(self._size - 1)
+
+    def _rows(self, which: np.ndarray) -> np.ndarray:
+        columns = {name: x[which] for name, x in self._columns.items()}
+        times = self._bars["time"][:self._size]
+        levels = np.empty(columns["bar"].size, dtype=SR_LEVEL)
+        levels["price"] = columns["price"]
+        levels["sr_type"] = columns["sr_type"]
+        levels["strength"] = columns["retests"] + 1
+        levels["timeframe"] = self.timeframe
+        levels["start_time"] = times[columns["bar"]]
+        levels["break_time"] = np.where(columns["broken"] >= 0, times[columns["broken"]], -1)
+        levels["last_retest"] = np.where(columns["last_retest"] >= 0, times[columns["last_retest"]], -1)
+        return levels
+
+    @property
+    def levels(self) -> np.ndarray:
+        "SR_LEVEL rows, broken ones included"
+        return self._rows(np.arange(self._k))
+
+    @property
+    def active_levels(self) -> np.ndarray:
+        "SR_LEVEL rows of the unbroken levels, oldest first"
+        return self._rows(np.sort(self._columns["active"][:self._active]))
+
+
+def load_sr_levels(times, _high, _low, _close, pivot_length: int = 10, atr_length: int = 14,
+                   tolerance: float = 0.5, timeframe: int = 0) -> SR_LEVELS:
+    "SR_LEVELS loaded with closed bars, top level so the process pool can pickle it"
+    levels = SR_LEVELS(pivot_length, atr_length, tolerance, timeframe)
+    levels.load(times, _high, _low, _close)
+    return levels
+
+
+def calculate_sr_levels(times, _high, _low, _close, pivot_length: int = 10, atr_length: int = 14,
+                        tolerance: float = 0.5, timeframe: int = 0) -> np.ndarray:
+    "SR_LEVEL rows of one timeframe"
+    return load_sr_levels(times, _high, _low, _close, pivot_length, atr_length, tolerance, timeframe).levels
+
+
+def merge_sr_levels(levels: np.ndarray, percent: float = 0.1, min_strength: int = 1,
+                    valid_only: bool = True) -> np.ndarray:
+    """merge same type levels closer than `percent` % into one: strength
+    weighted price, summed strength, earliest start, highest timeframe"""
+    columns = {name: levels[name] for name in SR_LEVEL.names}
+    keep = columns["strength"] >= min_strength
+    if valid_only:
+        keep &= columns["break_time"] < 0
+    keep = np.flatnonzero(keep)
+    order = keep[np.lexsort((columns["price"][keep], columns["sr_type"][keep]))]
+    columns = {name: x[order] for name, x in columns.items()}
+    if order.size == 0:
+        return np.empty(0, dtype=SR_LEVEL)
+    starts = nb_sr_merge_groups(columns["sr_type"], columns["price"], float(percent))
+    merged = np.empty(starts.size, dtype=SR_LEVEL)
+    strength = np.add.reduceat(columns["strength"], starts)
+    merged["strength"] = strength
+    merged["price"] = np.add.reduceat(columns["price"] * columns["strength"], starts) / strength
+    merged["sr_type"] = columns["sr_type"][starts]
+    merged["timeframe"] = np.maximum.reduceat(columns["timeframe"], starts)
+    merged["start_time"] = np.minimum.reduceat(columns["start_time"], starts)
+    merged["break_time"] = np.maximum.reduceat(columns["break_time"], starts)
+    merged["last_retest"] = np.maximum.reduceat(columns["last_retest"], starts)
+    return merged
+
+
+def _load_all(executor: Optional[Executor], jobs: List[tuple]) -> List[SR_LEVELS]:
+    "load_sr_levels of every job, in the pool when there is more than one"
+    if executor is None or len(jobs) < 2:
+        return [load_sr_levels(*args) for args in jobs]
+    futures = [executor.submit(load_sr_levels, *args) for args in jobs]
+    return [future.result() for future in futures]
+
+
+def multi_timeframe_sr(times, _open, _high, _low, _close, _volume, timeframes: List[str],
+                       pivot_length: int = 10, atr_length: int = 14, tolerance: float = 0.5,
+                       percent: float = 0.1, min_strength: int = 1,
+                       executor: Optional[Executor] = Heavy_ProcessPoolExecutor_global) -> np.ndarray:
+    """merged SR_LEVEL rows of every timeframe: one shared resampling pass,
+    then the timeframes are scanned concurrently in the process pool"""
+    bars = resample_many(times, _open, _high, _low, _close, _volume, timeframes)
+    jobs = [(bars[timeframe][0], bars[timeframe][2], bars[timeframe][3], bars[timeframe][4],
+             pivot_length, atr_length, tolerance, k) for k, timeframe in enumerate(timeframes)]
+    levels = [x.levels for x in _load_all(executor, jobs)]
+    return merge_sr_levels(np.concatenate(levels), percent, min_strength)
+
+
+class MTF_SUPPORT_RESISTANCE:
+    """multi_timeframe_sr of a live base feed.
+
+    `load` resamples once and scans the timeframes in the process pool.
+    After that each timeframe keeps the aggregate of its forming bar; a
+    closed base bar is folded into every forming bar and only the
+    timeframes whose bar closed with it scan that bar (an O(active levels)
+    step, not worth a trip to the pool). The merge is redone only when a
+    timeframe changed.
+    """
+
+    def __init__(self, timeframes: List[str], base_timeframe: str = "1m", pivot_length: int = 10,
+                 atr_length: int = 14, tolerance: float = 0.5, percent: float = 0.1, min_strength: int = 1,
+                 executor: Optional[Executor] = Heavy_ProcessPoolExecutor_global):
+        self.timeframes = list(timeframes)
+        self.base_step = timeframe_to_ms(base_timeframe)
+        self.pivot_length, self.atr_length, self.tolerance = pivot_length, atr_length, tolerance
+        self.percent, self.min_strength = percent, min_strength
+        self.executor = executor
+        self._sr = [SR_LEVELS(pivot_length, atr_length, tolerance, k) for k in range(len(self.timeframes))]
+        # forming bar (time, open, high, low, close, volume), time -1 when empty
+        self._forming = [np.array([-1.0, 0, 0, 0, 0, 0]) for _ in self.timeframes]
+        # unbroken levels of each timeframe, what the merge reads
+        self._valid = [np.empty(0, dtype=SR_LEVEL) for _ in self.timeframes]
+        self.levels = np.empty(0, dtype=SR_LEVEL)
+
+    def _is_closing(self, k: int, _time: int) -> bool:
+        "the base bar at _time is the last one of its timeframe bucket"
+        timeframe = self.timeframes[k]
+        return bar_open_time(_time, timeframe) != bar_open_time(_time + self.base_step, timeframe)
+
+    def _close(self, k: int):
+        forming = self._forming[k]
+        self._sr[k].add(int(forming[0]), forming[2], forming[3], forming[4])
+        forming[0] = -1
+
+    def _merge(self, changed: List[int]):
+        for k in changed:
+            self._valid[k] = self._sr[k].active_levels
+        levels = np.concatenate(self._valid) if self._valid else np.empty(0, dtype=SR_LEVEL)
+        self.levels = merge_sr_levels(levels, self.percent, self.min_strength)
+
+    def load(self, times, _open, _high, _low, _close, _volume) -> np.ndarray:
+        "closed base bars, oldest first"
+        bars = resample_many(times, _open, _high, _low, _close, _volume, self.timeframes)
+        jobs = []
+        for k, timeframe in enumerate(self.timeframes):
+            rows = np.column_stack(bars[timeframe]).astype(np.float64)
+            self._forming[k] = np.array([-1.0, 0, 0, 0, 0, 0])
+            if rows.shape[0] and not self._is_closing(k, int(times[-1])):
+                # the last bucket still waits for base bars
+                self._forming[k] = rows[-1].copy()
+                rows = rows[:-1]
+            jobs.append((rows[:, 0].astype(np.int64), rows[:, 2], rows[:, 3], rows[:, 4],
+                         self.pivot_length, self.atr_length, self.tolerance, k))
+        self._sr = _load_all(self.executor, jobs)
+        self._merge(list(range(len(self.timeframes))))
+        return self.levels
+
+    def add(self, _time: int, _open: float, _high: float, _low: float, _close: float,
+            _volume: float) -> List[str]:
+        "a closed base bar, returns the timeframes whose levels were updated"
+        changed = []
+        for k, timeframe in enumerate(self.timeframes):
+            # calendar aware like resample_many: weeks on Monday, months on the 1st
+            bucket_time = bar_open_time(_time, timeframe)
+            forming = self._forming[k]
+            if forming[0] >= 0 and forming[0] != bucket_time:
+                # base bars were missing at the end of the previous bucket
+                self._close(k)
+                changed.append(k)
+            if forming[0] < 0:
+                forming[:] = bucket_time, _open, _high, _low, _close, _volume
+            else:
+                forming[2] = max(forming[2], _high)
+                forming[3] = min(forming[3], _low)
+                forming[4] = _close
+                forming[5] += _volume
+            if self._is_closing(k, _time):
+                self._close(k)
+                if k not in changed:
+                    changed.append(k)
+        if changed:
+            self._merge(changed)
+        return [self.timeframes[k] for k in changed]
+
+    def timeframe_levels(self, timeframe: str) -> np.ndarray:
+        "unmerged levels of one timeframe, broken ones included"
+        return self._sr[self.timeframes.index(timeframe)].levels
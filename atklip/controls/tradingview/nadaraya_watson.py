@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+from typing import Tuple
+
+import numpy as np
+from numba import njit
+
+from atklip.controls.stream_kernels import STREAM_KERNEL
+
+
+def nw_weights(h: float = 8.0, window: int = 500) -> np.ndarray:
+    "gaussian weight of the bar `i` bars back, i = 0 .. window - 1"
+    i = np.arange(int(window), dtype=np.float64)
+    return np.exp(-(i * i) / (h * h * 2))
+
+
+# state: [count, pos, error count, error pos, source ring (window), error ring (mae_length)]
+def nw_state_size(window: int, mae_length: int) -> int:
+    return 4 + int(window) + int(mae_length)
+
+
+# One bar of the non repainting (endpoint) Nadaraya-Watson envelope of
+# LuxAlgo: out = sum(src[i] * w[i]) / sum(w) over the last `window` bars and
+# mae = sma(|src - out|, mae_length) * mult. The rings hold the committed
+# inputs and errors, with commit=False the forming bar is evaluated without
+# touching the state. O(window) per bar.
+@njit(cache=True)
+def nb_nw_update(weights, den, mae_length, mult, state, x, out, commit):
+    window = weights.size
+    count, pos = int(state[0]), int(state[1])
+    err_count, err_pos = int(state[2]), int(state[3])
+    src = state[4:4 + window]
+    errors = state[4 + window:4 + window + mae_length]
+
+    value = np.nan
+    if count + 1 >= window:
+        value = x * weights[0]
+        # ring read newest first, pos - 1 down to 0 then wrapping around
+        for i in range(1, pos + 1):
+            value += src[pos - i] * weights[i]
+        for i in range(pos + 1, window):
+            value += src[pos - i + window] * weights[i]
+        value /= den
+    err = abs(x - value)
+    mae = np.nan
+    if not np.isnan(err) and err_count + 1 >= mae_length:
+        total = err
+        for i in range(1, min(err_pos, mae_length - 1) + 1):
+            total += errors[err_pos - i]
+        for i in range(err_pos + 1, mae_length):
+            total += errors[err_pos - i + mae_length]
+        mae = total / mae_length * mult
+    out[0] = value
+    out[1] = value + mae
+    out[2] = value - mae
+
+    if commit:
+        src[pos] = x
+        state[0] = count + 1
+        state[1] = (pos + 1) % window
+        if not np.isnan(err):
+            errors[err_pos] = err
+            state[2] = err_count + 1
+            state[3] = (err_pos + 1) % mae_length
+
+
+@njit(cache=True)
+def nb_nw_batch(weights, den, mae_length, mult, state, close):
+    m = close.size
+    result = np.empty((m, 3), dtype=np.float64)
+    for i in range(m):
+        nb_nw_update(weights, den, mae_length, mult, state, close[i], result[i], i < m - 1)
+    return result
+
+
+class NADARAYA_WATSON_KERNEL(STREAM_KERNEL):
+    """LuxAlgo Nadaraya-Watson envelope without repainting, outputs (out, upper, lower).
+
+    Only the endpoint estimator is kept: each bar is the gaussian weighted
+    mean of the `window` bars ending on it, with weights computed once. The
+    repainting version refits every past bar on each tick, it is O(n^2) and
+    can't stream.
+    """
+
+    def __init__(self, h: float = 8.0, mult: float = 3.0, window: int = 500, mae_length: int = 499):
+        self.h, self.mult = float(h), float(mult)
+        self.window, self.mae_length = int(window), int(mae_length)
+        self.weights = nw_weights(self.h, self.window)
+        self.den = self.weights.sum()
+        super().__init__()
+
+    def _new_state(self):
+        return np.zeros(nw_state_size(self.window, self.mae_length), dtype=np.float64)
+
+    def _batch(self, state, close):
+        result = nb_nw_batch(self.weights, self.den, self.mae_length, self.mult, state, close)
+        return result[:, 0], result[:, 1], result[:, 2]
+
+    def _step(self, state, x, commit) -> Tuple[float, float, float]:
+        out = np.empty(3, dtype=np.float64)
+        nb_nw_update(self.weights, self.den, self.mae_length, self.mult, state, x[0], out, commit)
+        return out[0], out[1], out[2]
+
+
+def nadaraya_watson_envelope(close, h: float = 8.0, mult: float = 3.0, window: int = 500,
+                             mae_length: int = 499) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    "historic pass: (out, upper, lower) arrays of close"
+    return NADARAYA_WATSON_KERNEL(h, mult, window, mae_length).load(close)
+
+
+def nw_signals(close, upper, lower) -> Tuple[np.ndarray, np.ndarray]:
+    """(buy, sell) bool arrays: close crossing under the lower band and over
+    the upper band, the labels of the LuxAlgo script"""
+    close, upper, lower = (np.asarray(x, dtype=np.float64) for x in (close, upper, lower))
+    buy = np.zeros(close.size, dtype=np.bool_)
+    sell = np.zeros(close.size, dtype=np.bool_)
+    with np.errstate(invalid="ignore"):
+        buy[1:] = (close[1:] < lower[1:]) & (close[:-1] > lower[:-1])
+        sell[1:] = (close[1:] > upper[1:]) & (close[:-1] < upper[:-1])
+    return buy, sell
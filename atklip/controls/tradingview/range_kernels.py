@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from numba import njit
+
+from atklip.controls.candle.resample import resample_ohlcv
+from atklip.controls.stream_kernels import (ATR_KERNEL, MA_KINDS, STREAM_KERNEL,
+                                            nb_atr_update, new_ma_state)
+
+
+# --- Predictive Ranges (LuxAlgo) ---
+
+# One bar of pred_ranges: avg follows close by whole atr steps and hold_atr
+# is half the atr of the last step. state: [avg, hold_atr, started].
+# Returns (avg, hold_atr).
+@njit(cache=True)
+def nb_pred_ranges_update(state, close, atr, commit):
+    avg = state[0] if state[2] else close
+    hold_atr = state[1]
+    if close - avg > atr:
+        new_avg = avg + atr
+    elif avg - close > atr:
+        new_avg = avg - atr
+    else:
+        new_avg = avg
+    if new_avg != avg:
+        hold_atr = atr / 2
+    if commit:
+        state[0], state[1], state[2] = new_avg, hold_atr, 1.0
+    return new_avg, hold_atr
+
+
+@njit(cache=True)
+def nb_pred_ranges(close, atr):
+    "avg and hold_atr of every bar, atr already multiplied and NaN-free"
+    m = close.size
+    avg = np.empty(m, dtype=np.float64)
+    hold_atr = np.empty(m, dtype=np.float64)
+    state = np.zeros(3, dtype=np.float64)
+    for i in range(m):
+        avg[i], hold_atr[i] = nb_pred_ranges_update(state, close[i], atr[i], True)
+    return avg, hold_atr
+
+
+def pred_ranges_levels(avg: np.ndarray, hold_atr: np.ndarray) -> Dict[str, np.ndarray]:
+    return {"prR2": avg + hold_atr * 2, "prR1": avg + hold_atr, "avg": avg,
+            "prS1": avg - hold_atr, "prS2": avg - hold_atr * 2}
+
+
+def predictive_ranges(_high, _low, _close, length: int = 200, mult: float = 6.0) -> Dict[str, np.ndarray]:
+    "prR2, prR1, avg, prS1, prS2 of a candle source, nz(atr(length)) * mult steps"
+    _high, _low, _close = (np.ascontiguousarray(x, dtype=np.float64) for x in (_high, _low, _close))
+    atr = ATR_KERNEL(length, "rma").load(_high, _low, _close)
+    atr = np.nan_to_num(atr, nan=0.0) * mult
+    return pred_ranges_levels(*nb_pred_ranges(_close, atr))
+
+
+def predictive_ranges_mtf(times, _open, _high, _low, _close, _volume, timeframe: str,
+                          length: int = 200, mult: float = 6.0) -> Dict[str, np.ndarray]:
+    """ranges of `timeframe` bars mapped back on the source bars, each bar
+    reads the value of the higher timeframe bar it belongs to (the
+    resample/reindex/ffill of the pandas version)"""
+    htf = resample_ohlcv(times, _open, _high, _low, _close, _volume, timeframe)
+    levels = predictive_ranges(htf[2], htf[3], htf[4], length, mult)
+    where = np.searchsorted(htf[0], np.asarray(times, dtype=np.int64), side="right") - 1
+    return {name: values[where] for name, values in levels.items()}
+
+
+# One live bar: nz(atr) * mult of the rma atr block, then pred_ranges.
+# state: [avg, hold_atr, started, prev close, rma state]
+@njit(cache=True)
+def nb_pred_ranges_stream_update(kind, length, mult, state, high, low, close, commit):
+    atr = nb_atr_update(kind, length, state[3:], high, low, close, commit)
+    atr = 0.0 if np.isnan(atr) else atr * mult
+    return nb_pred_ranges_update(state[:3], close, atr, commit)
+
+
+@njit(cache=True)
+def nb_pred_ranges_stream_batch(kind, length, mult, state, high, low, close):
+    m = close.size
+    avg = np.empty(m, dtype=np.float64)
+    hold_atr = np.empty(m, dtype=np.float64)
+    for i in range(m):
+        avg[i], hold_atr[i] = nb_pred_ranges_stream_update(kind, length, mult, state, high[i], low[i],
+                                                           close[i], i < m - 1)
+    return avg, hold_atr
+
+
+class PREDICTIVE_RANGES_KERNEL(STREAM_KERNEL):
+    "predictive ranges of live bars, inputs high, low, close, outputs (prR2, prR1, avg, prS1, prS2)"
+
+    def __init__(self, length: int = 200, mult: float = 6.0):
+        self.length = int(length)
+        self.mult = float(mult)
+        self.kind = MA_KINDS["rma"]
+        super().__init__()
+
+    def _new_state(self):
+        return np.concatenate([np.zeros(3), [np.nan], new_ma_state(self.length)])
+
+    def _batch(self, state, high, low, close):
+        avg, hold_atr = nb_pred_ranges_stream_batch(self.kind, self.length, self.mult, state, high, low, close)
+        return tuple(pred_ranges_levels(avg, hold_atr).values())
+
+    def _step(self, state, x, commit) -> Tuple[float, float, float, float, float]:
+        avg, hold_atr = nb_pred_ranges_stream_update(self.kind, self.length, self.mult, state,
+                                                     x[0], x[1], x[2], commit)
+        return avg + hold_atr * 2, avg + hold_atr, avg, avg - hold_atr, avg - hold_atr * 2
+
+
+# --- sideway detection ---
+
+# Is the last bar of high/low in a sideway: its mid price moved at most
+# `percent` % from each of the `bars_min` mid prices before it. Returns
+# (flag, top, bottom) of the bars_min + 1 bar window.
+@njit(cache=True)
+def nb_sideway_window(high, low, end, bars_min, percent):
+    bar_cur_mid_price = (high[end] + low[end]) / 2
+    top, bottom = high[end], low[end]
+    for j in range(1, bars_min + 1):
+        bar_pre_mid_price = (high[end - j] + low[end - j]) / 2
+        if abs(bar_cur_mid_price - bar_pre_mid_price) / bar_pre_mid_price * 100 > percent:
+            return False, np.nan, np.nan
+        top = max(top, high[end - j])
+        bottom = min(bottom, low[end - j])
+    return True, top, bottom
+
+
+# Sideway bars and their boxes [start, end, top, bottom]: a sideway window
+# starting within `bars_ext` bars of the last box end extends that box,
+# otherwise it opens a new one.
+@njit(cache=True)
+def nb_sideway_detection(high, low, bars_min, bars_ext, percent):
+    m = high.size
+    flags = np.zeros(m, dtype=np.bool_)
+    boxes = np.empty((m, 4), dtype=np.float64)
+    k = 0
+    for i in range(bars_min, m):
+        flag, top, bottom = nb_sideway_window(high, low, i, bars_min, percent)
+        if not flag:
+            continue
+        flags[i] = True
+        start = i - bars_min
+        if k > 0 and start <= boxes[k - 1, 1] + bars_ext:
+            boxes[k - 1, 1] = i
+            boxes[k - 1, 2] = max(boxes[k - 1, 2], top)
+            boxes[k - 1, 3] = min(boxes[k - 1, 3], bottom)
+        else:
+            boxes[k, 0], boxes[k, 1], boxes[k, 2], boxes[k, 3] = start, i, top, bottom
+            k += 1
+    return flags, boxes[:k].copy()
+
+
+class SIDEWAY_DETECTOR:
+    """Sideway zones of a candle source, batch on `load` and per bar after.
+
+    A bar only reads its own bars_min + 1 bar window and the last box, so
+    `add` (new bar) and `update` (tick of the forming bar) evaluate
+    `nb_sideway_window` on that tail. The forming bar's effect on the boxes
+    is provisional until the next `add` commits it.
+    """
+
+    def __init__(self, bars_min_in_sideway: int = 10, bars_ext_for_sideway: int = 5,
+                 percent_change_sideway: float = 1.0):
+        self.bars_min = int(bars_min_in_sideway)
+        self.bars_ext = int(bars_ext_for_sideway)
+        self.percent = float(percent_change_sideway)
+        self.reset()
+
+    def reset(self):
+        self._size = 0
+        self._tail = np.empty((0, 2), dtype=np.float64)
+        self._boxes: List[List[float]] = []
+        # (flag, box, extends the last box, (high, low)) of the forming bar
+        self._forming: Optional[Tuple[bool, Optional[List[float]], bool, Tuple[float, float]]] = None
+
+    def __len__(self):
+        return self._size
+
+    def load(self, _high, _low) -> Tuple[np.ndarray, np.ndarray]:
+        self.reset()
+        _high, _low = (np.ascontiguousarray(x, dtype=np.float64) for x in (_high, _low))
+        m = _high.size
+        # boxes of the closed bars, the last bar is the forming one
+        flags, boxes = nb_sideway_detection(_high[:m - 1], _low[:m - 1], self.bars_min, self.bars_ext, self.percent) \
+            if m > 1 else (np.zeros(0, dtype=np.bool_), np.empty((0, 4)))
+        self._boxes = boxes.tolist()
+        self._size = max(m - 1, 0)
+        self._tail = np.column_stack((_high, _low))[max(0, m - 1 - self.bars_min):max(m - 1, 0)]
+        if m:
+            flag = self._evaluate(_high[-1], _low[-1])
+            flags = np.append(flags, flag)
+        return flags, self.boxes
+
+    def _evaluate(self, high: float, low: float) -> bool:
+        "flag of the forming bar, its box is kept in _forming until committed"
+        window = np.vstack([self._tail, [high, low]])
+        i = self._size
+        flag, top, bottom = (False, np.nan, np.nan)
+        if i >= self.bars_min:
+            flag, top, bottom = nb_sideway_window(window[:, 0], window[:, 1], window.shape[0] - 1,
+                                                  self.bars_min, self.percent)
+        box, extends = None, False
+        if flag:
+            start = i - self.bars_min
+            if self._boxes and start <= self._boxes[-1][1] + self.bars_ext:
+                last = self._boxes[-1]
+                box, extends = [last[0], i, max(last[2], top), min(last[3], bottom)], True
+            else:
+                box = [start, i, top, bottom]
+        self._forming = (flag, box, extends, (high, low))
+        return flag
+
+    def update(self, high: float, low: float) -> bool:
+        "a tick of the forming bar"
+        return self._evaluate(high, low)
+
+    def add(self, high: float, low: float) -> bool:
+        "a new bar opened, the previous forming bar is closed"
+        if self._forming is not None:
+            flag, box, extends, bar = self._forming
+            if box is not None:
+                if extends:
+                    self._boxes[-1] = box
+                else:
+                    self._boxes.append(box)
+            self._tail = np.vstack([self._tail, bar])[-self.bars_min:]
+            self._size += 1
+        return self._evaluate(high, low)
+
+    @property
+    def boxes(self) -> np.ndarray:
+        "[start, end, top, bottom] of every zone, the forming bar included"
+        boxes = [list(box) for box in self._boxes]
+        if self._forming is not None and self._forming[1] is not None:
+            if self._forming[2]:
+                boxes[-1] = self._forming[1]
+            else:
+                boxes.append(self._forming[1])
+        return np.array(boxes, dtype=np.float64).reshape(-1, 4)
+
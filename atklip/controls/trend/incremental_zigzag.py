@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+from typing import Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+from numba import njit
+
+from atklip.controls.pandas_ta.utils._nb_rolling import nb_rolling_hl
+from atklip.controls.pandas_ta.utils._numba import nb_map_zigzag
+
+
+# nb_find_zigzags walks the extremums from the last one backwards and keeps
+# its pivots as extremum numbers (slot 0 is the newest). After extremum e the
+# walk only depends on (current pivot, previous pivot, more than one pivot),
+# so once that state equals the one a previous walk had at e, everything
+# older than the current pivot is unchanged and the walk stops there.
+# Returns (e where it stopped or -1, pivots newest first, state per extremum).
+@njit(cache=True)
+def nb_zigzag_resume(idx, swing, value, deviation, start, valid, old_cur, old_prev, old_many):
+    # only the walked tail of these is written and read
+    zz = np.empty(start + 1, dtype=np.int64)
+    z_at = np.empty(start + 1, dtype=np.int64)
+    cur_at = np.empty(start + 1, dtype=np.int64)
+    prev_at = np.empty(start + 1, dtype=np.int64)
+    zz[0] = start
+    z = 0
+    z_at[start], cur_at[start], prev_at[start] = 0, start, -1
+    for i in range(start - 1, -1, -1):
+        last = zz[z]
+        if swing[last] == -1:
+            # last point in zigzag is bottom
+            if swing[i] == -1:
+                if value[last] > value[i] and z > 1:
+                    zz[z] = i
+            elif (value[i] - value[last]) / value[i] > 0.01 * deviation and idx[last] != idx[i]:
+                z += 1
+                zz[z] = i
+        else:
+            # last point in zigzag is peak
+            if swing[i] == 1:
+                if value[last] < value[i] and z > 1:
+                    zz[z] = i
+            elif (value[last] - value[i]) / value[i] > 0.01 * deviation and idx[last] != idx[i]:
+                z += 1
+                zz[z] = i
+        z_at[i] = z
+        cur_at[i] = zz[z]
+        prev_at[i] = zz[z - 1] if z > 0 else -1
+        if i < valid and cur_at[i] == old_cur[i] and prev_at[i] == old_prev[i] and (z > 1) == old_many[i]:
+            return i, zz[:z + 1], z_at, cur_at, prev_at
+    return -1, zz[:z + 1], z_at, cur_at, prev_at
+
+
+# percent move of each pivot from the one before it, the zz_dev of
+# nb_find_zigzags (0 for the first pivot)
+@njit(cache=True)
+def nb_zigzag_dev(swing, value, out, start):
+    for p in range(max(start, 1), value.size):
+        peak, low = (value[p], value[p - 1]) if swing[p] == 1 else (value[p - 1], value[p])
+        out[p] = 100 * ((peak - low) / value[p - 1])
+    if start == 0 and value.size:
+        out[0] = 0.0
+
+
+_EXTREMUM_COLUMNS = (("bar", np.float64), ("swing", np.float64), ("value", np.float64),
+                     ("cur", np.int64), ("prev", np.int64), ("many", np.bool_), ("pos", np.int64))
+
+
+class INCREMENTAL_ZIGZAG:
+    """pandas_ta zigzag (nb_rolling_hl + nb_find_zigzags) kept up to date bar by bar.
+
+    Extremums of nb_rolling_hl are final once their right window has closed,
+    so a new bar adds at most two of them after an O(legs) check. The zigzag
+    is walked from the newest extremum backwards like nb_find_zigzags, but the
+    walk stops as soon as it reaches the state the previous walk had there,
+    so the work is bounded by the legs that actually moved. The forming bar is
+    never part of a nb_rolling_hl window, a tick leaves the zigzag unchanged.
+
+    Pivots are kept oldest first; `changed_from` is the first pivot rewritten
+    by the last `add`, so the graphics layer only redraws from there.
+    `last_time` is the open time of the last bar when the bars come with
+    their times, -1 otherwise.
+    """
+
+    def __init__(self, legs: int = 10, deviation: float = 5.0, capacity: int = 1024):
+        self.legs = int(legs)
+        self.deviation = float(deviation)
+        self.left = self.legs // 2
+        self.changed_from = 0
+        self.last_time = -1
+        self._bars = 0
+        self._hl = np.empty((capacity, 2), dtype=np.float64)
+        self._extremums = 0
+        # extremums of nb_rolling_hl, then the walk state after each one and
+        # the position of its current pivot in _path
+        self._ext = {name: np.empty(capacity, dtype=dtype) for name, dtype in _EXTREMUM_COLUMNS}
+        self._pivots = 0
+        self._path = np.empty(capacity, dtype=np.int64)
+        self._dev = np.zeros(capacity, dtype=np.float64)
+
+    @staticmethod
+    def _grown(x: np.ndarray, size: int, used: int) -> np.ndarray:
+        if size <= x.shape[0]:
+            return x
+        grown = np.zeros((max(size, 2 * x.shape[0]),) + x.shape[1:], dtype=x.dtype)
+        grown[:used] = x[:used]
+        return grown
+
+    def __len__(self):
+        return self._bars
+
+    # --- extremums ---
+
+    def load(self, high, low, times=None):
+        high = np.ascontiguousarray(high, dtype=np.float64)
+        low = np.ascontiguousarray(low, dtype=np.float64)
+        self._bars = high.size
+        self._hl = self._grown(self._hl, self._bars, 0)
+        self._hl[:self._bars, 0], self._hl[:self._bars, 1] = high, low
+        self._extremums = 0
+        self._pivots = 0
+        self._append_extremums(*nb_rolling_hl(high, low, self.legs))
+        self._walk(valid=0)
+        self.last_time = int(times[-1]) if times is not None and len(times) else -1
+
+    def update(self, high: float, low: float):
+        "a tick of the forming bar"
+        if self._bars == 0:
+            return self.add(high, low)
+        self._hl[self._bars - 1] = high, low
+
+    def add(self, high: float, low: float, _time: int = -1) -> bool:
+        "a new bar, return True if the pivots changed"
+        self._hl = self._grown(self._hl, self._bars + 1, self._bars)
+        self._hl[self._bars] = high, low
+        self._bars += 1
+        self.last_time = _time
+        # the window of center c ends at the bar before the forming one
+        c = self._bars - self.left - 2
+        if c < self.left:
+            return False
+        window = self._hl[c - self.left:c + self.left + 1]
+        found = []
+        if self._hl[c, 1] <= window[:, 1].min():
+            found.append((c, -1.0, self._hl[c, 1]))
+        if self._hl[c, 0] >= window[:, 0].max():
+            found.append((c, 1.0, self._hl[c, 0]))
+        if not found:
+            return False
+        valid = self._extremums
+        self._append_extremums(*np.array(found, dtype=np.float64).T)
+        self._walk(valid)
+        return True
+
+    def update_rows(self, rows: Iterable[Sequence[float]]) -> Optional[Tuple[int, bool]]:
+        """feed the last raw bars as fetched (time, open, high, low, close,
+        volume): the closing bar, then the new one, so a final tick that only
+        comes with the new bar still reaches the closed bar before its window
+        is read; rows before the last bar are skipped. changed_from covers
+        every pivot the rows rewrote.
+        return the (bar index, is_new_bar) of the last row fed"""
+        result, changed_from = None, None
+        for row in rows:
+            _time, high, low = row[0], row[2], row[3]
+            if self._bars and _time < self.last_time:
+                continue
+            if self._bars and _time == self.last_time:
+                self.update(high, low)
+                result = self._bars - 1, False
+                continue
+            if self.add(high, low, _time):
+                changed_from = self.changed_from if changed_from is None else min(changed_from, self.changed_from)
+            result = self._bars - 1, True
+        if changed_from is not None:
+            self.changed_from = changed_from
+        return result
+
+    def _append_extremums(self, bar: np.ndarray, swing: np.ndarray, value: np.ndarray):
+        size = self._extremums + bar.size
+        for name in self._ext:
+            self._ext[name] = self._grown(self._ext[name], size, self._extremums)
+        for name, x in (("bar", bar), ("swing", swing), ("value", value)):
+            self._ext[name][self._extremums:size] = x
+        self._extremums = size
+
+    # --- zigzag ---
+
+    def _walk(self, valid: int):
+        if self._extremums == 0:
+            self._pivots = self.changed_from = 0
+            return
+        n = self._extremums
+        ext = self._ext
+        stop, zz, z_at, cur_at, prev_at = nb_zigzag_resume(
+            ext["bar"], ext["swing"], ext["value"], self.deviation, n - 1, valid,
+            ext["cur"], ext["prev"], ext["many"])
+        if stop >= 0:
+            # pivots up to the current one at `stop` are those of the previous walk
+            keep = int(ext["pos"][stop]) + 1
+            new = zz[:z_at[stop]][::-1]
+        else:
+            keep, new = 0, zz[::-1]
+        self._pivots = keep + new.size
+        self._path = self._grown(self._path, self._pivots, keep)
+        self._dev = self._grown(self._dev, self._pivots, keep)
+        self._path[keep:self._pivots] = new
+        walked = slice(stop + 1, n)
+        ext["cur"][walked] = cur_at[walked]
+        ext["prev"][walked] = prev_at[walked]
+        ext["many"][walked] = z_at[walked] > 1
+        ext["pos"][walked] = self._pivots - 1 - z_at[walked]
+        # deviations of the new pivots read the last kept one
+        first = max(keep - 1, 0)
+        path = self._path[first:self._pivots]
+        nb_zigzag_dev(ext["swing"][path], ext["value"][path], self._dev[first:self._pivots], keep - first)
+        self.changed_from = keep
+
+    @property
+    def pivots(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        "(bar index, swing, value, deviation %) of every pivot, oldest first"
+        path = self._path[:self._pivots]
+        return (self._ext["bar"][path].astype(np.int64), self._ext["swing"][path], self._ext["value"][path],
+                self._dev[:self._pivots].copy())
+
+    @property
+    def confirmed_pivots(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        "every pivot but the newest one, which moves with the next extremums"
+        return tuple(x[:-1] for x in self.pivots)
+
+    @property
+    def pending_pivot(self) -> Optional[Tuple[int, float, float, float]]:
+        if self._pivots == 0:
+            return None
+        i = self._path[self._pivots - 1]
+        return int(self._ext["bar"][i]), self._ext["swing"][i], self._ext["value"][i], self._dev[self._pivots - 1]
+
+    def zigzag_map(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        "swing, value and deviation per bar like nb_map_zigzag"
+        bar, swing, value, dev = self.pivots
+        # nb_find_zigzags lists the pivots newest first
+        return nb_map_zigzag(bar[::-1].astype(np.float64), swing[::-1].copy(), value[::-1].copy(),
+                             dev[::-1].copy(), self._bars)
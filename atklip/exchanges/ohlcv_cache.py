@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+OHLCV_FIELDS = ("time", "open", "high", "low", "close", "volume")
+# next to the other app data of the package, whatever the working directory
+CACHE_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "appdata", "ohlcv_cache")
+
+_TIMEFRAME_UNITS = {
+    "s": 1000,
+    "m": 60 * 1000,
+    "h": 60 * 60 * 1000,
+    "d": 24 * 60 * 60 * 1000,
+    "w": 7 * 24 * 60 * 60 * 1000,
+    "M": 30 * 24 * 60 * 60 * 1000,
+}
+
+
+def timeframe_to_ms(timeframe: str) -> int:
+    "'1m' -> 60000, '4h' -> 14400000 ... same units as ccxt"
+    match = re.fullmatch(r"(\d+)([smhdwM])", timeframe)
+    if match is None:
+        raise ValueError(f"unsupported timeframe {timeframe!r}")
+    return int(match.group(1)) * _TIMEFRAME_UNITS[match.group(2)]
+
+
+DAY_MS = 24 * 60 * 60 * 1000
+# 1970-01-01 is a Thursday, exchanges open their weekly candle on Monday
+WEEK_OFFSET_MS = 4 * DAY_MS
+
+
+def timeframe_offset(timeframe: str) -> int:
+    return WEEK_OFFSET_MS if timeframe.endswith("w") else 0
+
+
+def bar_open_time(timestamp: int, timeframe: str) -> int:
+    "open time of the `timeframe` bar holding timestamp, weeks on Monday and months on the 1st like ccxt"
+    if timeframe.endswith("M"):
+        months = np.datetime64(int(timestamp), "ms").astype("datetime64[M]").astype(np.int64)
+        months -= months % int(timeframe[:-1])
+        return int(np.datetime64(int(months), "M").astype("datetime64[ms]").astype(np.int64))
+    step, offset = timeframe_to_ms(timeframe), timeframe_offset(timeframe)
+    return (timestamp - offset) // step * step + offset
+
+
+def add_bars(timestamp: int, timeframe: str, n: int) -> int:
+    "open time of the bar n bars after (before when n < 0) the bar opening at timestamp"
+    if timeframe.endswith("M"):
+        months = np.datetime64(int(timestamp), "ms").astype("datetime64[M]") + n * int(timeframe[:-1])
+        return int(months.astype("datetime64[ms]").astype(np.int64))
+    return timestamp + n * timeframe_to_ms(timeframe)
+
+
+def _merge_ranges(ranges: List[Tuple[int, int]], timeframe: str) -> List[Tuple[int, int]]:
+    "merge closed [start, end] bar ranges that overlap or touch"
+    merged: List[List[int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= add_bars(merged[-1][1], timeframe, 1):
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def _safe_name(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+
+
+class OHLCV_CACHE:
+    """On-disk OHLCV history keyed by (exchange, symbol, timeframe).
+
+    Bars are kept in Parquet segments of `segment_bars` rows aligned on time,
+    so a live update only rewrites the last segment. The forming bar is
+    refreshed on every fetch: it is held in memory and `read` merges it in,
+    the segment is only rewritten when its closed bars are downloaded. Next
+    to the segments a
+    small `coverage.json` records which closed bar ranges have already been
+    downloaded; gaps are computed against it instead of against bar
+    continuity, so holes the exchange itself has (maintenance, delisting)
+    are not fetched again on every open.
+    """
+
+    def __init__(self, root: str = CACHE_ROOT, segment_bars: int = 50_000):
+        self.root = root
+        self.segment_bars = segment_bars
+        self._lock = threading.RLock()
+        self._coverage: Dict[Tuple[str, str, str], List[Tuple[int, int]]] = {}
+        # rows from the forming bar on, per key
+        self._forming: Dict[Tuple[str, str, str], np.ndarray] = {}
+
+    def _dir(self, exchange_id: str, symbol: str, timeframe: str) -> str:
+        return os.path.join(self.root, _safe_name(exchange_id), _safe_name(symbol), _safe_name(timeframe))
+
+    def _segment_path(self, folder: str, segment: int) -> str:
+        return os.path.join(folder, f"{segment:012d}.parquet")
+
+    def _read_coverage(self, key: Tuple[str, str, str]) -> List[Tuple[int, int]]:
+        path = os.path.join(self._dir(*key), "coverage.json")
+        if not os.path.exists(path):
+            return []
+        with open(path, "r") as f:
+            return [tuple(item) for item in json.load(f)]
+
+    def get_coverage(self, exchange_id: str, symbol: str, timeframe: str) -> List[Tuple[int, int]]:
+        key = (exchange_id, symbol, timeframe)
+        with self._lock:
+            if key not in self._coverage:
+                self._coverage[key] = self._read_coverage(key)
+            return list(self._coverage[key])
+
+    def _set_coverage(self, key: Tuple[str, str, str], ranges: List[Tuple[int, int]]):
+        folder = self._dir(*key)
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, "coverage.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump([list(item) for item in ranges], f)
+        os.replace(path + ".tmp", path)
+        self._coverage[key] = ranges
+
+    def missing_ranges(self, exchange_id: str, symbol: str, timeframe: str,
+                       start: int, end: int) -> List[Tuple[int, int]]:
+        "closed [start, end] bar ranges inside the request that were never downloaded"
+        missing = []
+        cursor = start
+        for cov_start, cov_end in self.get_coverage(exchange_id, symbol, timeframe):
+            if cov_end < cursor:
+                continue
+            if cov_start > end:
+                break
+            if cov_start > cursor:
+                missing.append((cursor, add_bars(cov_start, timeframe, -1)))
+            cursor = max(cursor, add_bars(cov_end, timeframe, 1))
+            if cursor > end:
+                break
+        if cursor <= end:
+            missing.append((cursor, end))
+        return missing
+
+    def write(self, exchange_id: str, symbol: str, timeframe: str, rows: np.ndarray,
+              covered: Optional[Tuple[int, int]] = None, forming: Optional[int] = None):
+        """merge rows (n x 6: time, open, high, low, close, volume) into the segments.
+        `covered` marks a closed bar range as fully downloaded, even when the
+        exchange had no bars in it. Rows from `forming`, the open time of the
+        forming bar, are held in memory instead, until a later forming time
+        drops them: the closed bar is downloaded again with its final values."""
+        key = (exchange_id, symbol, timeframe)
+        step = timeframe_to_ms(timeframe)
+        folder = self._dir(*key)
+        rows = np.asarray(rows, dtype=np.float64).reshape(-1, len(OHLCV_FIELDS))
+        with self._lock:
+            if forming is not None:
+                held = self._forming.get(key)
+                live = rows[:, 0] >= forming
+                if live.any():
+                    self._forming[key] = rows[live]
+                elif held is not None and held[0, 0] < forming:
+                    del self._forming[key]
+                rows = rows[~live]
+            if rows.shape[0]:
+                os.makedirs(folder, exist_ok=True)
+                times = rows[:, 0].astype(np.int64)
+                segments = times // (step * self.segment_bars)
+                for segment in np.unique(segments):
+                    self._write_segment(folder, int(segment), rows[segments == segment])
+            if covered is not None:
+                # from disk, not the memo: another OHLCV_CACHE on this root may
+                # have added ranges since, rewriting the memo would drop them
+                ranges = self._read_coverage(key) + [covered]
+                self._set_coverage(key, _merge_ranges(ranges, timeframe))
+
+    def _write_segment(self, folder: str, segment: int, rows: np.ndarray):
+        path = self._segment_path(folder, segment)
+        if os.path.exists(path):
+            old = self._read_segment(path)
+            rows = np.concatenate([old, rows])
+        # keep the newest copy of a bar: a later download replaces the forming bar
+        times = rows[:, 0].astype(np.int64)
+        _, last = np.unique(times[::-1], return_index=True)
+        rows = rows[len(times) - 1 - last]
+        table = pa.table({
+            "time": pa.array(rows[:, 0].astype(np.int64)),
+            "open": pa.array(rows[:, 1]),
+            "high": pa.array(rows[:, 2]),
+            "low": pa.array(rows[:, 3]),
+            "close": pa.array(rows[:, 4]),
+            "volume": pa.array(rows[:, 5]),
+        })
+        pq.write_table(table, path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+    def _read_segment(self, path: str) -> np.ndarray:
+        table = pq.read_table(path)
+        out = np.empty((table.num_rows, len(OHLCV_FIELDS)), dtype=np.float64)
+        for i, name in enumerate(OHLCV_FIELDS):
+            out[:, i] = table.column(name).to_numpy()
+        return out
+
+    def read(self, exchange_id: str, symbol: str, timeframe: str,
+             start: Optional[int] = None, end: Optional[int] = None) -> np.ndarray:
+        "cached rows with start <= time <= end, sorted by time, as an n x 6 float64 array"
+        key = (exchange_id, symbol, timeframe)
+        folder = self._dir(*key)
+        span = timeframe_to_ms(timeframe) * self.segment_bars
+        first = None if start is None else start // span
+        last = None if end is None else end // span
+        parts = []
+        with self._lock:
+            for name in sorted(os.listdir(folder)) if os.path.isdir(folder) else []:
+                if not name.endswith(".parquet"):
+                    continue
+                segment = int(name.split(".")[0])
+                if (first is not None and segment < first) or (last is not None and segment > last):
+                    continue
+                parts.append(self._read_segment(os.path.join(folder, name)))
+            held = self._forming.get(key)
+        if held is not None:
+            # the held rows are newer than any copy of their bars on disk
+            parts = [part[~np.isin(part[:, 0], held[:, 0])] for part in parts] + [held]
+        if not parts:
+            return np.empty((0, len(OHLCV_FIELDS)), dtype=np.float64)
+        rows = np.concatenate(parts)
+        if held is not None:
+            rows = rows[np.argsort(rows[:, 0], kind="stable")]
+        mask = np.ones(rows.shape[0], dtype=bool)
+        if start is not None:
+            mask &= rows[:, 0] >= start
+        if end is not None:
+            mask &= rows[:, 0] <= end
+        return rows[mask]
+
+    def clear(self, exchange_id: str, symbol: str, timeframe: str):
+        key = (exchange_id, symbol, timeframe)
+        folder = self._dir(*key)
+        with self._lock:
+            if os.path.isdir(folder):
+                for name in os.listdir(folder):
+                    os.remove(os.path.join(folder, name))
+            self._coverage.pop(key, None)
+            self._forming.pop(key, None)
+
+
+# shared by the cache users of the app so one instance owns coverage.json
+OHLCV_CACHE_global = OHLCV_CACHE()
+
+
+class CACHED_OHLCV:
+    """Cache-first `fetch_ohlcv` in front of a CryptoExchange/ccxt exchange.
+
+    Only the ranges missing from the OHLCV_CACHE are requested from the
+    network, page by page; the forming bar is never marked as covered so it
+    is refreshed on every call, in the memory of the cache. Works with both the sync exchange and the
+    async (ccxt.pro) one through `fetch_ohlcv` / `afetch_ohlcv`.
+    """
+
+    def __init__(self, exchange, cache: Optional[OHLCV_CACHE] = None,
+                 exchange_id: Optional[str] = None, page_limit: int = 1000):
+        self.exchange = exchange
+        self.cache = cache if cache is not None else OHLCV_CACHE_global
+        self.exchange_id = exchange_id or getattr(exchange, "id", type(exchange).__name__)
+        self.page_limit = page_limit
+
+    def _request_range(self, timeframe: str, since: Optional[int], limit: Optional[int],
+                       now: Optional[int] = None) -> Tuple[int, int, int]:
+        limit = limit or self.page_limit
+        now = int(time.time() * 1000) if now is None else now
+        forming = bar_open_time(now, timeframe)
+        if since is None:
+            end = forming
+            start = add_bars(end, timeframe, -(limit - 1))
+        else:
+            start = bar_open_time(since, timeframe)
+            if start < since:
+                start = add_bars(start, timeframe, 1)
+            end = min(add_bars(start, timeframe, limit - 1), forming)
+        return start, end, forming
+
+    def _plan(self, symbol: str, timeframe: str, since: Optional[int], limit: Optional[int]):
+        start, end, forming = self._request_range(timeframe, since, limit)
+        missing = self.cache.missing_ranges(self.exchange_id, symbol, timeframe, start, end)
+        return start, end, forming, missing
+
+    def _store_page(self, symbol: str, timeframe: str, page, range_start: int,
+                    range_end: int, forming: int) -> Optional[int]:
+        """write one downloaded page, return the next `since` or None when the
+        range is exhausted. Only [range_start, last bar received] is marked as
+        covered: an empty page, or one holding only bars before range_start,
+        marks nothing and is asked again next time"""
+        rows = np.asarray(page, dtype=np.float64).reshape(-1, len(OHLCV_FIELDS))
+        rows = rows[rows[:, 0] >= range_start]
+        if rows.shape[0] == 0:
+            return None
+        last_time = int(rows[-1, 0])
+        covered_end = min(last_time, range_end, add_bars(forming, timeframe, -1))
+        covered = (range_start, covered_end) if covered_end >= range_start else None
+        self.cache.write(self.exchange_id, symbol, timeframe, rows, covered, forming)
+        if last_time >= range_end:
+            return None
+        return add_bars(bar_open_time(last_time, timeframe), timeframe, 1)
+
+    def fetch_ohlcv_array(self, symbol: str, timeframe: str = "1m", since: Optional[int] = None,
+                          limit: Optional[int] = None) -> np.ndarray:
+        start, end, forming, missing = self._plan(symbol, timeframe, since, limit)
+        for range_start, range_end in missing:
+            cursor = range_start
+            while cursor is not None:
+                page = self.exchange.fetch_ohlcv(symbol, timeframe, since=cursor, limit=self.page_limit)
+                cursor = self._store_page(symbol, timeframe, page, range_start, range_end, forming)
+                if cursor is not None:
+                    range_start = cursor
+        return self.cache.read(self.exchange_id, symbol, timeframe, start, end)
+
+    async def afetch_ohlcv_array(self, symbol: str, timeframe: str = "1m", since: Optional[int] = None,
+                                 limit: Optional[int] = None) -> np.ndarray:
+        start, end, forming, missing = self._plan(symbol, timeframe, since, limit)
+        for range_start, range_end in missing:
+            cursor = range_start
+            while cursor is not None:
+                page = await self.exchange.fetch_ohlcv(symbol, timeframe, since=cursor, limit=self.page_limit)
+                cursor = await asyncio.to_thread(self._store_page, symbol, timeframe, page,
+                                                 range_start, range_end, forming)
+                if cursor is not None:
+                    range_start = cursor
+        return await asyncio.to_thread(self.cache.read, self.exchange_id, symbol, timeframe, start, end)
+
+    def fetch_ohlcv(self, symbol: str, timeframe: str = "1m", since: Optional[int] = None,
+                    limit: Optional[int] = None) -> List[List[float]]:
+        "drop-in for exchange.fetch_ohlcv, returns ccxt style [[time, o, h, l, c, v], ...]"
+        return _to_ccxt(self.fetch_ohlcv_array(symbol, timeframe, since, limit))
+
+    async def afetch_ohlcv(self, symbol: str, timeframe: str = "1m", since: Optional[int] = None,
+                           limit: Optional[int] = None) -> List[List[float]]:
+        return _to_ccxt(await self.afetch_ohlcv_array(symbol, timeframe, since, limit))
+
+
+def _to_ccxt(rows: np.ndarray) -> List[List[float]]:
+    out = rows.tolist()
+    for row in out:
+        row[0] = int(row[0])
+    return out
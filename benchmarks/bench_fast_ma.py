@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""Old (pandas_ta overlap functions) against new (fast_ma numba kernels)
+moving averages on 1M bars: time of each and the largest difference.
+
+    python -m benchmarks.bench_fast_ma
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from atklip.controls.pandas_ta import overlap
+from atklip.controls.pandas_ta.utils._fast_ma import NB_MA, fast_ma
+
+SIZE = 1_000_000
+LENGTH = 14
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1e3
+
+
+def main():
+    rng = np.random.default_rng(0)
+    source = pd.Series(100.0 + np.cumsum(rng.normal(0.0, 0.5, SIZE)))
+    print(f"{'mamode':>8} {'old ms':>10} {'new ms':>9} {'speedup':>8} {'max diff':>10}")
+    for mamode in NB_MA:
+        fast_ma(mamode, source.iloc[:100], LENGTH)  # compile outside the timing
+        old_fn = getattr(overlap, mamode)
+        if mamode == "hwma":
+            old, old_ms = _timed(lambda: old_fn(source))
+        else:
+            old, old_ms = _timed(lambda: old_fn(source, length=LENGTH))
+        new, new_ms = _timed(lambda: fast_ma(mamode, source, LENGTH))
+        old, new = old.to_numpy(dtype=np.float64), new.to_numpy()
+        assert np.array_equal(np.isnan(old), np.isnan(new)), f"{mamode}: NaN layout differs"
+        with np.errstate(invalid="ignore"):  # inf - inf where both blow up
+            diff = np.nanmax(np.abs(old - new))
+        print(f"{mamode:>8} {old_ms:>10.1f} {new_ms:>9.1f} {old_ms / new_ms:>7.1f}x {diff:>10.1e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""Per-tick latency of INCREMENTAL_SMOOTH_CANDLE against rerunning the batch
+MAs, from 1k to 200k bars of history.
+
+    python -m benchmarks.bench_incremental_smooth
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from atklip.controls.candle.incremental_smooth import INCREMENTAL_SMOOTH_CANDLE
+
+STAGES = [("ema", 14), ("rma", 14), ("wma", 9)]
+SIZES = (1_000, 10_000, 50_000, 200_000)
+TICKS = 2_000
+
+
+def _candles(size, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100.0 + np.cumsum(rng.normal(0.0, 1.0, size))
+    _open = np.r_[close[0], close[:-1]]
+    high = np.maximum(_open, close) + rng.exponential(0.3, size)
+    low = np.minimum(_open, close) - rng.exponential(0.3, size)
+    return np.arange(size, dtype=np.int64) * 60_000, _open, high, low, close, np.ones(size)
+
+
+def _batch(_open, high, low, close):
+    "what SMOOTH_CANDLE did per update: every MA over every whole column"
+    out = []
+    for column in (_open, high, low, close):
+        s = pd.Series(column)
+        s = s.ewm(span=14, adjust=False).mean().ewm(alpha=1 / 14, adjust=False).mean()
+        w = np.arange(1, 10, dtype=np.float64)
+        out.append(s.rolling(9).apply(lambda v: np.dot(v, w) / w.sum(), raw=True))
+    return out
+
+
+def main():
+    print(f"{'bars':>8} {'tick us':>9} {'new bar us':>11} {'batch ms':>9}")
+    for size in SIZES:
+        times, _open, high, low, close, volume = _candles(size)
+        smooth = INCREMENTAL_SMOOTH_CANDLE(STAGES, capacity=size + 2 * TICKS)
+        smooth.load(times, _open, high, low, close, volume)
+        smooth.update(times[-1], _open[-1], high[-1], low[-1], close[-1], 1.0)  # compile outside the timing
+        start = time.perf_counter()
+        for k in range(TICKS):
+            smooth.update(times[-1], _open[-1], high[-1] + k * 1e-3, low[-1], close[-1], 1.0)
+        tick = (time.perf_counter() - start) / TICKS * 1e6
+        start = time.perf_counter()
+        for k in range(1, TICKS + 1):
+            smooth.update(times[-1] + k * 60_000, close[-1], close[-1] + 1, close[-1] - 1, close[-1], 1.0)
+        new_bar = (time.perf_counter() - start) / TICKS * 1e6
+        rows = min(size, 20_000)  # the batch rerun is slow, time it on at most 20k rows and scale
+        start = time.perf_counter()
+        _batch(_open[:rows], high[:rows], low[:rows], close[:rows])
+        batch = (time.perf_counter() - start) * 1e3 * size / rows
+        print(f"{size:>8} {tick:>9.1f} {new_bar:>11.1f} {batch:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
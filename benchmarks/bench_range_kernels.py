@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""Predictive ranges and sideway detection: the pandas/loop versions of
+Predictive_Ranges and sideway_detection against the range_kernels numba
+kernels.
+
+    python -m benchmarks.bench_range_kernels
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from atklip.controls.tradingview.range_kernels import nb_sideway_detection, predictive_ranges
+
+SIZES = (10_000, 100_000, 1_000_000)
+
+
+# the old versions: the pandas_ta atr (rma of the true range) and the bar loops
+# of Predictive_Ranges and sideway_detection
+
+def ref_atr(df, length):
+    prev_close = df["close"].shift(1)
+    tr = pd.concat([df["high"] - df["low"], (df["high"] - prev_close).abs(),
+                    (df["low"] - prev_close).abs()], axis=1).max(axis=1, skipna=False)
+    return tr.ewm(alpha=1.0 / length, adjust=False).mean()
+
+
+def compute_pred_ranges(close, atr):
+    avg_values, hold_atr_values = [], []
+    avg_prev, hold_atr_prev = close[0], 0.0
+    for src, current_atr in zip(close, atr):
+        if src - avg_prev > current_atr:
+            new_avg = avg_prev + current_atr
+        elif avg_prev - src > current_atr:
+            new_avg = avg_prev - current_atr
+        else:
+            new_avg = avg_prev
+        hold_atr = current_atr / 2 if new_avg != avg_prev else hold_atr_prev
+        avg_values.append(new_avg)
+        hold_atr_values.append(hold_atr)
+        avg_prev, hold_atr_prev = new_avg, hold_atr
+    return np.array(avg_values), np.array(hold_atr_values)
+
+
+def ref_predictive_ranges(df, length, mult):
+    atr = ref_atr(df, length).fillna(0) * mult
+    avg, hold_atr = compute_pred_ranges(df["close"].to_numpy(), atr.to_numpy())
+    return pd.DataFrame({"prR2": avg + hold_atr * 2, "prR1": avg + hold_atr, "avg": avg,
+                         "prS1": avg - hold_atr, "prS2": avg - hold_atr * 2}, index=df.index)
+
+
+def sideway_detection(df, bars_min_in_sideway, bars_ext_for_sideway, percent_change_sideway):
+    high, low = df["high"].to_numpy(), df["low"].to_numpy()
+    sideway_boxes = []
+    for i in range(bars_min_in_sideway, len(df)):
+        bar_cur_mid_price = (high[i] + low[i]) / 2
+        is_new_sideway = True
+        for j in range(1, bars_min_in_sideway + 1):
+            bar_pre_mid_price = (high[i - j] + low[i - j]) / 2
+            if abs(bar_cur_mid_price - bar_pre_mid_price) / bar_pre_mid_price * 100 > percent_change_sideway:
+                is_new_sideway = False
+                break
+        if not is_new_sideway:
+            continue
+        new_sideway_x = i - bars_min_in_sideway
+        top, bottom = max(high[new_sideway_x:i + 1]), min(low[new_sideway_x:i + 1])
+        if sideway_boxes and new_sideway_x <= sideway_boxes[-1][1] + bars_ext_for_sideway:
+            box = sideway_boxes[-1]
+            sideway_boxes[-1] = [box[0], i, max(box[2], top), min(box[3], bottom)]
+        else:
+            sideway_boxes.append([new_sideway_x, i, top, bottom])
+    return np.array(sideway_boxes, dtype=np.float64).reshape(-1, 4)
+
+
+def _candles(seed, size):
+    rng = np.random.default_rng(seed)
+    close = 100.0 + np.cumsum(rng.normal(0.0, 0.05, size))
+    return pd.DataFrame({"open": np.r_[close[0], close[:-1]], "high": close + rng.exponential(0.05, size),
+                         "low": close - rng.exponential(0.05, size), "close": close, "volume": np.ones(size)},
+                        index=pd.date_range("2024-01-01", periods=size, freq="1min"))
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1e3
+
+
+def main():
+    warm = _candles(0, 100)
+    predictive_ranges(warm["high"], warm["low"], warm["close"], 20, 6.0)  # compile outside the timing
+    nb_sideway_detection(warm["high"].to_numpy(), warm["low"].to_numpy(), 10, 5, 1.0)
+    print(f"{'bars':>9} {'ranges old ms':>14} {'new ms':>8} {'sideway old ms':>15} {'new ms':>8}")
+    for size in SIZES:
+        df = _candles(0, size)
+        high, low, close = (df[name].to_numpy() for name in ("high", "low", "close"))
+        old, ranges_old = _timed(lambda: ref_predictive_ranges(df, 200, 6.0))
+        new, ranges_new = _timed(lambda: predictive_ranges(high, low, close, 200, 6.0))
+        for name, values in new.items():
+            np.testing.assert_allclose(values, old[name], rtol=1e-12, err_msg=name)
+        old, sideway_old = _timed(lambda: sideway_detection(df, 10, 5, 0.2))
+        (_, new), sideway_new = _timed(lambda: nb_sideway_detection(high, low, 10, 5, 0.2))
+        np.testing.assert_array_equal(new, old)
+        print(f"{size:>9} {ranges_old:>14.1f} {ranges_new:>8.1f} {sideway_old:>15.1f} {sideway_new:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from atklip.controls.strategies.backtest import backtest
+
+MINUTE = 60_000
+
+
+def _bars(ohlc):
+    ohlc = np.asarray(ohlc, dtype=np.float64)
+    return {"time": np.arange(len(ohlc), dtype=np.int64) * MINUTE,
+            "open": ohlc[:, 0], "high": ohlc[:, 1], "low": ohlc[:, 2], "close": ohlc[:, 3]}
+
+
+def _signal(m, *bars):
+    x = np.zeros(m, dtype=bool)
+    x[list(bars)] = True
+    return x
+
+
+def _run(ohlc, long_at=(), short_at=(), **kwargs):
+    kwargs.setdefault("taker_fee", 0.0)
+    m = len(ohlc)
+    return backtest(_bars(ohlc), _signal(m, *long_at), _signal(m, *short_at), **kwargs)
+
+
+def _only_trade(result):
+    assert result.trades.size == 1
+    return result.trades[0]
+
+
+FLAT = [100, 100.5, 99.5, 100]
+
+
+def test_stop_loss():
+    trade = _only_trade(_run([FLAT, [100, 101, 97, 99], FLAT], long_at=[0], sl_pct=2))
+    assert (trade["entry_index"], trade["exit_index"], trade["reason"]) == (0, 1, 1)
+    assert trade["exit_price"] == pytest.approx(98) and trade["pnl"] == pytest.approx(-2)
+
+
+def test_take_profit():
+    trade = _only_trade(_run([FLAT, [100, 104, 99.5, 101], FLAT], long_at=[0], tp_pct=3))
+    assert trade["reason"] == 2 and trade["exit_price"] == pytest.approx(103)
+    assert trade["pnl"] == pytest.approx(3)
+
+
+def test_take_profit_from_the_risk_ratio_on_a_short():
+    stop_short = np.full(3, np.nan)
+    stop_short[0] = 102
+    trade = _only_trade(_run([FLAT, [100, 100.5, 95, 97], FLAT], short_at=[0], tp_ratio=2,
+                             stop_short=stop_short))
+    assert trade["side"] == -1 and trade["reason"] == 2 and trade["exit_price"] == pytest.approx(96)
+
+
+def test_bar_reaching_stop_and_target_counts_the_stop():
+    trade = _only_trade(_run([FLAT, [100, 104, 97, 101], FLAT], long_at=[0], sl_pct=2, tp_pct=3))
+    assert trade["reason"] == 1 and trade["exit_price"] == pytest.approx(98)
+
+
+@pytest.mark.parametrize("bar, reason, price", [([95, 96, 94, 95], 1, 95), ([105, 106, 104, 105], 2, 105)])
+def test_gap_beyond_a_level_fills_at_the_open(bar, reason, price):
+    trade = _only_trade(_run([FLAT, bar, FLAT], long_at=[0], sl_pct=2, tp_pct=3))
+    assert trade["reason"] == reason and trade["exit_price"] == pytest.approx(price)
+
+
+def test_trailing_stop_follows_the_high_of_surviving_bars():
+    # trail 5%: 95 at entry, 104.5 after the 110 high, hit on bar 2
+    trade = _only_trade(_run([FLAT, [100, 110, 101, 108], [106, 107, 104, 105], FLAT], long_at=[0],
+                             trail_pct=5))
+    assert (trade["exit_index"], trade["reason"]) == (2, 3)
+    assert trade["exit_price"] == pytest.approx(104.5) and trade["pnl"] == pytest.approx(4.5)
+
+
+def test_opposite_signal_reverses_or_only_closes():
+    ohlc = [FLAT, [100, 106, 99, 105], [105, 111, 104, 110], [110, 110, 104, 105]]
+    result = _run(ohlc, long_at=[0], short_at=[2])
+    closed, reversed_ = result.trades
+    assert (closed["side"], closed["exit_index"], closed["reason"]) == (1, 2, 0)
+    assert closed["pnl"] == pytest.approx(10)
+    assert (reversed_["side"], reversed_["entry_index"], reversed_["exit_index"], reversed_["reason"]) == (-1, 2, 3, 4)
+    assert reversed_["pnl"] == pytest.approx((110 - 105) * 100 / 110)
+
+    trade = _only_trade(_run(ohlc, long_at=[0], short_at=[2], reverse=False))
+    assert trade["reason"] == 0 and trade["pnl"] == pytest.approx(10)
+
+
+def test_exit_signal_closes_on_the_bar_close():
+    m = 3
+    result = backtest(_bars([FLAT, [100, 103, 99, 102], FLAT]), _signal(m, 0), _signal(m), long_exit=_signal(m, 1),
+                      taker_fee=0.0)
+    trade = _only_trade(result)
+    assert (trade["exit_index"], trade["reason"], trade["exit_price"]) == (1, 0, 102)
+
+
+def test_next_open_fills_on_the_next_bar_and_can_exit_on_it():
+    result = _run([FLAT, [102, 103, 99, 100], FLAT, FLAT], long_at=[0, 3], sl_pct=2, next_open=True)
+    trade = _only_trade(result)  # the signal on the last bar has no next open
+    assert (trade["entry_index"], trade["exit_index"], trade["reason"]) == (1, 1, 1)
+    assert trade["entry_price"] == 102 and trade["qty"] == pytest.approx(100 / 102)
+    assert trade["exit_price"] == pytest.approx(102 * 0.98)
+    assert result.equity[0] == 100
+
+
+def test_fees_on_both_legs():
+    result = _run([FLAT, [100, 111, 99, 110], FLAT], long_at=[0], short_at=[1], reverse=False, taker_fee=0.1)
+    trade = _only_trade(result)
+    assert trade["fee"] == pytest.approx(0.1 + 0.11) and trade["pnl"] == pytest.approx(10 - 0.21)
+    np.testing.assert_allclose(result.fees, [0.1, 0.11, 0.0])
+    assert result.total_fee == pytest.approx(0.21)
+    assert result.equity[0] == pytest.approx(100 - 0.1) and result.equity[-1] == pytest.approx(100 + 10 - 0.21)
+
+
+def test_compound_scales_the_margin_with_equity():
+    ohlc = [FLAT, [100, 151, 99, 150], [150, 151, 149, 150], [150, 151, 149, 150]]
+    first, second = _run(ohlc, long_at=[0, 2], short_at=[1], reverse=False, compound=True).trades
+    assert first["pnl"] == pytest.approx(50) and second["qty"] == pytest.approx(150 / 150)
+    first, second = _run(ohlc, long_at=[0, 2], short_at=[1], reverse=False).trades
+    assert second["qty"] == pytest.approx(100 / 150)
+
+
+def test_position_open_at_the_end_closes_on_the_last_close():
+    result = _run([FLAT, [100, 104, 99, 103], [103, 106, 102, 105]], long_at=[0])
+    trade = _only_trade(result)
+    assert (trade["exit_index"], trade["reason"], trade["exit_price"]) == (2, 4, 105)
+    np.testing.assert_allclose(result.equity, [100, 103, 105])
+    assert result.summary()["net_profit"] == pytest.approx(5)
+
+
+def test_no_new_position_once_the_equity_is_gone():
+    ohlc = [FLAT, [100, 100, 84, 85], FLAT, [100, 120, 99, 120], FLAT]
+    result = _run(ohlc, long_at=[0, 2], short_at=[1], reverse=False, leverage=10)
+    trade = _only_trade(result)
+    assert trade["pnl"] == pytest.approx(-150)
+    np.testing.assert_allclose(result.equity[1:], -50)
+
+
+def test_equity_stays_meaningful_on_a_random_walk():
+    rng = np.random.default_rng(3)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, 3000)))
+    ohlc = np.column_stack([close, close * 1.01, close * 0.99, close])
+    m = close.size
+    result = backtest(_bars(ohlc), rng.random(m) < 0.05, rng.random(m) < 0.05, leverage=20, taker_fee=0.05)
+    realized = 100 + np.cumsum(result.trades["pnl"])
+    assert realized[-1] <= 0 and np.flatnonzero(realized <= 0)[0] == realized.size - 1
+    last_exit = result.trades["exit_index"][-1]
+    np.testing.assert_array_equal(result.equity[last_exit:], realized[-1])
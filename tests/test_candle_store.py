@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from atklip.controls.candle.candle_store import CANDLE_STORE, nearest_row
+
+MINUTE = 60_000
+
+
+def _bars(seed, size, start=0):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, size))
+    _open = np.r_[close[0], close[:-1]]
+    high = np.maximum(_open, close) + rng.random(size)
+    low = np.minimum(_open, close) - rng.random(size)
+    times = (start + np.arange(size, dtype=np.int64)) * MINUTE
+    return times, _open, high, low, close, rng.random(size) * 10
+
+
+def _assert_rows(store, bars, first_index):
+    times, _open, high, low, close, volume = bars
+    assert len(store) == times.size
+    np.testing.assert_array_equal(store.get_indexs(), first_index + np.arange(times.size))
+    for name, expected in zip(("time", "open", "high", "low", "close", "volume"), bars):
+        np.testing.assert_array_equal(store.column(name), expected, err_msg=name)
+    np.testing.assert_allclose(store.column("hl2"), np.round((high + low) / 2, 6))
+    np.testing.assert_allclose(store.column("hlc3"), np.round((high + low + close) / 3, 6))
+    np.testing.assert_allclose(store.column("ohlc4"), np.round((_open + high + low + close) / 4, 6))
+    assert (store.first_index, store.last_index, store.last_time) == \
+           (first_index, first_index + times.size - 1, times[-1])
+
+
+def test_grows_on_both_sides():
+    bars = _bars(1, 3000, start=-1500)
+    store = CANDLE_STORE(capacity=16)
+    # live bars one at a time and scroll-back history in chunks, past several capacities
+    middle = older = 1500
+    store.extend(*(x[middle:middle + 10] for x in bars))
+    newer = middle + 10
+    for step in range(140):
+        for _ in range(10):
+            assert store.append(*(x[newer] for x in bars)) == newer - middle
+            newer += 1
+        chunk = 10 if step % 3 else 1
+        store.prepend(*(x[older - chunk:older] for x in bars))
+        older -= chunk
+        _assert_rows(store, tuple(x[older:newer] for x in bars), older - middle)
+    assert store.capacity >= len(store) and store.capacity > 16
+    # a prepend bigger than the free room in front
+    big = CANDLE_STORE(capacity=16)
+    big.load(*(x[2000:] for x in bars))
+    big.prepend(*(x[:2000] for x in bars))
+    _assert_rows(big, bars, -2000)
+
+
+def test_column_views_and_forming_bar():
+    bars = _bars(2, 100)
+    store = CANDLE_STORE(capacity=1024)
+    store.load(*bars)
+    close, df = store.column("close"), store.get_df()
+    assert np.shares_memory(close, store.get_values()[3])
+    assert np.shares_memory(df["close"].to_numpy(), close)
+    assert len(store.get_df(10)) == 10 and store.get_df(10)["index"].iloc[0] == 90
+    assert [x.size for x in store.columns(("open", "time"), -5)] == [5, 5]
+    np.testing.assert_array_equal(store.column("close", 10, 20), bars[4][10:20])
+
+    # ticks of the forming bar rewrite it in place and the views see them
+    _time = bars[0][-1]
+    assert store.update_last(_time, 1.0, 4.0, 0.5, 2.0, 7.0) == 99
+    assert close[-1] == 2.0 and df["close"].iloc[-1] == 2.0 and store.column("hl2")[-1] == 2.25
+    assert store.upsert(_time, 1.0, 5.0, 0.5, 3.0, 8.0) == (99, False)
+    assert store.get_row(-1) == (99, _time, 1.0, 5.0, 0.5, 3.0, 8.0)
+    assert store.upsert(_time + MINUTE, 3.0, 3.0, 3.0, 3.0, 0.0) == (100, True)
+    candle = store.get_last_candle()
+    assert (candle.index, candle.time, candle.ohlc4) == (100, _time + MINUTE, 3.0)
+    assert [c.index for c in store.get_n_last_candles(3)] == [98, 99, 100]
+    assert [c.index for c in store.get_n_first_candles(2)] == [0, 1]
+    with pytest.raises(IndexError):
+        store.get_row(101)
+    with pytest.raises(ValueError):
+        store.append(_time, 1.0, 1.0, 1.0, 1.0, 1.0)
+
+
+def test_empty_store():
+    store = CANDLE_STORE()
+    assert (len(store), store.first_index, store.last_index, store.last_time) == (0, 0, -1, -1)
+    assert store.get_times().size == 0 and store.get_df().empty
+    assert store.update_last(MINUTE, 1.0, 2.0, 0.5, 1.5, 1.0) == 0
+    store.reset()
+    assert len(store) == 0
+
+
+def _gapped_store(seed):
+    "bars with missing minutes, the first 200 of them loaded as scroll-back"
+    bars = _bars(seed, 1000)
+    keep = np.random.default_rng(seed).random(1000) > 0.3
+    bars = tuple(x[keep] for x in bars)
+    store = CANDLE_STORE(capacity=16)
+    store.load(*(x[200:] for x in bars))
+    store.prepend(*(x[:200] for x in bars))
+    return store, bars[0]
+
+
+def test_time_lookups_match_a_scan():
+    store, times = _gapped_store(3)
+    first = store.first_index
+    assert first == -200
+    probes = np.r_[times[0] - MINUTE, times, times + MINUTE // 2, times + MINUTE, times[-1] + 5 * MINUTE]
+    for t in probes.tolist():
+        exact = [i for i, x in enumerate(times) if x == t]
+        assert store.index_of_time(t) == (first + exact[0] if exact else -1)
+        before = [i for i, x in enumerate(times) if x <= t]
+        assert store.floor_index(t) == (first + before[-1] if before else -1)
+        distance = np.abs(times - t)
+        # earlier candle on ties
+        assert store.nearest_index(t) == first + int(np.flatnonzero(distance == distance.min())[0])
+
+    start, end = int(times[100]) + 1, int(times[700])
+    first_row, stop = store.rows_by_time(start, end)
+    inside = np.flatnonzero((times >= start) & (times <= end))
+    assert (first_row, stop) == (inside[0], inside[-1] + 1)
+    index, _time = store.slice_by_time(start, end, names=("index", "time"))
+    np.testing.assert_array_equal(_time, times[inside])
+    np.testing.assert_array_equal(index, first + inside)
+    assert store.rows_by_time() == (0, len(store))
+    assert store.rows_by_time(end, start) == (inside[-1], inside[-1])  # reversed bounds, empty
+    assert store.slice_by_time(times[-1] + 1)[0].size == 0
+    assert store.index_to_row(first) == 0 and store.index_to_row(store.last_index + 1) == -1
+
+
+def test_nearest_row():
+    values = np.array([10, 20, 30], dtype=np.int64)
+    assert [nearest_row(values, v) for v in (0, 10, 14, 15, 16, 25, 30, 99)] == [0, 0, 0, 0, 1, 1, 2, 2]
+    assert nearest_row(values[:0], 5) == -1
+    assert CANDLE_STORE().nearest_index(5) == -1 and CANDLE_STORE().floor_index(5) == -1
+
+
+@pytest.mark.parametrize("times", [[0, 2, 1], [0, 1, 1, 2], [3, 2]])
+def test_bulk_loads_reject_unsorted_or_duplicate_times(times):
+    times = np.array(times, dtype=np.int64) * MINUTE
+    ones = np.ones(times.size)
+    store = CANDLE_STORE()
+    store.load(*_bars(4, 10, start=100))
+    for method in (store.load, store.extend, store.prepend):
+        with pytest.raises(ValueError, match="sorted and unique"):
+            method(times, ones, ones, ones, ones, ones)
+    # nothing was written, the old bars are still there
+    _assert_rows(store, _bars(4, 10, start=100), 0)
+
+
+def test_bulk_loads_reject_overlaps():
+    store = CANDLE_STORE()
+    store.load(*_bars(5, 10, start=100))
+    with pytest.raises(ValueError):
+        store.extend(*_bars(5, 3, start=109))
+    with pytest.raises(ValueError):
+        store.prepend(*_bars(5, 3, start=98))
+    assert len(store) == 10
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import pytest
+
+from atklip.controls.pandas_ta.utils._fast_ma import NB_MA, fast_ma
+
+
+# batch references, written like the pandas_ta functions the kernels stand in for
+
+def ref_ema(x, n):
+    "pandas_ta ema, presma: seeded with the sma of the first n values"
+    s = pd.Series(x).copy()
+    first = s.first_valid_index()
+    if first is None or first + n > len(s):
+        return np.full(len(s), np.nan)
+    s.iloc[:first + n - 1] = np.nan
+    s.iloc[first + n - 1] = np.nanmean(x[first:first + n])
+    return s.ewm(span=n, adjust=False).mean().to_numpy()
+
+
+def ref_rma(x, n):
+    return pd.Series(x).ewm(alpha=1.0 / n, adjust=False).mean().to_numpy()
+
+
+def ref_smma(x, n):
+    result = np.full(len(x), np.nan)
+    result[n - 1] = np.mean(x[:n])
+    for i in range(n, len(x)):
+        result[i] = ((n - 1) * result[i - 1] + x[i]) / n
+    return result
+
+
+def ref_t3(x, n, a=0.7):
+    e = [ref_ema(x, n)]
+    for _ in range(5):
+        e.append(ref_ema(e[-1], n))
+    c1, c2 = -a * a ** 2, 3 * a ** 2 + 3 * a ** 3
+    c3, c4 = -6 * a ** 2 - 3 * a - 3 * a ** 3, a ** 3 + 3 * a ** 2 + 3 * a + 1
+    return c1 * e[5] + c2 * e[4] + c3 * e[3] + c4 * e[2]
+
+
+def ref_jma(x, n, phase=0.0):
+    sum_length, length = 10, 0.5 * (n - 1)
+    pr = 0.5 if phase < -100 else 2.5 if phase > 100 else 1.5 + phase * 0.01
+    length1 = max(np.log(np.sqrt(length)) / np.log(2.0) + 2.0, 0)
+    pow1 = max(length1 - 2.0, 0.5)
+    length2 = length1 * np.sqrt(length)
+    bet = length2 / (length2 + 1)
+    beta = 0.45 * (n - 1) / (0.45 * (n - 1) + 2.0)
+    jma, volty, v_sum = np.zeros(x.size), np.zeros(x.size), np.zeros(x.size)
+    det0 = det1 = 0.0
+    jma[0] = ma1 = u_band = l_band = x[0]
+    for i in range(1, x.size):
+        price = x[i]
+        del1, del2 = price - u_band, price - l_band
+        volty[i] = max(abs(del1), abs(del2)) if abs(del1) != abs(del2) else 0.0
+        v_sum[i] = v_sum[i - 1] + (volty[i] - volty[max(i - sum_length, 0)]) / sum_length
+        avg_volty = np.mean(v_sum[max(i - 65, 0):i + 1])
+        d_volty = 0.0 if avg_volty == 0 else volty[i] / avg_volty
+        r_volty = max(1.0, min(np.power(length1, 1.0 / pow1), d_volty))
+        pow2 = np.power(r_volty, pow1)
+        kv = np.power(bet, np.sqrt(pow2))
+        u_band = price if del1 > 0 else price - kv * del1
+        l_band = price if del2 < 0 else price - kv * del2
+        alpha = np.power(beta, pow2)
+        ma1 = (1 - alpha) * price + alpha * ma1
+        det0 = (price - ma1) * (1 - beta) + beta * det0
+        ma2 = ma1 + pr * det0
+        det1 = (ma2 - jma[i - 1]) * (1 - alpha) * (1 - alpha) + alpha * alpha * det1
+        jma[i] = jma[i - 1] + det1
+    jma[:n - 1] = np.nan
+    return jma
+
+
+def ref_kama(x, n, fast=2, slow=30):
+    s = pd.Series(x)
+    fr, sr = 2 / (fast + 1), 2 / (slow + 1)
+    eps = np.finfo(float).eps
+    abs_diff = (s - s.shift(n)).replace(0, eps).abs()
+    peer_diff_sum = (s - s.shift(1)).replace(0, eps).abs().rolling(n).sum()
+    sc = ((abs_diff / peer_diff_sum) * (fr - sr) + sr).to_numpy() ** 2
+    result = np.full(x.size, np.nan)
+    result[n - 1] = x[n - 1]
+    for i in range(n, x.size):
+        result[i] = sc[i] * x[i] + (1 - sc[i]) * result[i - 1]
+    return result
+
+
+def ref_vidya(x, n):
+    s = pd.Series(x)
+    mom = s.diff(1)
+    pos_sum, neg_sum = mom.clip(lower=0).rolling(n).sum(), mom.clip(upper=0).abs().rolling(n).sum()
+    cmo = ((pos_sum - neg_sum) / (pos_sum + neg_sum)).abs().to_numpy()
+    alpha = 2 / (n + 1)
+    result = np.full(x.size, np.nan)
+    result[n - 1] = s.iloc[:n].mean()
+    for i in range(n, x.size):
+        result[i] = alpha * cmo[i] * x[i] + result[i - 1] * (1 - alpha * cmo[i])
+    return result
+
+
+def ref_mcgd(x, n, c=1.0):
+    result = np.empty(x.size)
+    result[0] = x[0]
+    for i in range(1, x.size):
+        denom = max(c * n * (x[i] / result[i - 1]) ** 4, 1e-10)
+        result[i] = result[i - 1] + (x[i] - result[i - 1]) / denom
+    return result
+
+
+def ref_hwma(x, n=None, na=0.2, nb=0.1, nc=0.1):
+    result = np.empty(x.size)
+    last_a, last_v, last_f = 0.0, 0.0, x[0]
+    for i in range(x.size):
+        f = (1.0 - na) * (last_f + last_v + 0.5 * last_a) + na * x[i]
+        v = (1.0 - nb) * (last_v + last_a) + nb * (f - last_f)
+        a = (1.0 - nc) * last_a + nc * (v - last_v)
+        result[i] = f + v + 0.5 * a
+        last_a, last_f, last_v = a, f, v
+    return result
+
+
+def _weighted(x, w):
+    "rolling dot with w laid out oldest to newest"
+    return pd.Series(x).rolling(w.size).apply(lambda v: np.dot(v, w), raw=True).to_numpy()
+
+
+def ref_alma(x, n, sigma=6.0, distribution_offset=0.85):
+    m, s = distribution_offset * (n - 1), n / sigma
+    w = np.array([np.exp(-1 * ((i - m) * (i - m)) / (2 * s * s)) for i in range(n)])
+    return _weighted(x, (w / w.sum())[::-1])
+
+
+def ref_sinwma(x, n):
+    w = np.array([np.sin((i + 1) * np.pi / (n + 1)) for i in range(n)])
+    return _weighted(x, w / w.sum())
+
+
+def ref_fwma(x, n):
+    fibs = [1, 1]
+    while len(fibs) < n:
+        fibs.append(fibs[-1] + fibs[-2])
+    w = np.array(fibs[:n], dtype=np.float64)
+    return _weighted(x, w / w.sum())
+
+
+def ref_zlma(x, n):
+    lag = int(0.5 * (n - 1))
+    return ref_ema(2 * x - pd.Series(x).shift(lag).to_numpy(), n)
+
+
+REFERENCES = {
+    "sma": lambda x, n: pd.Series(x).rolling(n).mean().to_numpy(),
+    "ema": ref_ema,
+    "rma": ref_rma,
+    "smma": ref_smma,
+    "wma": lambda x, n: _weighted(x, np.arange(1, n + 1) / (n * (n + 1) / 2)),
+    "dema": lambda x, n: 2 * ref_ema(x, n) - ref_ema(ref_ema(x, n), n),
+    "tema": lambda x, n: 3 * (ref_ema(x, n) - ref_ema(ref_ema(x, n), n)) + ref_ema(ref_ema(ref_ema(x, n), n), n),
+    "t3": ref_t3,
+    "jma": ref_jma,
+    "kama": ref_kama,
+    "vidya": ref_vidya,
+    "mcgd": ref_mcgd,
+    "hwma": ref_hwma,
+    "alma": ref_alma,
+    "zlma": ref_zlma,
+    "sinwma": ref_sinwma,
+    "fwma": ref_fwma,
+}
+
+
+def random_walk(seed, size=2000):
+    rng = np.random.default_rng(seed)
+    return 100.0 + np.cumsum(rng.normal(0.0, 0.5, size))
+
+
+def test_every_kernel_has_a_reference():
+    assert set(NB_MA) == set(REFERENCES)
+
+
+@pytest.mark.parametrize("mamode", list(REFERENCES))
+@pytest.mark.parametrize("length", [2, 7, 20])
+def test_fast_ma_matches_pandas(mamode, length):
+    x = random_walk(length)
+    result = fast_ma(mamode, pd.Series(x), length)
+    assert result.name == f"{mamode.upper()}_{length}"
+    np.testing.assert_allclose(result.to_numpy(), REFERENCES[mamode](x, length), rtol=1e-9, atol=1e-9)
+
+
+def test_rma_is_unseeded_ewm_over_leading_and_inner_nan():
+    x = random_walk(4, 500)
+    x[:5] = np.nan
+    x[[40, 41, 200]] = np.nan
+    np.testing.assert_allclose(NB_MA["rma"](x, 14), ref_rma(x, 14), rtol=1e-12)
+    assert not np.isnan(NB_MA["rma"](x, 14)[5:]).any()
+
+
+def test_short_source_is_all_nan():
+    assert fast_ma("ema", pd.Series([1.0, 2.0]), 5).isna().all()
+    with pytest.raises(KeyError):
+        fast_ma("nope", pd.Series([1.0]), 1)
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from atklip.controls.chart_patterns.fast_patterns import (CHART_PATTERN_SCANNER, PATTERN_LABELS, nb_find_pivots,
+                                                          nb_rolling_linreg, pattern_codes)
+
+
+def _bars(seed, size, level=100.0):
+    rng = np.random.default_rng(seed)
+    close = level + np.cumsum(rng.normal(0, 1, size))
+    _open = np.r_[close[0], close[:-1]]
+    high = np.maximum(_open, close) + rng.random(size)
+    low = np.minimum(_open, close) - rng.random(size)
+    return high, low, close
+
+
+@pytest.mark.parametrize("n, size, level", [(2, 300, 100.0), (5, 3000, 100.0), (14, 5000, 30_000.0),
+                                            (50, 2000, 1.0)])
+def test_rolling_linreg_matches_lstsq(n, size, level):
+    _, _, close = _bars(n, size, level)
+    slope, intercept = nb_rolling_linreg(close, n)
+    assert np.isnan(slope[:n]).all() and np.isnan(intercept[:n]).all()
+    for i in range(n, size):
+        # the window ends at bar i - 1, bar i itself is left out
+        x = np.arange(i - n, i, dtype=np.float64)
+        (b, a), *_ = np.linalg.lstsq(np.column_stack((x, np.ones(n))), close[i - n:i], rcond=None)
+        assert slope[i] == pytest.approx(b, rel=1e-7, abs=1e-9)
+        assert intercept[i] == pytest.approx(a, rel=1e-7, abs=1e-6 * level)
+
+
+def test_rolling_linreg_short_series():
+    for n, size in ((2, 2), (1, 10), (5, 3)):
+        slope, intercept = nb_rolling_linreg(np.arange(size, dtype=np.float64), n)
+        assert np.isnan(slope).all() and np.isnan(intercept).all()
+
+
+def _assert_batch(scanner, bars, size, window, threshold, trend_window):
+    high, low, close = (x[:size] for x in bars)
+    fresh = CHART_PATTERN_SCANNER(window, threshold, trend_window)
+    fresh.load(high, low, close)
+    assert len(scanner) == size
+    for name in PATTERN_LABELS:
+        np.testing.assert_array_equal(scanner.codes[name], fresh.codes[name], err_msg=name)
+    np.testing.assert_array_equal(scanner.pivots, fresh.pivots)
+    np.testing.assert_allclose(scanner.slope, fresh.slope, rtol=1e-9, atol=1e-9)
+    np.testing.assert_allclose(scanner.intercept, fresh.intercept, rtol=1e-9)
+
+
+@pytest.mark.parametrize("window, threshold, trend_window, loaded", [(3, 0.05, 2, 0), (5, 0.01, 7, 40),
+                                                                     (10, 0.02, 3, 500)])
+def test_scanner_live_matches_batch(window, threshold, trend_window, loaded):
+    bars = _bars(window, 1500)
+    scanner = CHART_PATTERN_SCANNER(window, threshold, trend_window, capacity=64)
+    scanner.load(*(x[:loaded] for x in bars))
+    for i in range(loaded, bars[0].size):
+        high, low, close = (x[i] for x in bars)
+        # the forming bar opens flat at the previous close, then reaches its final values
+        opened = close if i == 0 else bars[2][i - 1]
+        codes = scanner.add(opened, opened, opened)
+        assert set(codes) == set(PATTERN_LABELS)
+        scanner.update(max(high, opened), min(low, opened), (opened + close) / 2)
+        codes = scanner.update(high, low, close)
+        if i % 250 == 0 or i == bars[0].size - 1:
+            _assert_batch(scanner, bars, i + 1, window, threshold, trend_window)
+            expected = pattern_codes(*(x[:i + 1] for x in bars), window, threshold)
+            assert codes == {name: int(values[-1]) for name, values in expected.items()}
+    np.testing.assert_array_equal(scanner.pivots, nb_find_pivots(bars[0], bars[1]))
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from atklip.controls.strategies.genetic import GENETIC_OPTIMIZER
+
+HOUR = 60 * 60_000
+CALLS = []
+
+
+def crossing_signals(candles, fast=2, slow=5):
+    CALLS.append((fast, slow))
+    close = candles["close"]
+    fast_ma = np.convolve(close, np.ones(fast) / fast)[:close.size]
+    slow_ma = np.convolve(close, np.ones(slow) / slow)[:close.size]
+    return {"long_entry": fast_ma > slow_ma, "short_entry": fast_ma < slow_ma}
+
+
+HYPERPARAMETERS = [{"name": "fast", "type": int, "min": 2, "max": 6},
+                   {"name": "slow", "type": int, "min": 8, "max": 20}]
+
+
+def _candles(m=24 * 60):
+    close = 100 + np.cumsum(np.random.default_rng(11).normal(0, 0.5, m))
+    return {"time": np.arange(m, dtype=np.int64) * HOUR, "open": close, "high": close + 0.3,
+            "low": close - 0.3, "close": close}
+
+
+def _optimizer(**kwargs):
+    return GENETIC_OPTIMIZER(crossing_signals, HYPERPARAMETERS, {"taker_fee": 0.0}, population_size=12,
+                             generations=6, elitism=3, seed=4, executor=None, **kwargs)
+
+
+def test_elites_survive_and_cached_sets_are_not_backtested():
+    CALLS.clear()
+    optimizer = _optimizer()
+    history = []
+    ranking = optimizer.run(_candles(), callback=lambda generation, o: history.append(list(o.population)))
+    assert len(history) == 7 and all(len(population) == 12 for population in history)
+    for before, after in zip(history, history[1:]):
+        assert set(before[:3]) <= set(after)
+        assert after[0][0] <= before[0][0]
+    assert optimizer.evaluated == len(CALLS) == len(set(CALLS)) == len(optimizer.cache)
+    assert optimizer.evaluated < 12 * 7
+    assert ranking[0][1] == -history[-1][0][0] and optimizer.best == ranking[0]
+    assert len({tuple(params.values()) for params, _, _ in ranking}) == len(ranking)
+
+
+def test_same_seed_same_run_and_cancel_stops_it():
+    first = _optimizer().run(_candles())
+    assert _optimizer().run(_candles()) == first
+
+    generations = []
+
+    def cancel_after_two(generation, optimizer):
+        generations.append(generation)
+        if generation == 2:
+            optimizer.cancel()
+
+    _optimizer().run(_candles(), callback=cancel_after_two)
+    assert generations == [0, 1, 2]
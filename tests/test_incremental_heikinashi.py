@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from atklip.controls.candle.incremental_heikinashi import INCREMENTAL_HEIKINASHI
+from atklip.controls.pandas_ta.utils._numba import np_ha
+
+MINUTE = 60_000
+
+
+def _bars(seed, size=400):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, size))
+    _open = np.r_[close[0], close[:-1]] + rng.normal(0, 0.2, size)
+    high = np.maximum(_open, close) + rng.random(size)
+    low = np.minimum(_open, close) - rng.random(size)
+    return np.arange(size, dtype=np.int64) * MINUTE, _open, high, low, close, rng.random(size) * 10
+
+
+def _ticks(row):
+    "partial states of a forming bar, ending with its final values"
+    _time, _open, high, low, close, volume = row
+    yield _time, _open, _open, _open, _open, 0.0
+    yield _time, _open, max(_open, close), min(_open, close), close, volume / 2
+    yield row
+
+
+def _assert_batch(source, bars, size):
+    expected = np_ha(*(np.ascontiguousarray(x[:size]) for x in bars[1:5]))
+    assert len(source) == size
+    for name, x in zip(("open", "high", "low", "close"), expected):
+        np.testing.assert_allclose(source.store.column(name), x, rtol=1e-12)
+    np.testing.assert_array_equal(source.get_times(), bars[0][:size])
+
+
+@pytest.mark.parametrize("loaded", [0, 1, 2, 150])
+def test_streamed_bars_equal_the_batch_heikinashi(loaded):
+    bars = _bars(loaded)
+    source = INCREMENTAL_HEIKINASHI()
+    source.load(*(x[:loaded] for x in bars))
+    for i in range(loaded, bars[0].size):
+        for k, tick in enumerate(_ticks(tuple(x[i] for x in bars))):
+            assert source.update(*tick) == (i, k == 0)
+        if i % 50 == 0:
+            _assert_batch(source, bars, i + 1)
+    _assert_batch(source, bars, bars[0].size)
+
+
+def test_final_tick_fed_with_the_next_bar():
+    bars = _bars(9)
+    source = INCREMENTAL_HEIKINASHI()
+    source.load(*(x[:100] for x in bars))
+    for i in range(100, bars[0].size):
+        # the exchange returns the closed bar with the first tick of the new
+        # one: the final tick of the closed bar was never seen live
+        closed, row = (tuple(x[j] for x in bars) for j in (i - 1, i))
+        assert source.update_rows([tuple(x[i - 2] for x in bars), closed, next(_ticks(row))]) == (i, True)
+    source.update(*(x[-1] for x in bars))
+    _assert_batch(source, bars, bars[0].size)
+
+
+def test_reload_after_scroll_back():
+    bars = _bars(4)
+    source = INCREMENTAL_HEIKINASHI()
+    source.load(*(x[200:] for x in bars))
+    source.load(*bars)
+    _assert_batch(source, bars, bars[0].size)
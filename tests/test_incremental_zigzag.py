@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from atklip.controls.pandas_ta.utils._nb_rolling import nb_rolling_hl
+from atklip.controls.pandas_ta.utils._numba import nb_find_zigzags, nb_map_zigzag
+from atklip.controls.trend.incremental_zigzag import INCREMENTAL_ZIGZAG
+
+
+def _bars(seed, size):
+    rng = np.random.default_rng(seed)
+    close = 100.0 * np.exp(np.cumsum(rng.normal(0.0, 0.01, size)))
+    _open = np.r_[close[0], close[:-1]]
+    high = np.maximum(_open, close) * (1 + rng.exponential(0.003, size))
+    low = np.minimum(_open, close) * (1 - rng.exponential(0.003, size))
+    return high, low
+
+
+def _batch(high, low, legs, deviation):
+    "the pandas_ta zigzag pivots of the bars, oldest first; the last bar is the forming one"
+    idx, swing, value = nb_rolling_hl(high, low, legs)
+    zz = nb_find_zigzags(idx, swing, value, deviation)
+    return tuple(x[::-1] for x in zz)
+
+
+def _assert_batch(zigzag, high, low, legs, deviation):
+    k = len(zigzag)
+    bar, swing, value, dev = _batch(high[:k], low[:k], legs, deviation)
+    got = zigzag.pivots
+    np.testing.assert_array_equal(got[0], bar.astype(np.int64))
+    np.testing.assert_array_equal(got[1], swing)
+    np.testing.assert_array_equal(got[2], value)
+    np.testing.assert_allclose(got[3][1:], dev[1:], rtol=1e-9)
+    for x, y in zip(zigzag.zigzag_map(), nb_map_zigzag(bar[::-1].copy(), swing[::-1].copy(), value[::-1].copy(),
+                                                       got[3][::-1].copy(), k)):
+        np.testing.assert_array_equal(x, y)
+
+
+@pytest.mark.parametrize("legs, deviation, loaded", [(10, 5.0, 40), (4, 2.0, 200), (7, 1.0, 30)])
+def test_bar_by_bar_matches_batch(legs, deviation, loaded):
+    high, low = _bars(legs, 2500)
+    zigzag = INCREMENTAL_ZIGZAG(legs, deviation, capacity=16)
+    zigzag.load(high[:loaded], low[:loaded])
+    _assert_batch(zigzag, high, low, legs, deviation)
+    cuts = {loaded + 1, 301, 777, 1234, 2000, high.size}
+    for i in range(loaded, high.size):
+        # the forming bar opens flat, then its ticks reach the final range
+        mid = 0.5 * (high[i] + low[i])
+        before = zigzag.pivots
+        zigzag.add(mid, mid)
+        zigzag.update(high[i], low[i])
+        after = zigzag.pivots
+        assert zigzag.changed_from <= after[0].size
+        np.testing.assert_array_equal(after[0][:zigzag.changed_from], before[0][:zigzag.changed_from])
+        if i + 1 in cuts:
+            _assert_batch(zigzag, high, low, legs, deviation)
+
+
+def test_forming_bar_ticks_leave_the_pivots():
+    high, low = _bars(5, 600)
+    zigzag = INCREMENTAL_ZIGZAG(6, 2.0)
+    zigzag.load(high, low)
+    pivots = zigzag.pivots
+    zigzag.update(high[-1] * 1.5, low[-1] * 0.5)
+    for x, y in zip(zigzag.pivots, pivots):
+        np.testing.assert_array_equal(x, y)
+
+
+def test_final_tick_fed_with_the_next_bar():
+    legs, deviation = 6, 2.0
+    high, low = _bars(7, 1500)
+    times = np.arange(high.size, dtype=np.int64) * 60_000
+    rows = [(t, 0.0, h, l, 0.0, 1.0) for t, h, l in zip(times, high, low)]
+    zigzag = INCREMENTAL_ZIGZAG(legs, deviation, capacity=16)
+    zigzag.load(high[:100], low[:100], times[:100])
+    for i in range(100, high.size):
+        # the closed bar comes back with its final tick and the first tick of
+        # the new bar, the bar before is skipped
+        mid = 0.5 * (high[i] + low[i])
+        before = zigzag.pivots
+        assert zigzag.update_rows([rows[i - 2], rows[i - 1], (times[i], 0.0, mid, mid, 0.0, 1.0)]) == (i, True)
+        np.testing.assert_array_equal(zigzag.pivots[0][:zigzag.changed_from], before[0][:zigzag.changed_from])
+        if i % 250 == 0:
+            _assert_batch(zigzag, high, low, legs, deviation)
+    assert zigzag.update_rows([rows[-1]]) == (high.size - 1, False)
+    assert zigzag.last_time == times[-1]
+    _assert_batch(zigzag, high, low, legs, deviation)
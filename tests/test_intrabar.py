@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from atklip.controls.strategies.backtest import backtest
+from atklip.controls.strategies.intrabar import INTRABAR_ROWS
+
+MINUTE = 60_000
+HOUR = 60 * MINUTE
+SL, TP = 1.0, 1.5
+
+
+class COUNTING_ROWS(INTRABAR_ROWS):
+    def __init__(self, rows, span):
+        super().__init__(rows, span)
+        self.reads = []
+
+    def read(self, start, end):
+        self.reads.append((start, end))
+        return super().read(start, end)
+
+
+def _minutes(seed, hours):
+    """1m rows over `hours` hourly buckets starting at :30, with whole hours
+    and single minutes missing. Inside an hour each open is the previous
+    close, so only bar opens gap and the OHLC rule of a bar reaching one
+    level agrees with a minute replay."""
+    rng = np.random.default_rng(seed)
+    times = HOUR // 2 + np.arange(hours * 60, dtype=np.int64) * MINUTE
+    keep = rng.random(times.size) > 0.02
+    keep &= np.repeat(rng.random(hours) > 0.1, 60)
+    times = times[keep]
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.004, keep.size)))[keep]
+    _open = np.r_[close[0], close[:-1]]
+    new_hour = np.r_[True, np.diff((times - HOUR // 2) // HOUR) != 0]
+    _open[new_hour] *= np.exp(rng.normal(0, 0.003, new_hour.sum()))
+    wick = np.abs(rng.normal(0, 0.0008, (2, times.size))) * close
+    high = np.maximum(_open, close) + wick[0]
+    low = np.minimum(_open, close) - wick[1]
+    return np.column_stack([times, _open, high, low, close, np.ones(times.size)])
+
+
+def _hours(rows):
+    bucket = (rows[:, 0] - HOUR // 2) // HOUR
+    starts = np.flatnonzero(np.r_[True, np.diff(bucket) != 0])
+    ends = np.r_[starts[1:], rows.shape[0]]
+    return {"time": (bucket[starts] * HOUR + HOUR // 2).astype(np.int64),
+            "open": rows[starts, 1],
+            "high": np.maximum.reduceat(rows[:, 2], starts),
+            "low": np.minimum.reduceat(rows[:, 3], starts),
+            "close": rows[ends - 1, 4]}, starts, ends
+
+
+def _reference(hours, rows, starts, ends, long_entry, next_open):
+    "every minute of an open position checked in time order, the stop first"
+    trades, pos, pending = [], None, False
+    m = hours["close"].size
+    for i in range(m):
+        if pending:
+            pos, pending = (i, hours["open"][i]), False
+        if pos is not None and (pos[0] < i or next_open):
+            stop, target = pos[1] * (1 - SL / 100), pos[1] * (1 + TP / 100)
+            for o, h, l in rows[starts[i]:ends[i], 1:4]:
+                if l <= stop:
+                    trades.append((pos[0], i, min(o, stop), 1))
+                elif h >= target:
+                    trades.append((pos[0], i, max(o, target), 2))
+                else:
+                    continue
+                pos = None
+                break
+        if pos is None and not pending and long_entry[i]:
+            if not next_open:
+                pos = (i, hours["close"][i])
+            elif i + 1 < m:
+                pending = True
+    if pos is not None:
+        trades.append((pos[0], m - 1, hours["close"][-1], 4))
+    return trades
+
+
+def _ambiguous(hours, trades):
+    "exit bars of the trades that reach both the stop and the target"
+    entry, i = trades["entry_price"], trades["exit_index"]
+    return (hours["low"][i] <= entry * (1 - SL / 100)) & (hours["high"][i] >= entry * (1 + TP / 100))
+
+
+@pytest.mark.parametrize("next_open", [False, True])
+def test_intrabar_fills_match_a_per_minute_replay(next_open):
+    rows = _minutes(7, 600)
+    hours, starts, ends = _hours(rows)
+    m = hours["close"].size
+    long_entry = np.random.default_rng(1).random(m) < 0.2
+    span = 5 * HOUR  # segments start on the hour, so bars at :30 straddle them
+    intrabar = COUNTING_ROWS(rows, span)
+
+    result = backtest(hours, long_entry, None, sl_pct=SL, tp_pct=TP, taker_fee=0.0, next_open=next_open,
+                      intrabar=intrabar)
+    expected = _reference(hours, rows, starts, ends, long_entry, next_open)
+    got = [(int(t["entry_index"]), int(t["exit_index"]), t["exit_price"], int(t["reason"])) for t in result.trades]
+    assert [g[:2] + g[3:] for g in got] == [e[:2] + e[3:] for e in expected]
+    np.testing.assert_allclose([g[2] for g in got], [e[2] for e in expected])
+
+    ohlc_only = backtest(hours, long_entry, None, sl_pct=SL, tp_pct=TP, taker_fee=0.0, next_open=next_open)
+    assert ohlc_only.trades.size and not np.array_equal(ohlc_only.trades["reason"], result.trades["reason"])
+
+    ambiguous = result.trades[_ambiguous(hours, result.trades)]
+    assert ambiguous.size
+    straddling = (hours["time"][ambiguous["exit_index"]] + HOUR) // span > hours["time"][ambiguous["exit_index"]] // span
+    assert straddling.any()
+    if next_open:  # stopped right after opening the pending entry, then resumed on the same bar
+        assert (ambiguous["entry_index"] == ambiguous["exit_index"]).any()
+    # only the segments holding an ambiguous bar are read
+    assert len(intrabar.reads) <= ambiguous.size
+    assert {start for start, _ in intrabar.reads} <= set(hours["time"][ambiguous["exit_index"]].tolist())
+
+
+def test_bars_without_sub_bars_fall_back_to_ohlc():
+    rows = _minutes(3, 200)
+    hours, _, _ = _hours(rows)
+    m = hours["close"].size
+    long_entry = np.random.default_rng(2).random(m) < 0.2
+    kwargs = dict(sl_pct=SL, tp_pct=TP, taker_fee=0.0)
+    empty = INTRABAR_ROWS(np.empty((0, 6)))
+    expected = backtest(hours, long_entry, None, **kwargs).trades
+    np.testing.assert_array_equal(backtest(hours, long_entry, None, intrabar=empty, **kwargs).trades, expected)
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from atklip.controls.stream_kernels import ATR_KERNEL
+from atklip.controls.tradingview.mtf_support_resistance import (MTF_SUPPORT_RESISTANCE, SR_LEVEL, SR_LEVELS,
+                                                                merge_sr_levels)
+from atklip.exchanges.ohlcv_cache import bar_open_time, timeframe_to_ms
+
+MINUTE = 60_000
+TIMEFRAMES = ["5m", "15m", "1h"]
+
+
+def _bars(seed, size, holes=0.0, step=MINUTE):
+    "base bars of `step` ms, a `holes` share of them missing"
+    rng = np.random.default_rng(seed)
+    times = 1_700_000_000_000 // step * step + np.arange(size, dtype=np.int64) * step
+    close = 100.0 + np.cumsum(rng.normal(0.0, 0.3, size))
+    _open = np.r_[close[0], close[:-1]]
+    high = np.round(np.maximum(_open, close) + rng.exponential(0.1, size), 2)
+    low = np.round(np.minimum(_open, close) - rng.exponential(0.1, size), 2)
+    keep = rng.random(size) >= holes
+    return tuple(x[keep] for x in (times, _open, high, low, close, np.ones(size)))
+
+
+def ref_levels(high, low, close, atr, pivot_length, tolerance):
+    "bar by bar: pivots confirmed pivot_length bars later, then retested or broken by the following bars"
+    rows = []
+    for i in range(pivot_length, close.size - pivot_length):
+        window = slice(i - pivot_length, i + pivot_length + 1)
+        for side, price, is_pivot in ((1, high[i], high[window].max() <= high[i]),
+                                      (-1, low[i], low[window].min() >= low[i])):
+            if not is_pivot:
+                continue
+            retests, last_retest, broken, touching = 0, -1, -1, False
+            for j in range(i + pivot_length + 1, close.size):
+                if close[j] > price if side == 1 else close[j] < price:
+                    broken = j
+                    break
+                tol = 0.0 if np.isnan(atr[j]) else atr[j] * tolerance
+                touch = high[j] >= price - tol and low[j] <= price + tol
+                if touch and not touching:
+                    retests += 1
+                    last_retest = j
+                touching = touch
+            rows.append((i, side, price, retests, last_retest, broken))
+    return rows
+
+
+@pytest.mark.parametrize("pivot_length, tolerance", [(3, 0.5), (10, 0.2), (5, 0.0)])
+def test_level_scan_matches_a_bar_by_bar_reference(pivot_length, tolerance):
+    times, _, high, low, close, _ = _bars(pivot_length, 3000)
+    sr = SR_LEVELS(pivot_length, 14, tolerance, capacity=8)
+    levels = sr.load(times, high, low, close)
+    atr = ATR_KERNEL(14, "rma").load(high, low, close)
+    expected = ref_levels(high, low, close, atr, pivot_length, tolerance)
+    assert len(levels) == len(expected) > 0
+    for level, (i, side, price, retests, last_retest, broken) in zip(levels, expected):
+        assert (level["start_time"], level["sr_type"], level["price"], level["strength"]) == \
+               (times[i], side, price, retests + 1)
+        assert level["last_retest"] == (times[last_retest] if last_retest >= 0 else -1)
+        assert level["break_time"] == (times[broken] if broken >= 0 else -1)
+
+
+def ref_merge(levels, percent, min_strength):
+    "each valid level joins the group of its type whose first price it is within percent % above"
+    groups = []
+    for level in sorted((x for x in levels if x["strength"] >= min_strength and x["break_time"] < 0),
+                        key=lambda x: (x["sr_type"], x["price"])):
+        for group in groups:
+            first = group[0]
+            if first["sr_type"] == level["sr_type"] and 0 <= level["price"] - first["price"] <= \
+                    first["price"] * percent / 100 and group is groups[-1]:
+                group.append(level)
+                break
+        else:
+            groups.append([level])
+    merged = []
+    for group in groups:
+        strength = sum(int(x["strength"]) for x in group)
+        merged.append((sum(x["price"] * x["strength"] for x in group) / strength, group[0]["sr_type"], strength,
+                       max(x["timeframe"] for x in group), min(x["start_time"] for x in group)))
+    return merged
+
+
+@pytest.mark.parametrize("percent, min_strength", [(0.1, 1), (1.0, 1), (0.5, 2)])
+def test_merge_matches_pairwise_grouping(percent, min_strength):
+    rng = np.random.default_rng(int(percent * 10) + min_strength)
+    levels = np.empty(400, dtype=SR_LEVEL)
+    levels["price"] = np.round(rng.uniform(95, 105, levels.size), 2)
+    levels["sr_type"] = rng.choice([1, -1], levels.size)
+    levels["strength"] = rng.integers(1, 5, levels.size)
+    levels["timeframe"] = rng.integers(0, 3, levels.size)
+    levels["start_time"] = rng.integers(0, 10_000, levels.size)
+    levels["break_time"] = np.where(rng.random(levels.size) < 0.2, 5, -1)
+    levels["last_retest"] = -1
+    merged = merge_sr_levels(levels, percent, min_strength)
+    expected = ref_merge(levels, percent, min_strength)
+    assert merged.size == len(expected)
+    for got, (price, sr_type, strength, timeframe, start_time) in zip(merged, expected):
+        assert got["price"] == pytest.approx(price)
+        assert (got["sr_type"], got["strength"], got["timeframe"], got["start_time"]) == \
+               (sr_type, strength, timeframe, start_time)
+    assert merge_sr_levels(levels[:0]).size == 0
+
+
+def _assert_same_levels(x, y):
+    assert x.size == y.size
+    for name in SR_LEVEL.names:
+        np.testing.assert_array_equal(x[name], y[name], err_msg=name)
+
+
+def _stream(bars, loaded, timeframes, base_timeframe, pivot_length, cuts):
+    "load `loaded` bars, add the others one at a time and check them against a load of the same prefix"
+    kwargs = dict(base_timeframe=base_timeframe, pivot_length=pivot_length, executor=None)
+    live = MTF_SUPPORT_RESISTANCE(timeframes, **kwargs)
+    live.load(*(x[:loaded] for x in bars))
+    times, step = bars[0], timeframe_to_ms(base_timeframe)
+    for i in range(loaded, times.size):
+        changed = live.add(*(x[i] for x in bars))
+        expected = []
+        for timeframe in timeframes:
+            bucket = [bar_open_time(t, timeframe) for t in (times[i - 1], times[i], times[i] + step)]
+            # closed by its last base bar, or late by a bar of the next bucket when that one is missing
+            late = bucket[0] != bucket[1] and bar_open_time(times[i - 1] + step, timeframe) == bucket[0]
+            if bucket[1] != bucket[2] or late:
+                expected.append(timeframe)
+        assert changed == expected
+        if i + 1 in cuts or i == times.size - 1:
+            batch = MTF_SUPPORT_RESISTANCE(timeframes, **kwargs)
+            batch.load(*(x[:i + 1] for x in bars))
+            _assert_same_levels(live.levels, batch.levels)
+            for timeframe in timeframes:
+                _assert_same_levels(live.timeframe_levels(timeframe), batch.timeframe_levels(timeframe))
+    return live
+
+
+@pytest.mark.parametrize("holes", [0.0, 0.05])
+def test_live_bars_match_a_load_of_the_same_prefix(holes):
+    bars = _bars(1, 6000, holes)
+    live = _stream(bars, 1000, TIMEFRAMES, "1m", 3, range(2000, 6000, 1000))
+    assert live.levels.size > 0
+
+
+@pytest.mark.parametrize("holes", [0.0, 0.05])
+def test_weeks_and_calendar_months_stream_like_a_load(holes):
+    # 5m bars over ~200 days: the loaded forming month and week keep going live
+    bars = _bars(2, 58_000, holes, step=5 * MINUTE)
+    timeframes = ["4h", "1d", "1w", "1M"]
+    live = _stream(bars, 20_000, timeframes, "5m", 2, {20_001, 30_000, 45_000})
+    month_starts = live.timeframe_levels("1M")["start_time"]
+    assert month_starts.size and all(bar_open_time(int(t), "1M") == t for t in month_starts)
+    assert live.timeframe_levels("1w").size
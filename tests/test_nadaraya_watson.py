@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from atklip.controls.tradingview.nadaraya_watson import (NADARAYA_WATSON_KERNEL, nadaraya_watson_envelope,
+                                                         nw_weights)
+
+
+def random_walk(seed, size):
+    rng = np.random.default_rng(seed)
+    return 100.0 + np.cumsum(rng.normal(0.0, 1.0, size))
+
+
+def ref_envelope(close, h, mult, window, mae_length):
+    "the endpoint estimator and its mae band, bar by bar over plain slices"
+    w = nw_weights(h, window)
+    out = np.full(close.size, np.nan)
+    for t in range(window - 1, close.size):
+        out[t] = np.dot(close[t - window + 1:t + 1][::-1], w) / w.sum()
+    err = np.abs(close - out)
+    mae = np.full(close.size, np.nan)
+    for t in range(window + mae_length - 2, close.size):
+        mae[t] = err[t - mae_length + 1:t + 1].mean() * mult
+    return out, out + mae, out - mae
+
+
+@pytest.mark.parametrize("h, mult, window, mae_length", [(8.0, 3.0, 20, 15), (3.0, 2.0, 7, 30), (8.0, 3.0, 1, 1)])
+def test_batch_matches_reference(h, mult, window, mae_length):
+    close = random_walk(window, 400)
+    for got, expected in zip(nadaraya_watson_envelope(close, h, mult, window, mae_length),
+                             ref_envelope(close, h, mult, window, mae_length)):
+        np.testing.assert_allclose(got, expected, rtol=1e-10)
+
+
+@pytest.mark.parametrize("h, mult, window, mae_length, loaded", [(8.0, 3.0, 20, 15, 0), (8.0, 3.0, 20, 15, 1),
+                                                                  (8.0, 3.0, 20, 15, 25), (5.0, 1.0, 40, 60, 70)])
+def test_streamed_values_equal_the_batch_endpoint_on_every_prefix(h, mult, window, mae_length, loaded):
+    close = random_walk(loaded, 300)
+    rng = np.random.default_rng(1)
+    kernel = NADARAYA_WATSON_KERNEL(h, mult, window, mae_length)
+    kernel.load(close[:loaded])
+    for k in range(loaded + 1, close.size + 1):
+        kernel.add(close[k - 1] + rng.normal(0.0, 0.5))
+        kernel.update(close[k - 1] - rng.normal(0.0, 0.5))
+        streamed = kernel.update(close[k - 1])
+        batch = NADARAYA_WATSON_KERNEL(h, mult, window, mae_length).load(close[:k])
+        np.testing.assert_allclose(streamed, [x[-1] for x in batch], rtol=1e-10, err_msg=str(k))
+    assert not np.isnan(streamed).any()
+
+
+def test_default_window_streams():
+    close = random_walk(3, 1600)
+    kernel = NADARAYA_WATSON_KERNEL()
+    kernel.load(close[:900])
+    streamed = [kernel.add(x) for x in close[900:]]
+    expected = ref_envelope(close, 8.0, 3.0, 500, 499)
+    np.testing.assert_allclose(np.array(streamed), np.column_stack(expected)[900:], rtol=1e-10)
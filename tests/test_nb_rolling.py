@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import pytest
+
+from atklip.controls.pandas_ta.utils._nb_rolling import (nb_rolling_argmax, nb_rolling_argmin, nb_rolling_extrema,
+                                                         nb_rolling_hl, nb_rolling_max, nb_rolling_mean,
+                                                         nb_rolling_min, nb_rolling_std, nb_rolling_sum)
+from atklip.controls.stream_kernels import ROLLING_EXTREMA_KERNEL
+
+
+def _series(seed, size, nans=True):
+    "a rounded random walk (ties inside windows) with single NaNs and a NaN run"
+    rng = np.random.default_rng(seed)
+    x = np.round(100.0 + np.cumsum(rng.normal(0.0, 1.0, size)), 0)
+    if nans and size > 60:
+        x[rng.choice(size, 4, replace=False)] = np.nan
+        x[40:46] = np.nan
+    return x
+
+
+def ref_hl(np_high, np_low, window_size):
+    "the window slices of the original nb_rolling_hl"
+    idx, swing, value = [], [], []
+    left = int(np.floor(window_size / 2))
+    right = left + 1
+    for i in range(left, np_high.size - right):
+        if (np_low[i] <= np_low[i - left:i + right]).all():
+            idx.append(i), swing.append(-1), value.append(np_low[i])
+        if (np_high[i] >= np_high[i - left:i + right]).all():
+            idx.append(i), swing.append(1), value.append(np_high[i])
+    return np.array(idx, dtype=np.float64), np.array(swing, dtype=np.float64), np.array(value)
+
+
+ROLLING = [
+    (nb_rolling_max, lambda r: r.max()),
+    (nb_rolling_min, lambda r: r.min()),
+    (nb_rolling_sum, lambda r: r.sum()),
+    (nb_rolling_mean, lambda r: r.mean()),
+    (nb_rolling_std, lambda r: r.std()),
+    (nb_rolling_argmax, lambda r: r.apply(np.argmax, raw=True)),
+    (nb_rolling_argmin, lambda r: r.apply(np.argmin, raw=True)),
+]
+
+
+@pytest.mark.parametrize("fn, ref", ROLLING, ids=[fn.__name__ for fn, _ in ROLLING])
+@pytest.mark.parametrize("n, size", [(1, 300), (2, 300), (14, 500), (60, 500), (20, 10), (5, 5), (3, 0)])
+def test_rolling_matches_pandas(fn, ref, n, size):
+    x = _series(n + size, size)
+    expected = ref(pd.Series(x).rolling(n)).to_numpy(dtype=np.float64)
+    np.testing.assert_allclose(fn(x, n), expected, rtol=1e-9, atol=1e-9)
+
+
+def test_rolling_sum_does_not_drift():
+    x = np.random.default_rng(0).normal(1e6, 1.0, 200_000)
+    expected = pd.Series(x).rolling(50).sum().to_numpy()
+    np.testing.assert_allclose(nb_rolling_sum(x, 50)[-1000:], expected[-1000:], rtol=1e-13)
+
+
+@pytest.mark.parametrize("window_size", [1, 2, 5, 10, 21])
+def test_rolling_hl_matches_window_slices(window_size):
+    rng = np.random.default_rng(window_size)
+    close = np.round(100.0 + np.cumsum(rng.normal(0.0, 1.0, 2000)), 1)
+    high = close + np.round(rng.exponential(0.5, close.size), 1)
+    low = close - np.round(rng.exponential(0.5, close.size), 1)
+    high[[100, 700]] = np.nan
+    low[[300, 701]] = np.nan
+    for got, expected in zip(nb_rolling_hl(high, low, window_size), ref_hl(high, low, window_size)):
+        np.testing.assert_array_equal(got, expected)
+
+
+@pytest.mark.parametrize("mode", ["max", "min"])
+@pytest.mark.parametrize("length, loaded", [(1, 0), (5, 0), (20, 1), (20, 30), (20, 100), (300, 50)])
+def test_extrema_kernel_live_matches_batch(mode, length, loaded):
+    x = _series(length, 400)
+    value, index = nb_rolling_extrema(x, length, mode == "max")
+    bars = np.where(index < 0, np.nan, np.arange(x.size) - index)
+
+    kernel = ROLLING_EXTREMA_KERNEL(length, mode)
+    loaded_value, loaded_bars = kernel.load(x[:loaded])
+    np.testing.assert_array_equal(loaded_value, value[:loaded])
+    np.testing.assert_array_equal(loaded_bars, bars[:loaded])
+    rng = np.random.default_rng(1)
+    for i in range(loaded, x.size):
+        # ticks of the forming bar first, some beyond the final extremum
+        kernel.add(x[i] + rng.normal(0.0, 5.0))
+        kernel.update(np.nan)
+        got = kernel.update(x[i])
+        np.testing.assert_array_equal(got, (value[i], bars[i]), err_msg=str(i))
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+import time
+
+import numpy as np
+import pytest
+
+from atklip.controls.strategies.intrabar import INTRABAR_SOURCE
+from atklip.exchanges.ohlcv_cache import (CACHED_OHLCV, OHLCV_CACHE, OHLCV_CACHE_global, add_bars, bar_open_time,
+                                          timeframe_to_ms)
+
+MINUTE = 60_000
+NOW = 1_700_000_000_000 // MINUTE * MINUTE
+
+
+class STUB_EXCHANGE:
+    "fetch_ohlcv over a fixed bar series, counting the requests"
+
+    id = "stub"
+
+    def __init__(self, times, holes=()):
+        self.times = np.asarray([t for t in times if t not in set(holes)], dtype=np.int64)
+        self.calls = []
+        self.ignore_since = False
+        self.close = 1.5
+
+    def fetch_ohlcv(self, symbol, timeframe="1m", since=None, limit=1000):
+        self.calls.append((since, limit))
+        first = 0 if self.ignore_since else int(np.searchsorted(self.times, since))
+        times = self.times[first:first + limit]
+        return [[int(t), 1.0, 2.0, 0.5, self.close, 10.0] for t in times]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return OHLCV_CACHE(str(tmp_path), segment_bars=1000)
+
+
+def _source(exchange, cache, monkeypatch):
+    monkeypatch.setattr(time, "time", lambda: NOW / 1000)
+    return CACHED_OHLCV(exchange, cache, page_limit=500)
+
+
+def test_second_fetch_comes_from_cache(cache, monkeypatch):
+    exchange = STUB_EXCHANGE(range(NOW - 5000 * MINUTE, NOW + MINUTE, MINUTE))
+    source = _source(exchange, cache, monkeypatch)
+    since = NOW - 3000 * MINUTE
+    first = source.fetch_ohlcv_array("BTC/USDT", "1m", since=since, limit=2000)
+    assert len(first) == 2000 and first[0, 0] == since
+    calls = len(exchange.calls)
+    second = source.fetch_ohlcv_array("BTC/USDT", "1m", since=since, limit=2000)
+    assert len(exchange.calls) == calls
+    np.testing.assert_array_equal(first, second)
+
+
+def test_only_missing_ranges_are_fetched(cache, monkeypatch):
+    exchange = STUB_EXCHANGE(range(NOW - 5000 * MINUTE, NOW + MINUTE, MINUTE))
+    source = _source(exchange, cache, monkeypatch)
+    source.fetch_ohlcv_array("BTC/USDT", "1m", since=NOW - 3000 * MINUTE, limit=500)
+    exchange.calls.clear()
+    rows = source.fetch_ohlcv_array("BTC/USDT", "1m", since=NOW - 3200 * MINUTE, limit=1000)
+    assert len(rows) == 1000
+    assert [since for since, _ in exchange.calls] == [NOW - 3200 * MINUTE, NOW - 2500 * MINUTE]
+
+
+def test_exchange_holes_are_not_refetched(cache, monkeypatch):
+    start = NOW - 3000 * MINUTE
+    holes = range(start + 100 * MINUTE, start + 200 * MINUTE, MINUTE)
+    exchange = STUB_EXCHANGE(range(NOW - 5000 * MINUTE, NOW + MINUTE, MINUTE), holes)
+    source = _source(exchange, cache, monkeypatch)
+    assert len(source.fetch_ohlcv_array("BTC/USDT", "1m", since=start, limit=400)) == 300
+    exchange.calls.clear()
+    source.fetch_ohlcv_array("BTC/USDT", "1m", since=start, limit=400)
+    assert exchange.calls == []
+
+
+def test_forming_bar_is_refreshed(cache, monkeypatch):
+    exchange = STUB_EXCHANGE(range(NOW - 100 * MINUTE, NOW + MINUTE, MINUTE))
+    source = _source(exchange, cache, monkeypatch)
+    source.fetch_ohlcv_array("BTC/USDT", "1m", limit=50)
+    exchange.calls.clear()
+    source.fetch_ohlcv_array("BTC/USDT", "1m", limit=50)
+    assert [since for since, _ in exchange.calls] == [NOW]
+
+
+def test_forming_bar_is_held_in_memory(cache, monkeypatch):
+    exchange = STUB_EXCHANGE(range(NOW - 100 * MINUTE, NOW + 2 * MINUTE, MINUTE))
+    source = _source(exchange, cache, monkeypatch)
+    written = []
+    write_segment = cache._write_segment
+    monkeypatch.setattr(cache, "_write_segment",
+                        lambda folder, segment, rows: (written.extend(rows[:, 0]),
+                                                       write_segment(folder, segment, rows)))
+    assert source.fetch_ohlcv_array("BTC/USDT", "1m", limit=50)[-1, 0] == NOW
+    assert len(written) == 49 and NOW not in written
+    # refreshes of the forming bar leave the segments alone
+    written.clear()
+    for close in (1.6, 1.7):
+        exchange.close = close
+        rows = source.fetch_ohlcv_array("BTC/USDT", "1m", limit=50)
+        assert rows[-1].tolist() == [NOW, 1.0, 2.0, 0.5, close, 10.0] and rows[-2, 4] == 1.5
+    assert written == []
+    assert OHLCV_CACHE(cache.root, segment_bars=1000).read("stub", "BTC/USDT", "1m")[-1, 0] == NOW - MINUTE
+
+    # the bar closed: it is downloaded once more and written, the next one is held
+    monkeypatch.setattr(time, "time", lambda: (NOW + MINUTE) / 1000)
+    exchange.close = 1.8
+    rows = source.fetch_ohlcv_array("BTC/USDT", "1m", limit=50)
+    assert rows[-2:, 0].tolist() == [NOW, NOW + MINUTE] and rows[-2, 4] == 1.8
+    assert written == [NOW]
+    assert np.array_equal(np.diff(rows[:, 0]), np.full(49, MINUTE))
+    cache.clear("stub", "BTC/USDT", "1m")
+    assert cache.read("stub", "BTC/USDT", "1m").shape == (0, 6)
+
+
+def test_filtered_out_page_marks_nothing_covered(cache, monkeypatch):
+    exchange = STUB_EXCHANGE(range(NOW - 5000 * MINUTE, NOW + MINUTE, MINUTE))
+    exchange.ignore_since = True
+    source = _source(exchange, cache, monkeypatch)
+    since = NOW - 1000 * MINUTE
+    assert len(source.fetch_ohlcv_array("BTC/USDT", "1m", since=since, limit=100)) == 0
+    assert cache.get_coverage("stub", "BTC/USDT", "1m") == []
+
+
+def test_weekly_and_monthly_bars_align_like_ccxt():
+    # 2023-11-14 22:13 UTC is a Tuesday
+    assert bar_open_time(NOW, "1w") == 1699833600000  # Monday 2023-11-13
+    assert bar_open_time(NOW, "1M") == 1698796800000  # 2023-11-01
+    assert add_bars(1698796800000, "1M", 2) == 1704067200000  # 2024-01-01
+    assert bar_open_time(NOW, "4h") == NOW // timeframe_to_ms("4h") * timeframe_to_ms("4h")
+
+
+def test_100k_bars_open_from_cache_quickly(tmp_path):
+    cache = OHLCV_CACHE(str(tmp_path))
+    times = NOW - np.arange(100_000, 0, -1, dtype=np.int64) * MINUTE
+    rows = np.column_stack([times, np.ones((times.size, 5))])
+    cache.write("stub", "BTC/USDT", "1m", rows, (int(times[0]), int(times[-1])))
+    start = time.perf_counter()
+    assert len(OHLCV_CACHE(str(tmp_path)).read("stub", "BTC/USDT", "1m")) == 100_000
+    assert time.perf_counter() - start < 1.0
+
+
+def test_two_caches_on_one_root_keep_each_others_coverage(tmp_path):
+    first, second = OHLCV_CACHE(str(tmp_path)), OHLCV_CACHE(str(tmp_path))
+    assert first.get_coverage("stub", "BTC/USDT", "1m") == []
+    assert second.get_coverage("stub", "BTC/USDT", "1m") == []
+    for cache, start in ((first, NOW - 100 * MINUTE), (second, NOW - 300 * MINUTE), (first, NOW - 500 * MINUTE)):
+        rows = np.array([[start, 1.0, 2.0, 0.5, 1.5, 10.0]])
+        cache.write("stub", "BTC/USDT", "1m", rows, (start, start + 9 * MINUTE))
+    expected = [(NOW - k * MINUTE, NOW - (k - 9) * MINUTE) for k in (500, 300, 100)]
+    assert OHLCV_CACHE(str(tmp_path)).get_coverage("stub", "BTC/USDT", "1m") == expected
+
+
+def test_default_users_share_the_global_cache():
+    assert CACHED_OHLCV(STUB_EXCHANGE([])).cache is OHLCV_CACHE_global
+    assert INTRABAR_SOURCE("stub", "BTC/USDT").cache is OHLCV_CACHE_global
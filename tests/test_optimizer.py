@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from atklip.controls.strategies import optimizer
+from atklip.controls.strategies.optimizer import (PARAMETER_SWEEP, SHARED_CANDLES, attach_candles, grid_params,
+                                                   random_params)
+
+
+def test_random_params_on_a_space_past_int64():
+    space = {f"p{k}": range(100) for k in range(12)}  # 1e24 combinations
+    params = list(random_params(space, 50, seed=1))
+    assert len(params) == 50 and len({tuple(p.values()) for p in params}) == 50
+    assert len(list(random_params({"a": [1, 2], "b": [3]}, 10, seed=1))) == 2
+
+
+def test_shared_candles_from_a_dict_without_every_column():
+    close = np.linspace(1.0, 2.0, 7)
+    with SHARED_CANDLES({"open": close, "high": close, "low": close, "close": close}) as shared:
+        candles = attach_candles(shared.spec)
+        np.testing.assert_array_equal(candles["close"], close)
+        assert candles["volume"].size == 7 and not candles["volume"].any()
+
+
+def test_attach_a_new_block_while_views_of_the_old_one_are_alive():
+    first, second = np.linspace(1.0, 2.0, 7), np.linspace(3.0, 4.0, 9)
+    with SHARED_CANDLES({"close": first}) as a, SHARED_CANDLES({"close": second}) as b:
+        old = attach_candles(a.spec)
+        new = attach_candles(b.spec)
+        np.testing.assert_array_equal(new["close"], second)
+        # the first block stays mapped for the views a signal function kept
+        np.testing.assert_array_equal(old["close"], first)
+        assert len(optimizer._RETIRED) == 1
+        del old, new
+        np.testing.assert_array_equal(attach_candles(a.spec)["close"], first)
+        assert optimizer._RETIRED == []
+
+
+def test_random_params_with_repeated_values():
+    params = list(random_params({"a": [1, 1], "b": [2, 3, 3]}, 5, seed=0))
+    assert sorted((p["a"], p["b"]) for p in params) == [(1, 2), (1, 3)]
+
+
+CALLS = []
+
+
+def crossing_signals(candles, fast=2, slow=5):
+    CALLS.append((fast, slow))
+    close = candles["close"]
+    fast_ma = np.convolve(close, np.ones(fast) / fast)[:close.size]
+    slow_ma = np.convolve(close, np.ones(slow) / slow)[:close.size]
+    return {"long_entry": fast_ma > slow_ma, "short_entry": fast_ma < slow_ma}
+
+
+def _candles(m=300):
+    close = 100 + np.cumsum(np.random.default_rng(5).normal(0, 1, m))
+    return {"time": np.arange(m, dtype=np.int64) * 60_000, "open": close, "high": close + 0.5,
+            "low": close - 0.5, "close": close}
+
+
+def test_sweep_cancel_then_resume_from_the_checkpoint(tmp_path):
+    checkpoint = str(tmp_path / "sweep.json")
+    space = {"fast": [2, 3, 4], "slow": [5, 8, 13, 21]}
+    CALLS.clear()
+    sweep = PARAMETER_SWEEP(crossing_signals, {"taker_fee": 0.0}, batch_size=2, checkpoint=checkpoint,
+                            checkpoint_every=100, executor=None)
+    sweep.run(_candles(), grid_params(space), callback=lambda results, s: len(s.results) >= 4 and s.cancel())
+    assert sweep.cancelled and len(sweep.results) == 4 and len(CALLS) == 4
+    first = set(CALLS)
+
+    CALLS.clear()
+    resumed = PARAMETER_SWEEP(crossing_signals, {"taker_fee": 0.0}, batch_size=2, checkpoint=checkpoint,
+                              executor=None)
+    assert len(resumed.results) == 4
+    ranking = resumed.run(_candles(), grid_params(space))
+    assert len(CALLS) == 8 and not first & set(CALLS)
+    assert len(ranking) == 12 and resumed.best == ranking[0]
+    profits = [summary["net_profit"] for _, summary in ranking]
+    assert profits == sorted(profits, reverse=True)
+    assert len(PARAMETER_SWEEP(crossing_signals, checkpoint=checkpoint, executor=None).results) == 12
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import pytest
+
+from atklip.controls.tradingview.range_kernels import (PREDICTIVE_RANGES_KERNEL, SIDEWAY_DETECTOR,
+                                                       nb_sideway_detection, predictive_ranges,
+                                                       predictive_ranges_mtf)
+
+
+# references written like Predictive_Ranges and sideway_detection: the pandas_ta
+# atr (rma of the true range) and the bar loops of those modules
+
+def ref_atr(df, length):
+    prev_close = df["close"].shift(1)
+    tr = pd.concat([df["high"] - df["low"], (df["high"] - prev_close).abs(),
+                    (df["low"] - prev_close).abs()], axis=1).max(axis=1, skipna=False)
+    return tr.ewm(alpha=1.0 / length, adjust=False).mean()
+
+
+def compute_pred_ranges(close, atr):
+    avg_values, hold_atr_values = [], []
+    avg_prev, hold_atr_prev = close[0], 0.0
+    for src, current_atr in zip(close, atr):
+        if src - avg_prev > current_atr:
+            new_avg = avg_prev + current_atr
+        elif avg_prev - src > current_atr:
+            new_avg = avg_prev - current_atr
+        else:
+            new_avg = avg_prev
+        hold_atr = current_atr / 2 if new_avg != avg_prev else hold_atr_prev
+        avg_values.append(new_avg)
+        hold_atr_values.append(hold_atr)
+        avg_prev, hold_atr_prev = new_avg, hold_atr
+    return np.array(avg_values), np.array(hold_atr_values)
+
+
+def ref_predictive_ranges(df, length, mult):
+    atr = ref_atr(df, length).fillna(0) * mult
+    avg, hold_atr = compute_pred_ranges(df["close"].to_numpy(), atr.to_numpy())
+    return pd.DataFrame({"prR2": avg + hold_atr * 2, "prR1": avg + hold_atr, "avg": avg,
+                         "prS1": avg - hold_atr, "prS2": avg - hold_atr * 2}, index=df.index)
+
+
+def sideway_detection(df, bars_min_in_sideway, bars_ext_for_sideway, percent_change_sideway):
+    high, low = df["high"].to_numpy(), df["low"].to_numpy()
+    sideway_boxes = []
+    for i in range(bars_min_in_sideway, len(df)):
+        bar_cur_mid_price = (high[i] + low[i]) / 2
+        is_new_sideway = True
+        for j in range(1, bars_min_in_sideway + 1):
+            bar_pre_mid_price = (high[i - j] + low[i - j]) / 2
+            if abs(bar_cur_mid_price - bar_pre_mid_price) / bar_pre_mid_price * 100 > percent_change_sideway:
+                is_new_sideway = False
+                break
+        if not is_new_sideway:
+            continue
+        new_sideway_x = i - bars_min_in_sideway
+        top, bottom = max(high[new_sideway_x:i + 1]), min(low[new_sideway_x:i + 1])
+        if sideway_boxes and new_sideway_x <= sideway_boxes[-1][1] + bars_ext_for_sideway:
+            box = sideway_boxes[-1]
+            sideway_boxes[-1] = [box[0], i, max(box[2], top), min(box[3], bottom)]
+        else:
+            sideway_boxes.append([new_sideway_x, i, top, bottom])
+    return np.array(sideway_boxes, dtype=np.float64).reshape(-1, 4)
+
+
+def _candles(seed, size=3000):
+    rng = np.random.default_rng(seed)
+    close = 100.0 + np.cumsum(rng.normal(0.0, 0.05, size))
+    return pd.DataFrame({"open": np.r_[close[0], close[:-1]], "high": close + rng.exponential(0.05, size),
+                         "low": close - rng.exponential(0.05, size), "close": close, "volume": np.ones(size)},
+                        index=pd.date_range("2024-01-01", periods=size, freq="1min"))
+
+
+@pytest.mark.parametrize("length, mult", [(200, 6.0), (50, 2.0), (14, 0.5)])
+def test_predictive_ranges_matches_pandas(length, mult):
+    df = _candles(length)
+    levels = predictive_ranges(df["high"], df["low"], df["close"], length, mult)
+    expected = ref_predictive_ranges(df, length, mult)
+    for name, values in levels.items():
+        np.testing.assert_allclose(values, expected[name], rtol=1e-12, err_msg=name)
+
+
+def test_predictive_ranges_kernel_streams_like_batch():
+    df = _candles(3)
+    high, low, close = (df[name].to_numpy() for name in ("high", "low", "close"))
+    expected = np.column_stack(list(predictive_ranges(high, low, close, 50, 2.0).values()))
+    kernel = PREDICTIVE_RANGES_KERNEL(50, 2.0)
+    np.testing.assert_allclose(np.column_stack(kernel.load(high[:1000], low[:1000], close[:1000])),
+                               expected[:1000], rtol=1e-12)
+    streamed = []
+    for i in range(1000, close.size):
+        kernel.update(high[i - 1] + 0.1, low[i - 1], close[i - 1] + 0.05)
+        kernel.update(high[i - 1], low[i - 1], close[i - 1])
+        streamed.append(kernel.add(high[i], low[i], close[i]))
+    np.testing.assert_allclose(np.array(streamed), expected[1000:], rtol=1e-12)
+
+
+def test_predictive_ranges_mtf_matches_pandas_resample():
+    df = _candles(5)
+    times = df.index.as_unit("ms").asi8
+    levels = predictive_ranges_mtf(times, *(df[name] for name in ("open", "high", "low", "close", "volume")),
+                                   "5m", 20, 2.0)
+    resampled = df.resample("5min").agg({"open": "first", "high": "max", "low": "min", "close": "last",
+                                         "volume": "sum"})
+    expected = ref_predictive_ranges(resampled, 20, 2.0).reindex(df.index, method="ffill")
+    for name, values in levels.items():
+        np.testing.assert_allclose(values, expected[name], rtol=1e-12, err_msg=name)
+
+
+@pytest.mark.parametrize("bars_min, bars_ext, percent", [(10, 5, 0.2), (5, 0, 0.1), (20, 10, 0.5)])
+def test_sideway_detection_matches_loop(bars_min, bars_ext, percent):
+    df = _candles(7)
+    flags, boxes = nb_sideway_detection(df["high"].to_numpy(), df["low"].to_numpy(), bars_min, bars_ext, percent)
+    expected = sideway_detection(df, bars_min, bars_ext, percent)
+    assert len(expected) > 0 and flags.sum() > 0
+    np.testing.assert_array_equal(boxes, expected)
+
+
+def test_sideway_detector_streams_like_batch():
+    df = _candles(9)
+    high, low = df["high"].to_numpy(), df["low"].to_numpy()
+    detector = SIDEWAY_DETECTOR(10, 5, 0.2)
+    detector.load(high[:500], low[:500])
+    for i in range(500, high.size):
+        detector.update(high[i - 1] * 1.01, low[i - 1])
+        detector.update(high[i - 1], low[i - 1])
+        detector.add(high[i], low[i])
+    np.testing.assert_array_equal(detector.boxes, sideway_detection(df, 10, 5, 0.2))
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import pytest
+
+from atklip.controls.candle.candle_store import CANDLE_STORE
+from atklip.controls.candle.resample import RESAMPLER, resample_many, resample_ohlcv
+
+MINUTE = 60_000
+# pandas rule of each timeframe, weeks open on Monday and months on the 1st
+RULES = {"5m": "5min", "1h": "1h", "4h": "4h", "1d": "1D", "1w": "W-MON", "1M": "MS", "3M": "QS-JAN"}
+
+
+def _bars(seed, days, keep=1.0):
+    """1m bars from 2024-01-20 over `days` days with a `keep` share of the
+    minutes and a two day hole"""
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp("2024-01-20 13:07").value // 1_000_000
+    times = start + np.arange(days * 1440, dtype=np.int64) * MINUTE
+    mask = rng.random(times.size) < keep
+    mask[5000:5000 + 2 * 1440] = False
+    close = 100 + np.cumsum(rng.normal(0, 0.1, times.size))
+    _open = np.r_[close[0], close[:-1]]
+    high = np.maximum(_open, close) + rng.random(times.size)
+    low = np.minimum(_open, close) - rng.random(times.size)
+    return tuple(x[mask] for x in (times, _open, high, low, close, rng.random(times.size)))
+
+
+def ref_resample(bars, timeframe):
+    times, _open, high, low, close, volume = bars
+    df = pd.DataFrame({"open": _open, "high": high, "low": low, "close": close, "volume": volume},
+                      index=pd.to_datetime(times, unit="ms"))
+    out = df.resample(RULES[timeframe], label="left", closed="left").agg(
+        {"open": "first", "high": "max", "low": "min", "close": "last", "volume": "sum"}).dropna(subset=["open"])
+    return (out.index.as_unit("ms").asi8,) + tuple(out[name].to_numpy() for name in
+                                                  ("open", "high", "low", "close", "volume"))
+
+
+def _assert_bars(got, expected, timeframe):
+    assert len(got[0]) == len(expected[0]), timeframe
+    np.testing.assert_array_equal(got[0], expected[0], err_msg=timeframe)
+    for x, y in zip(got[1:], expected[1:]):
+        np.testing.assert_allclose(x, y, rtol=1e-12, err_msg=timeframe)
+
+
+@pytest.mark.parametrize("timeframe", list(RULES))
+def test_resample_matches_pandas(timeframe):
+    bars = _bars(1, 120, keep=0.7)
+    _assert_bars(resample_ohlcv(*bars, timeframe), ref_resample(bars, timeframe), timeframe)
+
+
+def test_resample_many_matches_single_timeframes():
+    bars = _bars(2, 120, keep=0.9)
+    timeframes = ["1M", "1w", "5m", "3M", "1d", "4h", "1h"]
+    built = resample_many(*bars, timeframes)
+    assert list(built) == timeframes
+    for timeframe in timeframes:
+        _assert_bars(built[timeframe], ref_resample(bars, timeframe), timeframe)
+
+
+def test_resample_empty():
+    empty = tuple(np.empty(0) for _ in range(6))
+    assert all(x.size == 0 for x in resample_ohlcv(*empty, "1h"))
+
+
+@pytest.mark.parametrize("loaded", [0, 1, 3000])
+def test_forming_buckets_follow_live_bars(loaded):
+    bars = _bars(3, 75, keep=0.05)
+    timeframes = ["5m", "1h", "1d", "1w", "1M"]
+    base = CANDLE_STORE(capacity=16)
+    base.load(*(x[:loaded] for x in bars))
+    resampler = RESAMPLER(base)
+    for timeframe in timeframes:
+        resampler.add_timeframe(timeframe)
+    for i in range(loaded, bars[0].size):
+        _time, _open, high, low, close, volume = (x[i] for x in bars)
+        # a new base bar opens flat, then its ticks reach the final values
+        events = resampler.update(_time, _open, _open, _open, _open, volume / 3)
+        assert events[0] == ("1m", i, True)
+        assert [event[0] for event in events[1:]] == timeframes
+        resampler.update(_time, _open, high, low, close, volume)
+        if i % 700 == 0 or i == bars[0].size - 1:
+            for timeframe in timeframes:
+                store = resampler.get_store(timeframe)
+                expected = ref_resample(tuple(x[:i + 1] for x in bars), timeframe)
+                _assert_bars(store.columns(("time", "open", "high", "low", "close", "volume")), expected,
+                             timeframe)
+    assert resampler.get_store("1m") is base
+    # a reload gives the same bars as the live updates
+    live = {timeframe: [x.copy() for x in resampler.get_store(timeframe).columns(("time", "close"))]
+            for timeframe in timeframes}
+    resampler.reload()
+    for timeframe in timeframes:
+        for x, y in zip(resampler.get_store(timeframe).columns(("time", "close")), live[timeframe]):
+            np.testing.assert_array_equal(x, y)
+
+
+def test_rejects_timeframes_that_are_not_base_multiples():
+    resampler = RESAMPLER(CANDLE_STORE(), base_timeframe="2m")
+    with pytest.raises(ValueError):
+        resampler.add_timeframe("3m")
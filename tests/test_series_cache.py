@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from atklip.controls.candle.candle_store import CANDLE_STORE
+from atklip.controls.series_cache import SERIES_CACHE, get_series_cache
+
+MINUTE = 60_000
+
+
+def _bars(seed, size):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, size))
+    _open = np.r_[close[0], close[:-1]]
+    high = np.maximum(_open, close) + rng.random(size)
+    low = np.minimum(_open, close) - rng.random(size)
+    return np.arange(size, dtype=np.int64) * MINUTE, _open, high, low, close, rng.random(size) * 10
+
+
+def _store(bars):
+    store = CANDLE_STORE()
+    store.load(*bars)
+    return store
+
+
+def _assert_fresh(store, cache, *requests):
+    fresh = SERIES_CACHE(store)
+    for name, params in requests:
+        np.testing.assert_allclose(cache.get(name, **params), fresh.get(name, **params), rtol=1e-10)
+
+
+def test_indicators_share_one_series_per_params():
+    bars = _bars(1, 1500)
+    store = _store(tuple(x[:500] for x in bars))
+    cache = get_series_cache(store)
+    assert get_series_cache(store) is cache
+    for _ in range(10):  # ten indicators on one source
+        atr = cache.get("atr", length=14)
+        ema = cache.get("ema", length=20)
+    assert cache.stats() == {"entries": 2, "hits": 18, "misses": 2}
+    assert cache.get("atr", length=14) is not cache.get("atr", length=21)
+
+    for row in zip(*(x[500:] for x in bars)):
+        forming = row[:4] + (row[4] - 0.3, row[5] / 2)
+        store.append(*forming)
+        cache.on_add()
+        store.update_last(*row)
+        cache.on_update()
+    assert cache.stats()["misses"] == 3
+    _assert_fresh(store, cache, ("atr", {"length": 14}), ("ema", {"length": 20}), ("atr", {"length": 21}))
+    assert atr.size == 500 and ema.size == 500
+
+
+def test_final_tick_arriving_with_the_new_bar():
+    bars = _bars(2, 600)
+    store = _store(tuple(x[:300] for x in bars))
+    cache = SERIES_CACHE(store)
+    requests = (("ema", {"length": 10}), ("rsi", {"length": 14}), ("atr", {"length": 14}),
+                ("wma", {"length": 9}), ("true_range", {}))
+    for name, params in requests:
+        cache.get(name, **params)
+    for i in range(300, 600):
+        # the last update of the closing bar is never seen, the source only
+        # rewrites it together with the append of the next one
+        _time, _open, high, low, close, volume = (x[i - 1] for x in bars)
+        store.update_last(_time, _open, high, low, close + 0.7, volume / 2)
+        cache.on_update()
+        store.update_last(_time, _open, high, low, close, volume)
+        store.append(*(x[i] for x in bars))
+        cache.on_add()
+    _assert_fresh(store, cache, *requests)
+    assert cache.stats()["misses"] == len(requests)
+
+
+def test_batch_function_entries_and_list_params():
+    store = _store(_bars(3, 200))
+    cache = SERIES_CACHE(store)
+    calls = []
+
+    def weighted(close, weights=(1,)):
+        calls.append(weights)
+        w = np.asarray(weights, dtype=np.float64)
+        return np.convolve(close, w / w.sum())[:close.size]
+
+    first = cache.get("weighted", fn=weighted, weights=[1, 2, 3])
+    assert cache.get("weighted", fn=weighted, weights=[1, 2, 3]) is not None and len(calls) == 1
+    np.testing.assert_allclose(first, weighted(store.column("close"), [1, 2, 3]))
+    store.append(200 * MINUTE, 1.0, 2.0, 0.5, 1.5, 1.0)
+    cache.on_add()
+    assert cache.get("weighted", fn=weighted, weights=[1, 2, 3]).size == 201 and len(calls) == 3
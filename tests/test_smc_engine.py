@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from atklip.controls.smc.smc_engine import SMC_ENGINE, nb_liquidity, nb_swing_highs_lows
+
+
+def _bars(seed, size):
+    rng = np.random.default_rng(seed)
+    close = 100.0 + np.cumsum(rng.normal(0.0, 1.0, size))
+    _open = np.r_[close[0], close[:-1]]
+    high = np.round(np.maximum(_open, close) + rng.exponential(0.5, size), 1)
+    low = np.round(np.minimum(_open, close) - rng.exponential(0.5, size), 1)
+    return _open, high, low, close, rng.integers(1, 1000, size).astype(np.float64)
+
+
+def ref_liquidity(high, low, hl, level, pip_range):
+    "smc.liquidity: forward scans for the sweep bar and the grouped swings"
+    m = hl.size
+    out = [np.full(m, np.nan) for _ in range(4)]
+    used = np.zeros(m, dtype=bool)
+    for side in (1, -1):
+        candidates = np.flatnonzero(hl == side)
+        for a, i in enumerate(candidates):
+            if used[i]:
+                continue
+            range_low, range_high = level[i] - pip_range, level[i] + pip_range
+            crossed = np.flatnonzero(high[i + 1:] >= range_high if side == 1 else low[i + 1:] <= range_low)
+            swept = i + 1 + crossed[0] if crossed.size else 0
+            group = [j for j in candidates[a + 1:] if (not swept or j < swept) and not used[j]
+                     and range_low <= level[j] <= range_high]
+            if group:
+                used[group] = True
+                for column, value in zip(out, (side, np.mean([level[i]] + [level[j] for j in group]),
+                                               group[-1], swept)):
+                    column[i] = value
+    return out
+
+
+@pytest.mark.parametrize("seed, swing_length, range_percent", [(0, 1, 0.01), (1, 3, 0.05), (2, 2, 0.002)])
+def test_liquidity_matches_forward_scan(seed, swing_length, range_percent):
+    _, high, low, _, _ = _bars(seed, 3000)
+    hl = nb_swing_highs_lows(high, low, swing_length)
+    level = np.where(np.isnan(hl), np.nan, np.where(hl == 1, high, low))
+    pip_range = (high.max() - low.min()) * range_percent
+    for got, expected in zip(nb_liquidity(high, low, hl, level, pip_range),
+                             ref_liquidity(high, low, hl, level, pip_range)):
+        np.testing.assert_allclose(got, expected.astype(np.float32), rtol=1e-6)
+
+
+def test_live_bars_match_load():
+    bars = _bars(3, 1500)
+    live = SMC_ENGINE(4, capacity=64)
+    live.load(*(x[:300] for x in bars))
+    for row in zip(*(x[300:] for x in bars)):
+        live.add(*row)
+    batch = SMC_ENGINE(4)
+    batch.load(*bars)
+    for name, frame in batch.all().items():
+        np.testing.assert_array_equal(live.all()[name].to_numpy(), frame.to_numpy(), err_msg=name)
+
+
+@pytest.mark.parametrize("swing_length, close_break, close_mitigation, range_percent",
+                         [(2, False, True, 0.05), (1, True, True, 0.002), (6, False, False, 0.03)])
+def test_live_bars_match_load_on_prefixes(swing_length, close_break, close_mitigation, range_percent):
+    options = dict(close_break=close_break, close_mitigation=close_mitigation, range_percent=range_percent)
+    bars = _bars(9, 1200)
+    live = SMC_ENGINE(swing_length, capacity=16, **options)
+    live.load(*(x[:100] for x in bars))
+    for k in range(100, 1200):
+        live.add(*(x[k] for x in bars))
+        if k % 61 == 0:
+            # swings confirmed on the first live bars rewind the order blocks of the loaded tail
+            batch = SMC_ENGINE(swing_length, **options)
+            batch.load(*(x[:k + 1] for x in bars))
+            for name, frame in batch.all().items():
+                np.testing.assert_array_equal(live.all()[name].to_numpy(), frame.to_numpy(), err_msg=f"{name} {k}")
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+import threading
+
+import pytest
+
+from atklip.controls.candle.source_registry import SOURCE_REGISTRY, source_key
+
+JAPAN = source_key("binance", "BTCUSDT", "1m")
+HEIKIN = source_key("binance", "BTCUSDT", "1m", "heikinashi")
+
+
+class TASK:
+    "stands in for the loop_watch_ohlcv task of a key"
+
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class SOURCES:
+    "factory, subscribe and dispose callbacks recording what they did"
+
+    def __init__(self):
+        self.created, self.disposed, self.tasks = [], [], []
+
+    def factory(self, name):
+        def build():
+            self.created.append(name)
+            return object()
+        return build
+
+    def subscribe(self, source):
+        self.tasks.append(TASK())
+        return self.tasks[-1]
+
+    def dispose(self, source):
+        self.disposed.append(source)
+
+
+def _acquire(registry, sources, key, owner, parent=None):
+    return registry.acquire(key, owner, sources.factory(key[3]), sources.subscribe, sources.dispose, parent)
+
+
+def test_owners_share_one_source_and_count_their_acquires():
+    registry, sources = SOURCE_REGISTRY(), SOURCES()
+    first = _acquire(registry, sources, JAPAN, "chart")
+    assert _acquire(registry, sources, JAPAN, "chart") is first
+    assert _acquire(registry, sources, JAPAN, "subchart") is first
+    assert sources.created == ["japan"] and len(sources.tasks) == 1
+    assert registry.refcount(JAPAN) == 3 and JAPAN in registry and registry.get(JAPAN) is first
+
+    assert not registry.release(JAPAN, "chart")
+    assert not registry.release(JAPAN, "chart")
+    assert not registry.release(JAPAN, "chart")  # no acquire left for this owner
+    assert registry.refcount(JAPAN) == 1 and not sources.tasks[0].cancelled
+    assert registry.release(JAPAN, "subchart")
+    assert sources.tasks[0].cancelled and sources.disposed == [first]
+    assert JAPAN not in registry and registry.get(JAPAN) is None and registry.refcount(JAPAN) == 0
+    assert not registry.release(JAPAN, "subchart")
+
+    # a later acquire builds a new source
+    assert _acquire(registry, sources, JAPAN, "chart") is not first
+    assert registry.release(JAPAN, "chart", every=True)
+
+
+def test_derived_source_keeps_its_parent():
+    registry, sources = SOURCE_REGISTRY(), SOURCES()
+    with pytest.raises(KeyError):
+        _acquire(registry, sources, HEIKIN, "chart", parent=JAPAN)
+    assert len(registry) == 0
+
+    japan = _acquire(registry, sources, JAPAN, "chart")
+    heikin = _acquire(registry, sources, HEIKIN, "chart", parent=JAPAN)
+    assert registry.refcount(JAPAN) == 2
+    # the chart lets go of the base candles first, the heikin ashi still holds them
+    assert not registry.release(JAPAN, "chart")
+    assert registry.get(JAPAN) is japan
+    # the last release of the derived source releases the parent under its key
+    assert registry.release(HEIKIN, "chart")
+    assert sources.disposed == [heikin, japan] and len(registry) == 0
+    assert all(task.cancelled for task in sources.tasks)
+
+
+def test_release_owner_drops_every_acquire():
+    registry, sources = SOURCE_REGISTRY(), SOURCES()
+    _acquire(registry, sources, JAPAN, "chart")
+    _acquire(registry, sources, JAPAN, "chart")
+    _acquire(registry, sources, HEIKIN, "chart", parent=JAPAN)
+    other = source_key("binance", "ETHUSDT", "5m")
+    _acquire(registry, sources, other, "chart")
+    _acquire(registry, sources, other, "tab")
+    assert sorted(registry.release_owner("chart")) == sorted([JAPAN, HEIKIN])
+    assert registry.keys() == [other] and registry.refcount(other) == 1
+    assert registry.release_owner("chart") == []
+
+
+def test_failed_subscribe_leaves_nothing_behind():
+    registry, sources = SOURCE_REGISTRY(), SOURCES()
+    japan = _acquire(registry, sources, JAPAN, "chart")
+
+    def fail(source):
+        raise ConnectionError("exchange down")
+
+    with pytest.raises(ConnectionError):
+        registry.acquire(HEIKIN, "chart", sources.factory("heikinashi"), fail, sources.dispose, JAPAN)
+    # the half built source was disposed and its hold on the parent released
+    assert HEIKIN not in registry and len(sources.disposed) == 1 and sources.disposed[0] is not japan
+    assert registry.refcount(JAPAN) == 1
+    assert registry.release(JAPAN, "chart") and len(registry) == 0
+
+
+def test_set_subscription_cancels_the_previous_one():
+    registry, sources = SOURCE_REGISTRY(), SOURCES()
+    _acquire(registry, sources, JAPAN, "chart")
+    reconnect = TASK()
+    registry.set_subscription(JAPAN, reconnect)
+    assert sources.tasks[0].cancelled and not reconnect.cancelled
+    registry.release(JAPAN, "chart")
+    assert reconnect.cancelled
+
+
+def test_concurrent_acquire_and_release():
+    registry, sources = SOURCE_REGISTRY(), SOURCES()
+    _acquire(registry, sources, JAPAN, "main")
+    barrier, seen = threading.Barrier(8), []
+
+    def worker(owner):
+        barrier.wait()
+        for _ in range(300):
+            _acquire(registry, sources, JAPAN, owner)
+            seen.append((registry.get(JAPAN) is not None, JAPAN in registry, registry.refcount(JAPAN) >= 2))
+            registry.release(JAPAN, owner)
+
+    threads = [threading.Thread(target=worker, args=(k,)) for k in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(seen) == 8 * 300 and all(all(x) for x in seen)
+    assert sources.created == ["japan"] and registry.refcount(JAPAN) == 1
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import pytest
+
+from atklip.controls.candle.incremental_smooth import INCREMENTAL_SMOOTH_CANDLE
+from atklip.controls.stream_kernels import ATR_KERNEL, MA_KERNEL, MACD_KERNEL, RSI_KERNEL, STREAM_KERNEL
+
+
+# batch references, written like the pandas_ta functions the kernels stand in for
+
+def ref_sma(x, n):
+    return pd.Series(x).rolling(n).mean().to_numpy()
+
+
+def ref_ema(x, n):
+    "pandas_ta ema, presma: seeded with the sma of the first n values"
+    s = pd.Series(x).copy()
+    first = s.first_valid_index()
+    if first is None or first + n > len(s):
+        return np.full(len(s), np.nan)
+    s.iloc[:first + n - 1] = np.nan
+    s.iloc[first + n - 1] = pd.Series(x[first:first + n]).mean()
+    return s.ewm(span=n, adjust=False).mean().to_numpy()
+
+
+def ref_rma(x, n):
+    return pd.Series(x).ewm(alpha=1.0 / n, adjust=False).mean().to_numpy()
+
+
+def ref_smma(x, n):
+    result = np.full(len(x), np.nan)
+    first = int(np.flatnonzero(~np.isnan(x))[0])
+    if first + n <= len(x):
+        result[first + n - 1] = np.mean(x[first:first + n])
+        for i in range(first + n, len(x)):
+            result[i] = ((n - 1) * result[i - 1] + x[i]) / n
+    return result
+
+
+def ref_wma(x, n):
+    w = np.arange(1, n + 1, dtype=np.float64)
+    return pd.Series(x).rolling(n).apply(lambda v: np.dot(v, w) / w.sum(), raw=True).to_numpy()
+
+
+REFERENCES = {"sma": ref_sma, "ema": ref_ema, "rma": ref_rma, "smma": ref_smma, "wma": ref_wma}
+
+
+def random_walk(seed, size=2000):
+    rng = np.random.default_rng(seed)
+    return 100.0 + np.cumsum(rng.normal(0.0, 1.0, size))
+
+
+@pytest.mark.parametrize("mamode", list(REFERENCES))
+@pytest.mark.parametrize("length", [1, 3, 14, 50])
+def test_ma_kernel_matches_batch(mamode, length):
+    x = random_walk(length)
+    x[:7] = np.nan  # upstream warm-up
+    np.testing.assert_allclose(MA_KERNEL(mamode, length).load(x), REFERENCES[mamode](x, length), rtol=1e-10)
+
+
+def test_rma_repeats_and_decays_over_nan_gaps():
+    x = random_walk(1, 300)
+    x[[50, 51, 120]] = np.nan
+    np.testing.assert_allclose(MA_KERNEL("rma", 10).load(x), ref_rma(x, 10), rtol=1e-12)
+
+
+@pytest.mark.parametrize("mamode", list(REFERENCES))
+def test_streaming_matches_batch(mamode):
+    x = random_walk(7, 600)
+    rng = np.random.default_rng(0)
+    kernel = MA_KERNEL(mamode, 20)
+    kernel.load(x[:300])
+    streamed = []
+    for value in x[300:]:
+        # a new bar opens on a first tick, more ticks move it, then its close
+        ticks = value + rng.normal(0.0, 0.5, 3)
+        kernel.add(ticks[0])
+        for tick in ticks[1:]:
+            kernel.update(tick)
+        streamed.append(kernel.update(value))
+    np.testing.assert_allclose(streamed, REFERENCES[mamode](x, 20)[300:], rtol=1e-10)
+
+
+def test_rsi_and_atr_kernels_match_pandas_ta():
+    rng = np.random.default_rng(3)
+    close = random_walk(3, 1000)
+    high = close + rng.exponential(0.5, close.size)
+    low = close - rng.exponential(0.5, close.size)
+    diff = pd.Series(close).diff()
+    gain, loss = diff.clip(lower=0).to_numpy(), (-diff).clip(lower=0).to_numpy()  # NaN first, like pandas_ta
+    avg_gain, avg_loss = ref_rma(gain, 14), ref_rma(loss, 14)
+    np.testing.assert_allclose(RSI_KERNEL(14).load(close), 100 * avg_gain / (avg_gain + avg_loss), rtol=1e-10)
+
+    prev = np.r_[np.nan, close[:-1]]
+    tr = np.fmax(high - low, np.fmax(np.abs(high - prev), np.abs(low - prev)))
+    tr[0] = np.nan
+    np.testing.assert_allclose(ATR_KERNEL(14).load(high, low, close), ref_rma(tr, 14), rtol=1e-10)
+
+
+def test_macd_kernel_matches_batch():
+    close = random_walk(5, 800)
+    macd, hist, signal = MACD_KERNEL(12, 26, 9).load(close)
+    expected = ref_ema(close, 12) - ref_ema(close, 26)
+    np.testing.assert_allclose(macd, expected, rtol=1e-10)
+    np.testing.assert_allclose(signal, ref_ema(expected, 9), rtol=1e-10)
+    np.testing.assert_allclose(hist, expected - ref_ema(expected, 9), rtol=1e-10)
+
+
+@pytest.mark.parametrize("stages", [[("rma", 5)], [("ema", 5), ("ema", 5)], [("sma", 4), ("rma", 6), ("wma", 3)],
+                                    [("smma", 7), ("ema", 3)]])
+def test_incremental_smooth_matches_batch_and_streams(stages):
+    rng = np.random.default_rng(11)
+    close = random_walk(11, 1500)
+    _open = np.r_[close[0], close[:-1]]
+    high = np.maximum(_open, close) + rng.exponential(0.3, close.size)
+    low = np.minimum(_open, close) - rng.exponential(0.3, close.size)
+    times = np.arange(close.size, dtype=np.int64) * 60_000
+    volume = np.ones(close.size)
+
+    expected = []
+    for column in (_open, high, low, close):
+        for mamode, length in stages:
+            column = REFERENCES[mamode](column, length)
+        expected.append(column)
+    expected = np.column_stack(expected)
+
+    smooth = INCREMENTAL_SMOOTH_CANDLE(stages)
+    smooth.load(times, _open, high, low, close, volume)
+    batch = np.column_stack(smooth.store.columns(("open", "high", "low", "close")))
+    np.testing.assert_allclose(batch, expected, rtol=1e-10)
+    assert np.isnan(batch[:smooth.warmup]).all() and not np.isnan(batch[smooth.warmup:]).any()
+
+    live = INCREMENTAL_SMOOTH_CANDLE(stages)
+    live.load(times[:1000], _open[:1000], high[:1000], low[:1000], close[:1000], volume[:1000])
+    for i in range(1000, close.size):
+        live.update(times[i], _open[i], _open[i] + 1, _open[i] - 1, _open[i], 1.0)
+        live.update(times[i], _open[i], high[i], low[i], close[i], 1.0)
+    streamed = np.column_stack(live.store.columns(("open", "high", "low", "close")))
+    np.testing.assert_allclose(streamed, expected, rtol=1e-10)
+
+    # only a first tick of each bar seen live, its final row comes with the next bar
+    fetched = INCREMENTAL_SMOOTH_CANDLE(stages)
+    fetched.load(times[:1000], _open[:1000], high[:1000], low[:1000], close[:1000], volume[:1000])
+    for i in range(1000, close.size):
+        closed = (times[i - 1], _open[i - 1], high[i - 1], low[i - 1], close[i - 1], 1.0)
+        first_tick = (times[i], _open[i], _open[i], _open[i], _open[i], 1.0)
+        assert fetched.update_rows([closed, first_tick]) == (i, True)
+    fetched.update(times[-1], _open[-1], high[-1], low[-1], close[-1], 1.0)
+    streamed = np.column_stack(fetched.store.columns(("open", "high", "low", "close")))
+    np.testing.assert_allclose(streamed, expected, rtol=1e-10)
+
+
+def test_incomplete_kernels_fail_at_construction():
+    class NO_STEP(STREAM_KERNEL):
+        def _new_state(self):
+            return np.zeros(1)
+
+        def _batch(self, state, x):
+            return x
+
+    with pytest.raises(TypeError, match="_step"):
+        NO_STEP()
+    with pytest.raises(TypeError):
+        STREAM_KERNEL()
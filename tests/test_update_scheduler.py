@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+from collections import deque
+
+from atklip.appmanager.worker.update_scheduler import (LEVEL_INDICATOR, LEVEL_SOURCE, LEVEL_STRATEGY,
+                                                       UPDATE_SCHEDULER)
+
+
+class MANUAL_EXECUTOR:
+    "runs submitted calls one at a time when the test says so"
+
+    def __init__(self):
+        self.pending = deque()
+
+    def submit(self, fn, *args, **kwargs):
+        self.pending.append((fn, args, kwargs))
+
+    def run_one(self):
+        fn, args, kwargs = self.pending.popleft()
+        fn(*args, **kwargs)
+
+
+def _scheduler():
+    executor = MANUAL_EXECUTOR()
+    scheduler = UPDATE_SCHEDULER(executor)
+    scheduler.register("source", LEVEL_SOURCE)
+    scheduler.register("ema", LEVEL_INDICATOR, depends_on=("source",))
+    scheduler.register("strategy", LEVEL_STRATEGY, depends_on=("ema",))
+    return scheduler, executor
+
+
+def test_steady_ticks_do_not_starve_dependents():
+    scheduler, executor = _scheduler()
+    runs = {"source": [], "ema": [], "strategy": []}
+    for tick in range(300):
+        for job_id in runs:
+            scheduler.update(job_id, runs[job_id].append, tick)
+        # the pool finishes one job per tick: the source always has a newer tick queued
+        executor.run_one()
+    while executor.pending:
+        executor.run_one()
+    assert len(runs["ema"]) > 50 and len(runs["strategy"]) > 50
+    assert runs["source"][-1] == runs["ema"][-1] == runs["strategy"][-1] == 299
+    stats = scheduler.stats()
+    assert stats["queued"] == 0 and stats["dropped"] == stats["submitted"] - stats["processed"]
+
+
+def test_dependent_waits_for_earlier_events_of_its_dependency():
+    scheduler, executor = _scheduler()
+    order = []
+    scheduler.add("source", order.append, "source")
+    scheduler.add("ema", order.append, "ema")
+    scheduler.add("strategy", order.append, "strategy")
+    assert len(executor.pending) == 1
+    while executor.pending:
+        executor.run_one()
+    assert order == ["source", "ema", "strategy"]
+
+
+def test_adds_are_kept_and_updates_coalesce():
+    scheduler, executor = _scheduler()
+    seen = []
+    scheduler.update("source", seen.append, "u0")
+    for event in ("u1", "u2", "a1", "u3", "u4", "a2", "u5"):
+        if event.startswith("a"):
+            scheduler.add("source", seen.append, event)
+        else:
+            scheduler.update("source", seen.append, event)
+    while executor.pending:
+        executor.run_one()
+    assert seen == ["u0", "u2", "a1", "u4", "a2", "u5"]
+    assert scheduler.stats()["dropped"] == 2
+
+
+def test_ready_jobs_start_by_level():
+    executor = MANUAL_EXECUTOR()
+    scheduler = UPDATE_SCHEDULER(executor)
+    scheduler.register("source", LEVEL_SOURCE)
+    scheduler.register("strategy", LEVEL_STRATEGY, depends_on=("source",))
+    scheduler.register("ema", LEVEL_INDICATOR, depends_on=("source",))
+    scheduler.register("resampled", LEVEL_SOURCE, depends_on=("source",))
+    started = []
+    scheduler.add("source", started.append, "source")
+    for job_id in ("strategy", "ema", "resampled"):
+        scheduler.add(job_id, started.append, job_id)
+    executor.run_one()
+    while executor.pending:
+        executor.run_one()
+    assert started == ["source", "resampled", "ema", "strategy"]
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from atklip.controls.candle_patterns.vectorized_patterns import (CANDLE_PATTERN_SCANNER, PATTERNS,
+                                                                 detect_patterns)
+
+WHITE_LONG = (10.0, 14.5, 9.8, 14.0)
+BLACK_LONG = (14.0, 14.1, 9.9, 10.0)
+
+# pattern -> (open, high, low, close) bars ending on a bar showing it, then
+# the same bars with one value moved so that it does not
+FIXTURES = {
+    "bearish_engulfing": ([(10, 11.2, 9.8, 11), (11.5, 12, 9, 9.5)],
+                          [(10, 11.2, 9.8, 11), (11.5, 12, 9, 10.5)]),
+    "bearish_harami": ([(10, 12.2, 9.8, 12), (11.5, 11.8, 10.2, 10.5)],
+                       [(10, 12.2, 9.8, 12), (11.5, 11.8, 9.2, 9.5)]),
+    "bullish_engulfing": ([(11, 11.2, 9.8, 10), (9.5, 12, 9, 11.5)],
+                          [(11, 11.2, 9.8, 10), (9.5, 12, 9, 10.5)]),
+    "bullish_harami": ([(12, 12.2, 9.8, 10), (10.5, 11.8, 10.2, 11.5)],
+                       [(12, 12.2, 9.8, 10), (10.5, 12.8, 10.2, 12.5)]),
+    "dark_cloud_cover": ([WHITE_LONG, (14.5, 14.6, 11.4, 11.5)],
+                         [WHITE_LONG, (14.5, 14.6, 12.4, 12.5)]),
+    "doji": ([(10, 11, 9, 10.05)],
+             [(10, 11, 9, 10.5)]),
+    "doji_star": ([WHITE_LONG, (15, 16, 14.1, 15.05)],
+                  [WHITE_LONG, (13, 14, 12, 13.05)]),
+    "dragonfly_doji": ([(10, 10.06, 9, 10.05)],
+                       [(10, 11, 9, 10.05)]),
+    "evening_star": ([(10, 12.2, 9.8, 12), (13, 13.6, 12.9, 13.5), (12.5, 12.6, 10.9, 11)],
+                     [(10, 12.2, 9.8, 12), (13, 13.6, 12.9, 13.5), (12.5, 13.1, 12.4, 13)]),
+    "evening_star_doji": ([(10, 14.2, 9.9, 14), (15, 16, 14.5, 15.05), (13.5, 13.6, 9.9, 10)],
+                          [(10, 14.2, 9.9, 14), (15, 16, 14.5, 15.05), (13.5, 13.6, 9.9, 13.2)]),
+    "gravestone_doji": ([(10, 11, 10, 10.05)],
+                        [(10, 11, 9, 10.05)]),
+    "hammer": ([(10, 10.25, 9, 10.2)],
+               [(10, 10.25, 9.9, 10.2)]),
+    "hanging_man": ([(9, 10, 8.9, 9.5), (10.5, 11, 10.4, 10.8), (11.5, 11.65, 10.5, 11.6)],
+                    [(9, 10, 8.9, 9.5), (10.5, 12, 10.4, 10.8), (11.5, 11.65, 10.5, 11.6)]),
+    "inverted_hammer": ([(10, 11.2, 9.95, 10.1)],
+                        [(10, 10.2, 9.95, 10.1)]),
+    "morning_star": ([(14, 14.2, 11.8, 12), (11, 11.1, 10.4, 10.5), (11.5, 13.1, 11.4, 13)],
+                     [(14, 14.2, 11.8, 12), (11, 11.1, 10.4, 10.5), (11.5, 11.6, 10.9, 11)]),
+    "morning_star_doji": ([(14, 14.1, 9.8, 10), (9, 9.5, 8.5, 9.05), (9.5, 13.1, 9.4, 13)],
+                          [(14, 14.1, 9.8, 10), (9, 9.5, 8.5, 9.05), (9.5, 10, 9.4, 9.9)]),
+    "piercing_pattern": ([BLACK_LONG, (9.5, 12.6, 9.4, 12.5)],
+                         [BLACK_LONG, (9.5, 11.6, 9.4, 11.5)]),
+    "rain_drop": ([BLACK_LONG, (9, 9.5, 8.3, 8.8)],
+                  [BLACK_LONG, (10.5, 11, 10.3, 10.3)]),
+    "rain_drop_doji": ([BLACK_LONG, (9, 9.5, 8.3, 8.95)],
+                       [WHITE_LONG, (9, 9.5, 8.3, 8.95)]),
+    "shooting_star": ([(10, 11.1, 9.9, 11), (11.5, 12.5, 11.35, 11.4)],
+                      [(10, 11.1, 9.9, 11), (10.8, 11.8, 10.65, 10.7)]),
+    "star": ([WHITE_LONG, (15, 15.5, 14.7, 15.2)],
+             [WHITE_LONG, (13, 13.5, 12.7, 13.2)]),
+}
+
+
+def _flags(bars):
+    return detect_patterns(*np.array(bars, dtype=np.float64).T)
+
+
+def test_every_pattern_has_fixtures():
+    assert set(FIXTURES) == set(PATTERNS)
+    assert all(len(FIXTURES[name][0]) == count for name, count in PATTERNS.items())
+
+
+@pytest.mark.parametrize("name", sorted(PATTERNS))
+def test_pattern_fixtures(name):
+    positive, negative = FIXTURES[name]
+    assert _flags(positive)[name][-1]
+    assert not _flags(negative)[name][-1]
+    # bars without enough history never show a pattern
+    assert not _flags(positive)[name][:PATTERNS[name] - 1].any()
+    if PATTERNS[name] > 1:
+        assert not _flags(positive[1:])[name][-1]
+
+
+def _bars(seed, size):
+    "random bars with a share of dojis and tight bodies so that most patterns occur"
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, size))
+    _open = np.r_[close[0], close[:-1]] + rng.normal(0, 0.3, size)
+    small = rng.random(size) < 0.3
+    close[small] = _open[small] + rng.normal(0, 0.05, small.sum())
+    high = np.maximum(_open, close) + rng.exponential(0.5, size)
+    low = np.minimum(_open, close) - rng.exponential(0.5, size)
+    return _open, high, low, close
+
+
+def _assert_batch(scanner, bars, size):
+    expected = detect_patterns(*(x[:size] for x in bars))
+    assert len(scanner) == size
+    for name in PATTERNS:
+        np.testing.assert_array_equal(scanner.get(name), expected[name], err_msg=name)
+
+
+@pytest.mark.parametrize("loaded", [0, 1, 2, 300])
+def test_scanner_live_matches_batch(loaded):
+    bars = _bars(loaded, 3000)
+    scanner = CANDLE_PATTERN_SCANNER(capacity=16)
+    scanner.load(*(x[:loaded] for x in bars))
+    for i in range(loaded, bars[0].size):
+        _open, high, low, close = (x[i] for x in bars)
+        scanner.add(_open, _open, _open, _open)
+        scanner.update(_open, max(_open, close), min(_open, close), close)
+        flags = scanner.update(_open, high, low, close)
+        if i % 500 == 0 or i == bars[0].size - 1:
+            _assert_batch(scanner, bars, i + 1)
+            assert flags == {name: bool(v[-1]) for name, v in detect_patterns(*(x[:i + 1] for x in bars)).items()}
+    found = {name for name in PATTERNS if scanner.get(name).any()}
+    assert len(found) >= len(PATTERNS) - 3
+    assert scanner.found() == [name for name in PATTERNS if scanner.get(name)[-1]]
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from atklip.controls.strategies.backtest import BACKTEST_RESULT, TRADE
+from atklip.controls.strategies.optimizer import grid_params
+from atklip.controls.strategies.walk_forward import WALK_FORWARD, WALK_FORWARD_RESULT, walk_forward_windows
+
+HOUR = 60 * 60_000
+
+
+def test_rolling_and_anchored_windows():
+    assert walk_forward_windows(11, 4, 2) == [(0, 4, 4, 6), (2, 6, 6, 8), (4, 8, 8, 10)]
+    assert walk_forward_windows(11, 4, 2, anchored=True) == [(0, 4, 4, 6), (0, 6, 6, 8), (0, 8, 8, 10)]
+    assert walk_forward_windows(11, 4, 2, step=3) == [(0, 4, 4, 6), (3, 7, 7, 9)]
+    assert walk_forward_windows(5, 4, 2) == []
+    with pytest.raises(ValueError):
+        walk_forward_windows(11, 4, 2, step=1)
+
+
+def _segment(times, equity, trades=()):
+    rows = np.array(list(trades), dtype=TRADE)
+    return BACKTEST_RESULT(np.asarray(times, dtype=np.int64), rows, np.asarray(equity, dtype=np.float64),
+                           np.zeros(len(times)), 100.0)
+
+
+def test_stitched_equity_carries_and_trades_point_into_the_stitched_bars():
+    first = _segment([40, 50, 60], [100, 105, 110], [(1, 0, 2, 10, 11, 1, 0, 10, 0)])
+    second = _segment([80, 90, 100], [100, 95, 98], [(-1, 1, 2, 20, 19.4, 1, 0, -2, 2)])
+    result = WALK_FORWARD_RESULT([(0, 4, 4, 7), (0, 8, 8, 11)], [{}, {}], np.zeros(2), [first, second], 100.0)
+    np.testing.assert_allclose(result.equity, [100, 105, 110, 110, 105, 108])
+    stitched = result.stitched()
+    assert stitched.net_profit == pytest.approx(8)
+    df = stitched.trades_df()
+    assert df["entry_index"].tolist() == [0, 4] and df["exit_index"].tolist() == [2, 5]
+    assert df["entry_time"].tolist() == [40, 90] and df["exit_time"].tolist() == [60, 100]
+
+
+def crossing_signals(candles, fast=2, slow=5):
+    close = candles["close"]
+    fast_ma = np.convolve(close, np.ones(fast) / fast)[:close.size]
+    slow_ma = np.convolve(close, np.ones(slow) / slow)[:close.size]
+    return {"long_entry": fast_ma > slow_ma, "short_entry": fast_ma < slow_ma}
+
+
+@pytest.mark.parametrize("anchored", [False, True])
+def test_walk_forward_run_stitches_the_out_of_sample_windows(anchored):
+    m = 5000
+    close = 100 + np.cumsum(np.random.default_rng(8).normal(0, 0.5, m))
+    candles = {"time": np.arange(m, dtype=np.int64) * HOUR, "open": close, "high": close + 0.3,
+               "low": close - 0.3, "close": close}
+    space = {"fast": [2, 4], "slow": [10, 30]}
+    result = WALK_FORWARD(crossing_signals, {"taker_fee": 0.0}, min_trades=1, executor=None).run(
+        candles, grid_params(space), 1000, 500, anchored=anchored)
+    assert len(result.windows) == 8 and len(result.oos) == 8
+    np.testing.assert_array_equal(result.times, candles["time"][1000:])
+    assert result.equity.size == result.times.size == 4000
+
+    df = result.stitched().trades_df()
+    assert len(df) == sum(x.trades.size for x in result.oos) > 0
+    expected = np.concatenate([x.times[x.trades["entry_index"]] for x in result.oos])
+    np.testing.assert_array_equal(df["entry_time"].to_numpy(), expected)
+    assert np.all(np.diff(df["entry_time"].to_numpy()) >= 0)
+    last = result.oos[-1].equity[-1] - 100 + sum(x.equity[-1] - 100 for x in result.oos[:-1])
+    assert result.equity[-1] == pytest.approx(100 + last)
+    assert result.stitched().net_profit == pytest.approx(last)
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from atklip.controls.pandas_ta.utils import _warmup
+from atklip.controls.pandas_ta.utils._warmup import KERNEL_WARMUP, get_kernel
+
+
+def test_every_default_kernel_compiles():
+    warmup = KERNEL_WARMUP()
+    warmup.aot = None
+    warmup.run()
+    assert warmup.done.is_set() and warmup.errors == {}
+    assert set(warmup.timings) >= set(_warmup.AOT_SIGNATURES)
+    for name in _warmup.AOT_SIGNATURES:
+        assert callable(get_kernel(name))
+
+
+def test_failed_kernel_import_still_sets_done(monkeypatch):
+    def broken():
+        raise ImportError("no kernels")
+
+    monkeypatch.setattr(_warmup, "_default_kernels", broken)
+    warmup = KERNEL_WARMUP()
+    calls = []
+    warmup.register("extra", lambda: calls.append(1))
+    warmup.start().join(timeout=10)
+    assert warmup.wait(0) and calls == [1]
+    assert "_default_kernels" in warmup.errors